@@ -5,16 +5,20 @@ import asyncio
 import logging
 import tempfile
 import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable
 from pathlib import Path
 from werkzeug.datastructures import FileStorage
 from datetime import datetime
 
 from data.database import db_manager
 from data.models import Student, Homework, Question
-from core.grading_engine import GradingEngine
+from core.grading_engine import GradingEngine, GRADING_MODES, PROMPT_VERSION
+from core.grading_events import GradingEventType
+from core.result_cache import GradingResultCache, grading_result_cache
+from core.question_memo import analysis_memo, grading_memo
+from core.metrics import metrics_registry
 from core.model_selector import ModelSelector
-from mcp_client.client import MCPClient
+from mcp_client.in_process import create_default_client
 from utils.image_processor import ImageProcessor
 from utils.exceptions import MathGradingException, DatabaseError, ImageProcessingError
 from config.settings import settings
@@ -459,15 +463,16 @@ class GradingHandler(BaseHandler):
     async def _ensure_initialized(self):
         """确保组件已初始化"""
         if not self.mcp_client:
-            self.mcp_client = MCPClient()
+            self.mcp_client = create_default_client()
             await self.mcp_client.connect()
 
         if not self.grading_engine:
             model_selector = ModelSelector()
             self.grading_engine = GradingEngine(self.mcp_client, model_selector)
 
-    async def grade_homework(self, homework_id: str) -> Dict[str, Any]:
-        """批改作业"""
+    async def grade_homework(self, homework_id: str,
+                             on_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """批改作业，传入 on_event 时每个流式批改事件都会回调一次"""
         try:
             await self._ensure_initialized()
 
@@ -482,9 +487,18 @@ class GradingHandler(BaseHandler):
                     raise FileNotFoundError("作业图像文件不存在")
 
             # 执行批改
-            results = await self.grading_engine.grade_homework(
+            if on_event is None:
+                return await self.grading_engine.grade_homework(
+                    homework_id, homework.image_path, homework.grade_level
+                )
+
+            results = None
+            async for event in self.grading_engine.grade_homework_stream(
                 homework_id, homework.image_path, homework.grade_level
-            )
+            ):
+                on_event(event.to_dict())
+                if event.type == GradingEventType.COMPLETED:
+                    results = event.data
 
             return results
 
@@ -495,6 +509,51 @@ class GradingHandler(BaseHandler):
                 "error": str(e)
             }
 
+    async def grade_many(self, homework_ids: List[str]) -> Dict[str, Any]:
+        """批量批改多份作业，返回逐份结果与吞吐量/延迟统计"""
+        try:
+            await self._ensure_initialized()
+
+            # 获取作业信息，不存在的作业直接记为失败
+            items = []
+            missing = {}
+            with db_manager.get_session() as session:
+                for homework_id in homework_ids:
+                    homework = session.query(Homework).filter(Homework.id == homework_id).first()
+                    if not homework:
+                        missing[homework_id] = "作业不存在"
+                    elif not Path(homework.image_path).exists():
+                        missing[homework_id] = "作业图像文件不存在"
+                    else:
+                        items.append((homework_id, homework.image_path, homework.grade_level))
+
+            batch = await self.grading_engine.grade_many(items)
+
+            # 按请求顺序合并结果
+            graded = {r["homework_id"]: r for r in batch["results"]}
+            results = []
+            for homework_id in homework_ids:
+                if homework_id in missing:
+                    results.append({"homework_id": homework_id, "success": False, "error": missing[homework_id]})
+                else:
+                    results.append(graded[homework_id])
+
+            # 按合并后的完整列表重新汇总，总数、失败数与吞吐量才与返回的结果一致
+            summary = self.grading_engine.summarize_batch(results, batch["summary"]["wall_time"])
+
+            return {
+                "success": True,
+                "results": results,
+                "summary": summary
+            }
+
+        except Exception as e:
+            self.logger.error(f"批量批改失败: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
     async def generate_detailed_feedback(self, homework_id: str, question_id: str) -> Dict[str, Any]:
         """生成详细反馈"""
         try:
@@ -532,7 +591,7 @@ class GradingHandler(BaseHandler):
         try:
             await self._ensure_initialized()
 
-            problems = await self.mcp_client.generate_similar_problems(original_question, count)
+            problems = await self.mcp_client.generate_similar_problems(original_question, count, difficulty)
 
             return {
                 "success": True,
@@ -563,6 +622,71 @@ class GradingHandler(BaseHandler):
                 "error": str(e)
             }
 
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """获取MCP连接池统计"""
+        if not self.mcp_client:
+            return {"connected": 0}
+        return self.mcp_client.get_stats()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取批改结果缓存统计"""
+        return grading_result_cache.get_stats()
+
+    def get_image_stats(self) -> Dict[str, Any]:
+        """获取批改引擎的图像准备统计"""
+        if not self.grading_engine:
+            return {}
+        return self.grading_engine.get_image_stats()
+
+    def get_metrics(self, prefix: Optional[str] = None) -> Dict[str, Any]:
+        """获取批改延迟、上游调用与token用量指标"""
+        return metrics_registry.snapshot(prefix)
+
+    def reset_metrics(self) -> Dict[str, Any]:
+        """清空指标"""
+        metrics_registry.reset()
+        return {"success": True}
+
+    def clear_result_cache(self) -> Dict[str, Any]:
+        """清空批改结果缓存"""
+        grading_result_cache.clear()
+        return {"success": True}
+
+    def get_memo_stats(self) -> Dict[str, Any]:
+        """获取逐题记忆表统计"""
+        return {
+            "analysis": analysis_memo.get_stats(),
+            "grading": grading_memo.get_stats()
+        }
+
+    def invalidate_homework_cache(self, homework_id: str) -> Dict[str, Any]:
+        """使指定作业在所有批改模式下的缓存结果失效"""
+        try:
+            with db_manager.get_session() as session:
+                homework = session.query(Homework).filter(Homework.id == homework_id).first()
+
+                if not homework:
+                    raise ValueError("作业不存在")
+
+                image_data = Path(homework.image_path).read_bytes()
+                grade_level = homework.grade_level
+
+            removed = 0
+            for mode in GRADING_MODES:
+                cache_key = GradingResultCache.make_key(
+                    image_data, grade_level, settings.get("models.nvidia.model"), mode, PROMPT_VERSION
+                )
+                removed += grading_result_cache.invalidate(cache_key)
+
+            return {"success": True, "removed": removed}
+
+        except Exception as e:
+            self.logger.error(f"清除作业缓存失败: {e}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
 class StatisticsHandler(BaseHandler):
     """统计处理器"""
 
@@ -4,6 +4,7 @@
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
 import asyncio
+import concurrent.futures
 import logging
 import threading
 from typing import Dict, Any
@@ -19,6 +20,7 @@ from .handlers import (
     StatisticsHandler
 )
 from config.settings import settings
+from mcp_client import run_with_deadline
 from utils.logger import setup_logger
 from utils.exceptions import MathGradingException
 
@@ -49,6 +51,19 @@ def create_app() -> Flask:
 
     threading.Thread(target=run_loop, daemon=True).start()
 
+    def run_async(coro, timeout: float):
+        """
+        在后台事件循环中执行协程并等待结果
+
+        协程内的MCP调用以 timeout 为截止时间；等待超时后取消协程，进行中的MCP调用随之通知服务器停止处理。
+        """
+        future = asyncio.run_coroutine_threadsafe(run_with_deadline(coro, timeout), loop)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
     # ============ 错误处理器 ============
 
     @app.errorhandler(404)
@@ -94,10 +109,9 @@ def create_app() -> Flask:
             grade_level = request.form.get('grade_level', '高一')
 
             # 异步处理文件上传
-            future = asyncio.run_coroutine_threadsafe(
-                file_handler.handle_upload(file, student_name, grade_level), loop
+            result = run_async(
+                file_handler.handle_upload(file, student_name, grade_level), timeout=30
             )
-            result = future.result(timeout=30)
 
             if result['success']:
                 return jsonify({
@@ -135,10 +149,7 @@ def create_app() -> Flask:
         """批改指定作业"""
         try:
             # 异步执行批改
-            future = asyncio.run_coroutine_threadsafe(
-                grading_handler.grade_homework(homework_id), loop
-            )
-            result = future.result(timeout=300)  # 5分钟超时
+            result = run_async(grading_handler.grade_homework(homework_id), timeout=300)  # 5分钟超时
 
             return jsonify(result)
 
@@ -148,6 +159,67 @@ def create_app() -> Flask:
             logger.error(f"批改失败: {e}")
             return jsonify({"error": f"批改失败: {e}"}), 500
 
+    @app.route('/api/homework/grade-batch', methods=['POST'])
+    def grade_homework_batch():
+        """批量批改作业"""
+        try:
+            data = request.get_json() or {}
+            homework_ids = data.get('homework_ids') or []
+
+            if not homework_ids:
+                return jsonify({"error": "缺少作业ID列表"}), 400
+
+            result = run_async(grading_handler.grade_many(homework_ids), timeout=1800)  # 30分钟超时
+
+            return jsonify(result)
+
+        except asyncio.TimeoutError:
+            return jsonify({"error": "批量批改超时，请稍后重试"}), 408
+        except Exception as e:
+            logger.error(f"批量批改失败: {e}")
+            return jsonify({"error": f"批量批改失败: {e}"}), 500
+
+    @app.route('/api/homework/<homework_id>/cache', methods=['DELETE'])
+    def invalidate_homework_cache(homework_id: str):
+        """清除指定作业的批改结果缓存"""
+        result = grading_handler.invalidate_homework_cache(homework_id)
+        return jsonify(result), 200 if result.get("success") else 400
+
+    @app.route('/api/cache/results', methods=['GET'])
+    def get_result_cache_stats():
+        """获取批改结果缓存统计"""
+        return jsonify(grading_handler.get_cache_stats())
+
+    @app.route('/api/cache/memo', methods=['GET'])
+    def get_memo_stats():
+        """获取逐题记忆表统计"""
+        return jsonify(grading_handler.get_memo_stats())
+
+    @app.route('/api/cache/images', methods=['GET'])
+    def get_image_stats():
+        """获取图像准备统计（压缩节省字节数与耗时）"""
+        return jsonify(grading_handler.get_image_stats())
+
+    @app.route('/api/cache/results', methods=['DELETE'])
+    def clear_result_cache():
+        """清空批改结果缓存"""
+        return jsonify(grading_handler.clear_result_cache())
+
+    @app.route('/api/mcp/pool', methods=['GET'])
+    def get_mcp_pool_stats():
+        """获取MCP连接池统计"""
+        return jsonify(grading_handler.get_pool_stats())
+
+    @app.route('/api/metrics', methods=['GET'])
+    def get_metrics():
+        """获取批改延迟直方图、上游调用与token用量指标，可用 ?prefix= 按名称过滤"""
+        return jsonify(grading_handler.get_metrics(request.args.get('prefix')))
+
+    @app.route('/api/metrics', methods=['DELETE'])
+    def reset_metrics():
+        """清空指标"""
+        return jsonify(grading_handler.reset_metrics())
+
     @app.route('/api/homework/<homework_id>/results', methods=['GET'])
     def get_homework_results(homework_id: str):
         """获取作业批改结果"""
@@ -169,10 +241,9 @@ def create_app() -> Flask:
                 return jsonify({"error": "缺少question_id参数"}), 400
 
             # 异步生成反馈
-            future = asyncio.run_coroutine_threadsafe(
-                grading_handler.generate_detailed_feedback(homework_id, question_id), loop
+            result = run_async(
+                grading_handler.generate_detailed_feedback(homework_id, question_id), timeout=60
             )
-            result = future.result(timeout=60)
 
             return jsonify(result)
 
@@ -318,10 +389,9 @@ def create_app() -> Flask:
                 return jsonify({"error": "缺少原始题目"}), 400
 
             # 异步生成相似题目
-            future = asyncio.run_coroutine_threadsafe(
-                grading_handler.generate_similar_problems(original_question, count, difficulty), loop
+            result = run_async(
+                grading_handler.generate_similar_problems(original_question, count, difficulty), timeout=60
             )
-            result = future.result(timeout=60)
 
             return jsonify(result)
 
@@ -341,10 +411,9 @@ def create_app() -> Flask:
                 return jsonify({"error": "缺少数学表达式"}), 400
 
             # 异步验证表达式
-            future = asyncio.run_coroutine_threadsafe(
-                grading_handler.validate_expression(expression, expected_result), loop
+            result = run_async(
+                grading_handler.validate_expression(expression, expected_result), timeout=30
             )
-            result = future.result(timeout=30)
 
             return jsonify(result)
 
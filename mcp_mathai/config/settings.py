@@ -12,8 +12,37 @@ class Settings:
         self._config = {
             "mcp": {
                 "timeout": 30,
-                "retry_attempts": 3,
-                "retry_delay": 2
+                "call_timeout": 60,   # 单个工具调用等待响应的超时(秒)
+                "retry_attempts": 3,   # 连接断开时单个调用的最大重试次数
+                "retry_delay": 2,      # 重连/重试的初始退避时间(秒)，按指数增长并加随机抖动
+                "max_retry_delay": 30,  # 退避时间上限(秒)
+                "busy_retry_attempts": 5,  # 服务器繁忙时按其建议的等待时间重试的最大次数
+                # 只读、可安全重复执行的工具，连接在响应前断开时自动重试
+                "idempotent_tools": [
+                    "analyze_homework", "nvidia_chat", "nvidia_vision",
+                    "validate_math_expression", "generate_similar_problems", "generate_detailed_feedback"
+                ],
+                "pool_size": int(os.getenv("MCP_POOL_SIZE", "4")),  # 连接池连接数
+                "endpoints": [e for e in os.getenv("MCP_ENDPOINTS", "").split(",") if e],  # "host:port"，为空时使用server配置
+                "pool_health_interval": 5,  # 连接池检查断开连接的间隔(秒)
+                "blob_cache_bytes": 64 * 1024 * 1024,  # 客户端保留的已上传图像总大小，用于服务器缺失时补传
+                "use_blobs": True,          # 图像以二进制分块上传，调用中只传内容哈希
+                # 消息编码偏好顺序，连接时与服务器协商；msgpack/orjson 未安装时自动跳过
+                "codecs": [c for c in os.getenv("MCP_CODECS", "msgpack,orjson,json").split(",") if c],
+                "compression": os.getenv("MCP_COMPRESSION", "zlib") or None,  # 为空时不压缩
+                "compression_threshold": 4096,  # 编码后超过该字节数的消息才压缩
+                # 服务器与客户端在同一进程时直接调用服务器处理函数，不经过websocket
+                "in_process": os.getenv("MCP_IN_PROCESS", "1") != "0",
+                # 客户端工具结果缓存：只为只读且结果确定的工具配置策略，服务器工具版本变化时全部失效
+                "tool_cache": {
+                    "enabled": True,
+                    "policies": {
+                        "tools/list": {"ttl": 300, "max_entries": 1},
+                        "validate_math_expression": {
+                            "ttl": 3600, "max_entries": 2048, "key_fields": ["expression", "expected_result"]
+                        }
+                    }
+                }
             },
             "database": {
                 "type": "sqlite",
@@ -23,9 +52,14 @@ class Settings:
             },
             "models": {
                 "default_provider": "nvidia",
+                # OpenAI兼容的模型API地址（/chat/completions 的上级路径）；
+                # 压测时指向本地替身服务器，如 http://localhost:8900/v1（见 test/nvidia_stand_in.py）
+                "api_base": os.getenv("NVIDIA_API_BASE", "https://integrate.api.nvidia.com/v1"),
+                "max_connections": int(os.getenv("NVIDIA_MAX_CONNECTIONS", "100")),  # 到模型API的并发连接数上限
+                "request_timeout": 300,  # 单次模型请求超时(秒)
                 "nvidia": {
                     "api_key": os.getenv("NVIDIA_API_KEY", "nvapi-xxx"),
-                    "base_url": "https://integrate.api.nvidia.com/v1",
+                    "base_url": os.getenv("NVIDIA_API_BASE", "https://integrate.api.nvidia.com/v1"),
                     "model": "microsoft/phi-3.5-vision-instruct",
                     "max_tokens": 4000,
                     "temperature": 0.1
@@ -33,7 +67,71 @@ class Settings:
             },
             "server": {
                 "host": "localhost",
-                "port": 8765
+                "port": 8765,
+                # MCP服务进程数，大于1时多个进程监听同一端口（--workers 覆盖，0表示CPU核数）
+                "workers": int(os.getenv("MCP_WORKERS", "1")),
+                # 每个服务进程中执行图像处理等CPU密集型工具的子进程数，0表示在线程中执行
+                "cpu_workers": int(os.getenv("MCP_CPU_WORKERS", str(min(4, os.cpu_count() or 1)))),
+                # 同时连接的客户端数上限，超出的连接以 1013 (Try Again Later) 关闭
+                "max_clients": int(os.getenv("MCP_MAX_CLIENTS", "256")),
+                # 请求准入控制（每个服务进程）：超出执行上限的请求排队，队列满时立即以"服务器繁忙"拒绝
+                "admission": {
+                    "max_in_flight": int(os.getenv("MCP_MAX_IN_FLIGHT", "64")),  # 全部连接同时执行的请求数
+                    "max_in_flight_per_client": 16,  # 单个连接同时执行的请求数
+                    "max_queue": int(os.getenv("MCP_MAX_QUEUE", "256")),  # 全部连接等待执行的请求数
+                    "max_queue_per_client": 64,      # 单个连接等待执行的请求数
+                    "min_retry_ms": 100,             # 拒绝时建议的重试等待时间范围(毫秒)
+                    "max_retry_ms": 10000
+                }
+            },
+            "grading": {
+                # 单份作业内同时在途的模型调用上限
+                "max_concurrency": int(os.getenv("GRADING_MAX_CONCURRENCY", "5")),
+                # 批改模式: pipeline(逐题分析批改，高精度) / fused(单次视觉调用完成识别+批改)
+                "mode": os.getenv("GRADING_MODE", "pipeline"),
+                # 反馈与练习题生成共享的截止时间(秒)，超时返回部分结果
+                "post_process_timeout": 60
+            },
+            "image": {
+                "max_size": 10 * 1024 * 1024,                  # 上传文件大小上限
+                "allowed_formats": ["jpg", "jpeg", "png", "bmp"],
+                "resize_threshold": 1920,                      # 发送给模型前的最长边上限
+                "target_payload_bytes": 800 * 1024,            # 发送给模型的JPEG目标大小
+                "jpeg_quality": 85,                            # 初始JPEG质量
+                "min_jpeg_quality": 50,                        # 超出目标大小时可降到的最低质量
+                "min_side": 800,                               # 缩小尺寸时最长边的下限
+                "prepared_cache_entries": 64                   # 按文件缓存的已压缩图像条目数
+            },
+            "batch": {
+                "max_concurrency": 8,          # 批量批改时同时在途的作业数
+                "image_workers": 4,            # 图像读取/编码工作线程数
+                "recognition_concurrency": 4,  # 同时进行识别阶段的作业数
+                "grading_concurrency": 8,      # 同时进行逐题批改阶段的作业数
+                "feedback_concurrency": 4      # 同时生成反馈与练习题的作业数
+            },
+            "cache": {
+                "enabled": True,
+                "memory_entries": 256,                        # 内存LRU条目上限
+                "dir": str(self.DATA_DIR / "result_cache"),   # 磁盘缓存目录
+                "max_disk_bytes": 200 * 1024 * 1024           # 磁盘缓存总大小上限
+            },
+            "memo": {
+                "enabled": True,
+                "path": str(self.DATA_DIR / "question_memo.db"),  # 记忆表持久化文件
+                "max_entries": 5000,                              # 每个记忆表的条目上限
+                "ttl": 7 * 24 * 3600                              # 条目有效期(秒)
+            },
+            "metrics": {
+                # 延迟直方图桶上界(秒)
+                "latency_buckets": [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120],
+                "prompt_price_per_1k": float(os.getenv("MODEL_PROMPT_PRICE_PER_1K", "0")),          # 每千prompt token费用
+                "completion_price_per_1k": float(os.getenv("MODEL_COMPLETION_PRICE_PER_1K", "0")),  # 每千completion token费用
+                "image_tokens": 1000   # 上游未返回usage时，单张图像折算的prompt token数
+            },
+            "health": {
+                "ttl": 300,               # 健康状态缓存有效期(秒)
+                "failure_threshold": 3,   # 连续失败多少次后熔断
+                "reset_timeout": 30       # 熔断后多久进入半开探测(秒)
             }
         }
 
@@ -83,4 +181,8 @@ class Settings:
     def server(self):
         return self._config["server"]
 
+    @property
+    def grading(self):
+        return self._config["grading"]
+
 settings = Settings()
\ No newline at end of file
@@ -4,37 +4,315 @@
 
 import asyncio
 import base64
+import contextlib
+import contextvars
 import json
 import logging
-from typing import Dict, List, Any, Optional
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, AsyncIterator, Callable, Awaitable
 from datetime import datetime
 from pathlib import Path
 
 from config.settings import settings
+from core.grading_events import (
+    GradingEvent, GradingEventType, GradingTimer,
+    STAGE_IMAGE_PROCESSING, STAGE_RECOGNITION, STAGE_QUESTION_GRADING,
+    STAGE_FUSED_GRADING, STAGE_FEEDBACK
+)
+from core.health_monitor import AIHealthMonitor, ai_health_monitor
+from core.metrics import GradingTimings, metrics_registry
+from core.question_memo import (
+    QuestionMemo, make_memo_key, normalize_text, normalize_answer,
+    analysis_memo as shared_analysis_memo, grading_memo as shared_grading_memo
+)
+from core.result_cache import GradingResultCache, grading_result_cache
+from mcp_client.models import MathGradingAI
+from utils.exceptions import ImageProcessingError, MCPServerBusyError
+from utils.image_processor import ImageProcessor
+from utils.mcp_protocol import BLOB_URL_PREFIX, sniff_image_mime
 from utils.logger import setup_logger
 
 logger = setup_logger("grading_engine")
 
+# 批改模式
+GRADING_MODE_PIPELINE = "pipeline"  # 识别 → 逐题分析 → 逐题批改 → 反馈 → 练习题（高精度）
+GRADING_MODE_FUSED = "fused"        # 一次视觉调用完成识别+分析+批改，一次文本调用生成反馈与练习题
+GRADING_MODES = (GRADING_MODE_PIPELINE, GRADING_MODE_FUSED)
+
+# 提示词版本，修改任何批改提示词时递增，使旧的缓存结果失效
+PROMPT_VERSION = "2"
+
+# 当前正在批改的作业的计时明细，供 _call_model 将上游调用归属到对应作业
+_current_timings: contextvars.ContextVar[Optional[GradingTimings]] = contextvars.ContextVar(
+    "grading_timings", default=None
+)
+
 class GradingEngine:
     """原有的批改引擎接口 - 保持兼容性"""
 
-    def __init__(self, mcp_client, model_selector):
+    def __init__(self, mcp_client, model_selector, mode: Optional[str] = None,
+                 health_monitor: Optional[AIHealthMonitor] = None,
+                 result_cache: Optional[GradingResultCache] = None,
+                 analysis_memo: Optional[QuestionMemo] = None,
+                 grading_memo: Optional[QuestionMemo] = None):
         self.mcp_client = mcp_client
         self.model_selector = model_selector
         self.nvidia_api_key = settings.get_api_key()
+
+        # 默认使用全局共享的健康监控器，所有引擎实例共用同一份健康状态
+        self.health_monitor = health_monitor or ai_health_monitor
+
+        # 批改结果缓存，可通过 cache.enabled 关闭
+        self.result_cache = result_cache or (grading_result_cache if settings.get("cache.enabled", True) else None)
+
+        # 逐题记忆表：同一题目的分析、同一题目+答案的批改在不同作业间复用
+        memo_enabled = settings.get("memo.enabled", True)
+        self.analysis_memo = analysis_memo or (shared_analysis_memo if memo_enabled else None)
+        self.grading_memo = grading_memo or (shared_grading_memo if memo_enabled else None)
+        self._memo_inflight: Dict[str, asyncio.Future] = {}
+        self._memo_waiters: Dict[asyncio.Future, int] = {}
+
+        # 批改模式，未指定时读取配置
+        self.mode = mode or settings.get("grading.mode", GRADING_MODE_PIPELINE)
+        if self.mode not in GRADING_MODES:
+            logger.warning(f"未知批改模式: {self.mode}，使用 {GRADING_MODE_PIPELINE}")
+            self.mode = GRADING_MODE_PIPELINE
+
+        # 逐题分析/批改的并发上限
+        self.max_concurrency = max(1, int(settings.get("grading.max_concurrency", 5)))
+        self._call_semaphore: Optional[asyncio.Semaphore] = None
+        self._semaphore_loop = None
+        self._image_executor: Optional[ThreadPoolExecutor] = None
+
+        # 已压缩图像按文件缓存，同一文件重复批改时跳过解码与编码
+        self._prepared_image_entries = max(1, int(settings.get("image.prepared_cache_entries", 64)))
+        self._prepared_images: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self._image_lock = threading.Lock()
+        self._image_stats = {"prepared": 0, "cache_hits": 0, "bytes_in": 0, "bytes_out": 0, "prep_time": 0.0}
         logger.info("初始化批改引擎")
 
     async def grade_homework(self, homework_id: int, image_path: str, grade_level: str) -> Dict[str, Any]:
-        """批改作业 - 兼容接口"""
+        """批改作业 - 兼容接口，消费流式批改事件并返回最终结果"""
+        return await self._collect_final_result(
+            self.grade_homework_stream(homework_id, image_path, grade_level)
+        )
+
+    async def grade_homework_stream(self, homework_id: int, image_path: str, grade_level: str,
+                                    stage_limits: Optional[Dict[str, asyncio.Semaphore]] = None
+                                    ) -> AsyncIterator[GradingEvent]:
+        """
+        流式批改作业
+
+        依次产出阶段开始/结束（带耗时）、逐题批改结果、综合反馈、练习题，
+        最后产出 COMPLETED 事件，其 data 为与 grade_homework 相同的最终结果。
+        stage_limits 为各阶段的并发信号量，供批量批改在作业间做流水线限流。
+        """
         logger.info(f"开始批改作业: ID={homework_id}, 年级={grade_level}")
 
+        # 本次批改的计时明细，上游调用通过上下文变量归属到当前作业
+        timings = GradingTimings()
+        context_token = _current_timings.set(timings)
+        try:
+            async for event in self._grade_homework_events(homework_id, image_path, grade_level, stage_limits):
+                if event.type == GradingEventType.STAGE_FINISHED:
+                    timings.record_stage(event.stage, event.duration)
+                    metrics_registry.observe("grading_stage_seconds", event.duration, stage=event.stage)
+                elif event.type == GradingEventType.COMPLETED and isinstance(event.data, dict):
+                    event.data = {**event.data, "timings": timings.to_dict()}
+                    metrics_registry.observe(
+                        "grading_total_seconds", event.data["timings"]["total"],
+                        mode=event.data.get("mode", "unknown"), cache_hit=bool(event.data.get("cache_hit"))
+                    )
+                yield event
+        finally:
+            # 生成器可能在其他上下文中被关闭，此时无需恢复
+            with contextlib.suppress(ValueError):
+                _current_timings.reset(context_token)
+
+    async def _grade_homework_events(self, homework_id: int, image_path: str, grade_level: str,
+                                     stage_limits: Optional[Dict[str, asyncio.Semaphore]] = None
+                                     ) -> AsyncIterator[GradingEvent]:
+        """批改事件流：查缓存，再按AI服务可用性选择AI批改或基础批改"""
+        # 相同图像、年级、模型与提示词的结果直接从缓存返回
+        cache_key = await self._result_cache_key(image_path, grade_level)
+        if cache_key:
+            cached_results = await asyncio.to_thread(self.result_cache.get, cache_key)
+            if cached_results is not None:
+                logger.info(f"⚡ 命中批改结果缓存: ID={homework_id}")
+                timer = GradingTimer(homework_id)
+                yield timer.event(GradingEventType.COMPLETED, data={**cached_results, "cache_hit": True})
+                return
+
         # 检查是否应该使用真正的AI批改
         if await self._should_use_ai_grading():
             logger.info("使用AI批改引擎")
-            return await self._ai_grade_homework(homework_id, image_path, grade_level)
+            async for event in self._ai_grade_homework_stream(homework_id, image_path, grade_level, stage_limits):
+                if cache_key and event.type == GradingEventType.COMPLETED and self._is_cacheable(event.data):
+                    await asyncio.to_thread(self.result_cache.put, cache_key, event.data)
+                yield event
         else:
             logger.warning("AI服务不可用，使用基础批改模式")
-            return await self._basic_grade_homework(homework_id, image_path, grade_level)
+            timer = GradingTimer(homework_id)
+            basic_results = await self._basic_grade_homework(homework_id, image_path, grade_level)
+            yield timer.event(GradingEventType.COMPLETED, data=basic_results)
+
+    async def grade_many(self, items: List[Tuple[int, str, str]],
+                         on_event: Optional[Callable[[GradingEvent], Any]] = None) -> Dict[str, Any]:
+        """
+        批量批改（整班作业）
+
+        items 为 (homework_id, image_path, grade_level) 列表。各作业的阶段在作业间流水线执行：
+        后面作业的图像在线程池中读取编码时，前面作业的识别、逐题批改调用同时在途。
+        全局并发与各阶段并发分别受 batch.* 配置限制；单份作业失败不影响其他作业。
+
+        Returns:
+            {"results": [按输入顺序的逐份结果], "summary": 吞吐量与延迟统计}
+        """
+        batch_semaphore = asyncio.Semaphore(max(1, int(settings.get("batch.max_concurrency", 8))))
+        stage_limits = {
+            STAGE_IMAGE_PROCESSING: asyncio.Semaphore(max(1, int(settings.get("batch.image_workers", 4)))),
+            STAGE_RECOGNITION: asyncio.Semaphore(max(1, int(settings.get("batch.recognition_concurrency", 4)))),
+            STAGE_FUSED_GRADING: asyncio.Semaphore(max(1, int(settings.get("batch.recognition_concurrency", 4)))),
+            STAGE_QUESTION_GRADING: asyncio.Semaphore(max(1, int(settings.get("batch.grading_concurrency", 8)))),
+            STAGE_FEEDBACK: asyncio.Semaphore(max(1, int(settings.get("batch.feedback_concurrency", 4)))),
+        }
+
+        async def grade_one(homework_id: int, image_path: str, grade_level: str) -> Dict[str, Any]:
+            async with batch_semaphore:
+                start = time.perf_counter()
+                stage_durations: Dict[str, float] = {}
+                try:
+                    final_results = None
+                    async for event in self.grade_homework_stream(homework_id, image_path, grade_level, stage_limits):
+                        if event.type == GradingEventType.STAGE_FINISHED:
+                            stage_durations[event.stage] = event.duration
+                        elif event.type == GradingEventType.COMPLETED:
+                            final_results = event.data
+                        if on_event:
+                            on_event(event)
+                    if final_results is None:
+                        raise RuntimeError("批改未产出最终结果")
+                    return {
+                        "homework_id": homework_id,
+                        "success": True,
+                        "result": final_results,
+                        "latency": time.perf_counter() - start,
+                        "stage_durations": stage_durations
+                    }
+                except Exception as e:
+                    logger.error(f"批量批改中作业 {homework_id} 失败: {e}")
+                    return {
+                        "homework_id": homework_id,
+                        "success": False,
+                        "error": str(e),
+                        "latency": time.perf_counter() - start,
+                        "stage_durations": stage_durations
+                    }
+
+        logger.info(f"开始批量批改: {len(items)} 份作业")
+        batch_start = time.perf_counter()
+        results = await asyncio.gather(*(grade_one(*item) for item in items))
+        wall_time = time.perf_counter() - batch_start
+
+        summary = self.summarize_batch(results, wall_time)
+        logger.info(
+            f"✅ 批量批改完成: 成功 {summary['succeeded']}/{summary['total']}，"
+            f"用时 {wall_time:.2f}秒，吞吐 {summary['throughput_per_min']:.1f} 份/分钟"
+        )
+        return {"results": list(results), "summary": summary}
+
+    @staticmethod
+    def summarize_batch(results: List[Dict[str, Any]], wall_time: float) -> Dict[str, Any]:
+        """
+        汇总批量批改的吞吐量、延迟分位数和各阶段平均耗时
+
+        未进入批改的条目（如作业不存在）没有 latency，只计入总数与失败数，不参与延迟统计。
+        """
+        latencies = sorted(r["latency"] for r in results if "latency" in r)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(round(p * (len(latencies) - 1))))]
+
+        stage_totals: Dict[str, List[float]] = {}
+        for r in results:
+            for stage, duration in r.get("stage_durations", {}).items():
+                stage_totals.setdefault(stage, []).append(duration)
+
+        usage_totals = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+        for r in results:
+            totals = r.get("result", {}).get("timings", {}).get("totals", {})
+            for field in usage_totals:
+                usage_totals[field] += totals.get(field, 0)
+
+        succeeded = sum(1 for r in results if r["success"])
+        return {
+            "total": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "cache_hits": sum(1 for r in results if r.get("result", {}).get("cache_hit")),
+            "wall_time": wall_time,
+            "throughput_per_min": len(results) / wall_time * 60 if wall_time > 0 else 0.0,
+            "latency": {
+                "avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": latencies[-1] if latencies else 0.0
+            },
+            "stage_avg_durations": {
+                stage: sum(durations) / len(durations) for stage, durations in stage_totals.items()
+            },
+            "usage": usage_totals
+        }
+
+    async def _result_cache_key(self, image_path: str, grade_level: str) -> Optional[str]:
+        """计算结果缓存键，缓存未启用或图像不可读时返回None"""
+        if not self.result_cache:
+            return None
+        try:
+            image_data = await asyncio.to_thread(Path(image_path).read_bytes)
+        except OSError:
+            return None
+        return GradingResultCache.make_key(
+            image_data, grade_level, settings.get("models.nvidia.model"), self.mode, PROMPT_VERSION
+        )
+
+    @staticmethod
+    def _is_cacheable(results: Optional[Dict[str, Any]]) -> bool:
+        """
+        只缓存完整成功的AI批改结果
+
+        未识别出题目、识别/分析结果解析失败、有题目降级，或反馈/练习题超时而使用默认/部分结果的都不缓存，
+        避免这类结果在失效前一直被同一图像复用。
+        """
+        if not results or results.get("mode") != "ai_powered" or results.get("degraded"):
+            return False
+        statistics = results.get("statistics", {})
+        return bool(
+            results.get("results")
+            and not statistics.get("degraded_questions")
+            and not statistics.get("degraded_steps")
+        )
+
+    async def invalidate_cached_result(self, image_path: str, grade_level: str) -> bool:
+        """使指定作业图像的缓存结果失效"""
+        cache_key = await self._result_cache_key(image_path, grade_level)
+        if not cache_key:
+            return False
+        return await asyncio.to_thread(self.result_cache.invalidate, cache_key)
+
+    @staticmethod
+    async def _collect_final_result(stream: AsyncIterator[GradingEvent]) -> Optional[Dict[str, Any]]:
+        """消费事件流，返回 COMPLETED 事件携带的最终结果"""
+        final_results = None
+        async for event in stream:
+            if event.type == GradingEventType.COMPLETED:
+                final_results = event.data
+        return final_results
 
     async def _should_use_ai_grading(self) -> bool:
         """检查是否应该使用AI批改"""
@@ -48,9 +326,22 @@ class GradingEngine:
                 logger.warning("NVIDIA API密钥未配置")
                 return False
 
-            # 尝试简单的API调用测试
-            test_response = await self._test_nvidia_api()
-            return test_response
+            # 熔断器打开时快速失败，不再发送探测请求
+            if not self.health_monitor.allow_request():
+                logger.warning("AI服务熔断中，跳过探测")
+                return False
+
+            try:
+                # 缓存的健康状态有效时跳过探测
+                if self.health_monitor.is_healthy():
+                    return True
+
+                # 尝试简单的API调用测试
+                test_response = await self._test_nvidia_api()
+                return test_response
+            finally:
+                # 探测被取消或未计入健康状态时释放半开探测名额（已记录结果时为空操作）
+                self.health_monitor.release_probe()
 
         except Exception as e:
             logger.error(f"AI服务检查失败: {e}")
@@ -66,8 +357,8 @@ class GradingEngine:
                 "max_tokens": 10
             }
 
-            # 通过MCP客户端测试
-            response = await self.mcp_client.call_tool("nvidia_chat", test_data)
+            # 通过MCP客户端测试（结果会被动更新健康状态）
+            response = await self._call_model("nvidia_chat", test_data, "probe")
             logger.info("NVIDIA API连接测试成功")
             return True
 
@@ -77,68 +368,376 @@ class GradingEngine:
 
     async def _ai_grade_homework(self, homework_id: int, image_path: str, grade_level: str) -> Dict[str, Any]:
         """真正的AI批改流程"""
-        start_time = datetime.now()
+        return await self._collect_final_result(
+            self._ai_grade_homework_stream(homework_id, image_path, grade_level)
+        )
+
+    async def _ai_grade_homework_stream(self, homework_id: int, image_path: str, grade_level: str,
+                                        stage_limits: Optional[Dict[str, asyncio.Semaphore]] = None
+                                        ) -> AsyncIterator[GradingEvent]:
+        """AI批改流程 - 流式产出各阶段事件，stage_limits 为各阶段的并发信号量（批量批改时使用）"""
+        if self.mode == GRADING_MODE_FUSED:
+            async for event in self._ai_grade_homework_fused_stream(
+                homework_id, image_path, grade_level, stage_limits
+            ):
+                yield event
+            return
+
+        timer = GradingTimer(homework_id)
         logger.info("🚀 开始AI批改流程")
 
         try:
             # 步骤1: 图像预处理
             logger.info("📸 步骤1: 图像预处理")
-            processed_image = await self._process_image(image_path)
+            async with self._stage_slot(stage_limits, STAGE_IMAGE_PROCESSING):
+                yield timer.stage_started(STAGE_IMAGE_PROCESSING)
+                processed_image = await self._process_image(image_path)
+                yield timer.stage_finished(
+                    STAGE_IMAGE_PROCESSING,
+                    original_size=processed_image["original_size"],
+                    size=processed_image["size"],
+                    bytes_saved=processed_image["bytes_saved"],
+                    cached=processed_image["cached"]
+                )
 
             # 步骤2: AI图像识别
             logger.info("🤖 步骤2: AI图像识别")
-            ocr_results = await self._ai_image_recognition(processed_image, grade_level)
+            async with self._stage_slot(stage_limits, STAGE_RECOGNITION):
+                yield timer.stage_started(STAGE_RECOGNITION)
+                ocr_results = await self._ai_image_recognition(processed_image, grade_level)
+                questions = ocr_results.get("questions", [])
+                degraded_steps = ["recognition"] if ocr_results.get("error") else []
+                yield timer.stage_finished(STAGE_RECOGNITION, total_questions=len(questions))
+
+            # 步骤3+4: 逐题分析并批改，每题完成即产出
+            logger.info("✏️ 步骤3/4: AI题目分析与智能批改")
+            async with self._stage_slot(stage_limits, STAGE_QUESTION_GRADING):
+                yield timer.stage_started(STAGE_QUESTION_GRADING)
+                graded_questions: List[Dict[str, Any]] = [{} for _ in questions]
+                async for index, graded_q in self._analyze_and_grade_stream(questions, grade_level):
+                    graded_questions[index] = graded_q
+                    yield timer.event(
+                        GradingEventType.QUESTION_GRADED, stage=STAGE_QUESTION_GRADING,
+                        data={"index": index, "question": self._format_question_result(graded_q)}
+                    )
+                yield timer.stage_finished(STAGE_QUESTION_GRADING)
+
+            # 全部题目都批改失败时，AI结果没有参考价值，与整体失败一样降级到基础批改
+            if graded_questions and all(q.get("grading_error") for q in graded_questions):
+                raise RuntimeError(f"全部 {len(graded_questions)} 道题目批改失败")
+
+            # 步骤5+6: 并发生成AI反馈与练习题
+            logger.info("💬 步骤5/6: 并发生成AI反馈与练习题")
+            async with self._stage_slot(stage_limits, STAGE_FEEDBACK):
+                yield timer.stage_started(STAGE_FEEDBACK)
+                ai_feedback, practice_problems, post_degraded = await self._generate_feedback_and_practice(
+                    graded_questions, grade_level
+                )
+                degraded_steps.extend(post_degraded)
+                yield timer.event(GradingEventType.FEEDBACK, stage=STAGE_FEEDBACK, data=ai_feedback)
+                yield timer.event(GradingEventType.PRACTICE_PROBLEMS, stage=STAGE_FEEDBACK, data=practice_problems)
+                yield timer.stage_finished(STAGE_FEEDBACK)
+
+            # 编译结果
+            processing_time = timer.elapsed()
+            final_results = self._compile_ai_results(
+                graded_questions, ai_feedback, practice_problems,
+                processing_time, grade_level, degraded_steps
+            )
+
+            logger.info(f"✅ AI批改完成，用时: {processing_time:.2f}秒")
 
-            # 步骤3: AI题目分析
-            logger.info("📝 步骤3: AI题目分析")
-            analyzed_questions = await self._ai_analyze_questions(ocr_results, grade_level)
+        except Exception as e:
+            logger.error(f"❌ AI批改失败: {e}")
+            # 如果AI批改失败，降级到基础模式
+            final_results = await self._basic_grade_homework(homework_id, image_path, grade_level)
 
-            # 步骤4: AI批改
-            logger.info("✏️ 步骤4: AI智能批改")
-            graded_questions = await self._ai_grade_questions(analyzed_questions, grade_level)
+        yield timer.event(GradingEventType.COMPLETED, data=final_results)
 
-            # 步骤5: 生成AI反馈
-            logger.info("💬 步骤5: 生成AI反馈")
-            ai_feedback = await self._generate_ai_feedback(graded_questions, grade_level)
+    async def _ai_grade_homework_fused_stream(self, homework_id: int, image_path: str, grade_level: str,
+                                              stage_limits: Optional[Dict[str, asyncio.Semaphore]] = None
+                                              ) -> AsyncIterator[GradingEvent]:
+        """融合模式AI批改流程 - 整页作业只需两次上游调用"""
+        timer = GradingTimer(homework_id)
+        logger.info("🚀 开始AI批改流程（融合模式）")
 
-            # 步骤6: 生成练习题
-            logger.info("📚 步骤6: 生成练习题")
-            practice_problems = await self._generate_practice_problems(graded_questions, grade_level)
+        try:
+            # 步骤1: 图像预处理
+            logger.info("📸 步骤1: 图像预处理")
+            async with self._stage_slot(stage_limits, STAGE_IMAGE_PROCESSING):
+                yield timer.stage_started(STAGE_IMAGE_PROCESSING)
+                processed_image = await self._process_image(image_path)
+                yield timer.stage_finished(
+                    STAGE_IMAGE_PROCESSING,
+                    original_size=processed_image["original_size"],
+                    size=processed_image["size"],
+                    bytes_saved=processed_image["bytes_saved"],
+                    cached=processed_image["cached"]
+                )
+
+            # 步骤2: 单次视觉调用完成识别、分析与批改
+            logger.info("🤖 步骤2: AI识别与批改（单次调用）")
+            async with self._stage_slot(stage_limits, STAGE_FUSED_GRADING):
+                yield timer.stage_started(STAGE_FUSED_GRADING)
+                graded_questions, parsed = await self._ai_fused_recognize_and_grade(processed_image, grade_level)
+                degraded_steps = [] if parsed else ["recognition"]
+                for index, graded_q in enumerate(graded_questions):
+                    yield timer.event(
+                        GradingEventType.QUESTION_GRADED, stage=STAGE_FUSED_GRADING,
+                        data={"index": index, "question": self._format_question_result(graded_q)}
+                    )
+                yield timer.stage_finished(STAGE_FUSED_GRADING, total_questions=len(graded_questions))
+
+            # 步骤3: 单次文本调用生成反馈与练习题
+            logger.info("💬 步骤3: 生成AI反馈与练习题（单次调用）")
+            async with self._stage_slot(stage_limits, STAGE_FEEDBACK):
+                yield timer.stage_started(STAGE_FEEDBACK)
+                ai_feedback, practice_problems, post_degraded = await self._generate_fused_summary(
+                    graded_questions, grade_level
+                )
+                degraded_steps.extend(post_degraded)
+                yield timer.event(GradingEventType.FEEDBACK, stage=STAGE_FEEDBACK, data=ai_feedback)
+                yield timer.event(GradingEventType.PRACTICE_PROBLEMS, stage=STAGE_FEEDBACK, data=practice_problems)
+                yield timer.stage_finished(STAGE_FEEDBACK)
 
             # 编译结果
-            processing_time = (datetime.now() - start_time).total_seconds()
+            processing_time = timer.elapsed()
             final_results = self._compile_ai_results(
                 graded_questions, ai_feedback, practice_problems,
-                processing_time, grade_level
+                processing_time, grade_level, degraded_steps
             )
 
-            logger.info(f"✅ AI批改完成，用时: {processing_time:.2f}秒")
-            return final_results
+            logger.info(f"✅ AI批改完成（融合模式），用时: {processing_time:.2f}秒")
 
         except Exception as e:
-            logger.error(f"❌ AI批改失败: {e}")
-            # 如果AI批改失败，降级到基础模式
-            return await self._basic_grade_homework(homework_id, image_path, grade_level)
+            logger.error(f"❌ AI批改失败（融合模式）: {e}")
+            final_results = await self._basic_grade_homework(homework_id, image_path, grade_level)
+
+        yield timer.event(GradingEventType.COMPLETED, data=final_results)
+
+    @staticmethod
+    def _stage_slot(stage_limits: Optional[Dict[str, asyncio.Semaphore]], stage: str):
+        """获取阶段并发槽位，未配置限制时不做限制"""
+        semaphore = (stage_limits or {}).get(stage)
+        return semaphore if semaphore is not None else contextlib.nullcontext()
+
+    @staticmethod
+    def _parse_json_response(response: Any, default: Any) -> Any:
+        """解析模型返回内容，字符串按JSON解析，失败时返回默认值"""
+        if isinstance(response, str):
+            try:
+                return json.loads(response)
+            except (json.JSONDecodeError, ValueError):
+                return default
+        return response if response is not None else default
+
+    async def _ai_fused_recognize_and_grade(self, processed_image: Dict[str, Any],
+                                            grade_level: str) -> Tuple[List[Dict[str, Any]], bool]:
+        """融合提示词：一次视觉调用返回题目、学生答案、正确答案、得分与反馈，同时返回结果是否解析成功"""
+        prompt = MathGradingAI._build_homework_analysis_prompt(grade_level)
+
+        request_data = {
+            "model": settings.get("models.nvidia.model"),
+            "messages": [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {"url": await self._image_url(processed_image)}
+                        }
+                    ]
+                }
+            ],
+            "max_tokens": settings.get("models.nvidia.max_tokens", 4000),
+            "temperature": 0.1
+        }
+
+        response = await self._call_model("nvidia_vision", request_data, "fused_grading")
+        result = self._parse_json_response(response, None)
+        parsed = isinstance(result, dict)
+        if not parsed:
+            logger.warning("融合批改结果解析失败")
+            result = {"questions": []}
+
+        # 统一题号字段，与逐题流水线的结果结构保持一致
+        graded = []
+        for index, q in enumerate(result.get("questions", []), start=1):
+            q = dict(q)
+            q.setdefault("number", q.get("question_number", index))
+            q.setdefault("max_score", 10)
+            graded.append(q)
+
+        return graded, parsed
+
+    async def _generate_fused_summary(self, graded_questions: List[Dict[str, Any]], grade_level: str
+                                      ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[str]]:
+        """一次调用同时生成综合反馈与薄弱知识点练习题，第三项为使用了默认/部分结果的环节"""
+        default_feedback = {"overall_assessment": "批改完成", "suggestions": ["继续努力"]}
 
-    async def _process_image(self, image_path: str) -> Dict[str, Any]:
-        """图像预处理"""
         try:
-            with open(image_path, 'rb') as f:
-                image_data = f.read()
+            correct_count = sum(1 for q in graded_questions if q.get('is_correct', False))
+            error_topics = []
+            for q in graded_questions:
+                if not q.get('is_correct', False):
+                    topic = q.get('topic', '基础运算')
+                    if topic not in error_topics:
+                        error_topics.append(topic)
+            error_topics = error_topics[:2]  # 最多2个知识点
+
+            prompt = f"""
+            为{grade_level}学生生成综合学习反馈{"和针对性练习题" if error_topics else ""}：
+            总题数：{len(graded_questions)}
+            正确数：{correct_count}
+            薄弱知识点：{"、".join(error_topics) if error_topics else "无"}
 
-            # 转换为base64
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
+            返回JSON：
+            {{
+                "overall_assessment": "整体评价",
+                "strengths": ["优势"],
+                "weaknesses": ["不足"],
+                "suggestions": ["建议"],
+                "practice_problems": [
+                    {{
+                        "topic": "知识点",
+                        "problems": [
+                            {{
+                                "question": "题目",
+                                "answer": "答案",
+                                "hint": "提示"
+                            }}
+                        ]
+                    }}
+                ]
+            }}
+            """
 
-            return {
-                "path": image_path,
-                "base64": image_base64,
-                "size": len(image_data)
+            request_data = {
+                "model": settings.get("models.nvidia.model"),
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": 1500,
+                "temperature": 0.3
             }
 
+            summary = self._parse_json_response(
+                await self._call_model("nvidia_chat", request_data, "fused_summary"), {}
+            )
+            if not isinstance(summary, dict):
+                return default_feedback, [], ["feedback", "practice"]
+
+            practice_problems = summary.pop("practice_problems", None) or []
+            degraded_steps = [] if summary else ["feedback"]
+            if not error_topics:
+                practice_problems = []
+            elif not practice_problems:
+                degraded_steps.append("practice")
+            return summary or default_feedback, practice_problems, degraded_steps
+
+        except Exception as e:
+            logger.error(f"AI反馈与练习题生成失败: {e}")
+            return default_feedback, [], ["feedback", "practice"]
+
+    async def _process_image(self, image_path: str) -> Dict[str, Any]:
+        """图像预处理 - 在工作线程池中缩放、重新编码为JPEG并转换为base64，不阻塞事件循环"""
+        try:
+            loop = asyncio.get_running_loop()
+            processed = await loop.run_in_executor(self._get_image_executor(), self._prepare_image_sync, image_path)
+            logger.info(
+                f"图像准备完成: {processed['original_size']} -> {processed['size']} bytes，"
+                f"节省 {processed['bytes_saved']} bytes，用时 {processed['prep_time']:.3f}秒"
+                f"{'（缓存）' if processed['cached'] else ''}"
+            )
+            return processed
+
         except Exception as e:
             logger.error(f"图像处理失败: {e}")
             raise
 
+    def _get_image_executor(self) -> ThreadPoolExecutor:
+        """图像处理工作线程池（惰性创建）"""
+        if self._image_executor is None:
+            self._image_executor = ThreadPoolExecutor(
+                max_workers=settings.get("batch.image_workers", 4),
+                thread_name_prefix="grading-image"
+            )
+        return self._image_executor
+
+    def _prepare_image_sync(self, image_path: str) -> Dict[str, Any]:
+        """读取、压缩并编码图像（在工作线程中执行），按 路径+修改时间+大小 缓存"""
+        start = time.perf_counter()
+        stat = Path(image_path).stat()
+        cache_key = (str(image_path), stat.st_mtime_ns, stat.st_size)
+
+        with self._image_lock:
+            cached = self._prepared_images.get(cache_key)
+            if cached is not None:
+                self._prepared_images.move_to_end(cache_key)
+                self._image_stats["cache_hits"] += 1
+
+        if cached is not None:
+            return {**cached, "cached": True, "prep_time": time.perf_counter() - start}
+
+        with open(image_path, 'rb') as f:
+            image_data = f.read()
+
+        try:
+            prepared = ImageProcessor.prepare_for_upload(image_data)
+            payload, mime_type = prepared["data"], "image/jpeg"
+            # 原图本身更小时直接发送原图（如线条简单的PNG截图）
+            if len(payload) >= len(image_data):
+                payload, mime_type = image_data, sniff_image_mime(image_data)
+        except ImageProcessingError as e:
+            logger.warning(f"图像压缩失败，发送原图: {e}")
+            payload, mime_type = image_data, sniff_image_mime(image_data)
+
+        processed = {
+            "path": image_path,
+            "data": payload,
+            "mime_type": mime_type,
+            "size": len(payload),
+            "original_size": len(image_data),
+            "bytes_saved": len(image_data) - len(payload)
+        }
+        prep_time = time.perf_counter() - start
+
+        with self._image_lock:
+            self._prepared_images[cache_key] = processed
+            while len(self._prepared_images) > self._prepared_image_entries:
+                self._prepared_images.popitem(last=False)
+            self._image_stats["prepared"] += 1
+            self._image_stats["bytes_in"] += len(image_data)
+            self._image_stats["bytes_out"] += len(payload)
+            self._image_stats["prep_time"] += prep_time
+
+        return {**processed, "cached": False, "prep_time": prep_time}
+
+    async def _image_url(self, processed_image: Dict[str, Any]) -> str:
+        """
+        图像在模型请求中的URL
+
+        客户端支持数据块上传时以二进制帧上传（服务器已有则不再传输），请求中只带 "blob:<哈希>"；
+        否则退回base64 data URL。
+        """
+        upload_blob = getattr(self.mcp_client, "upload_blob", None)
+        if settings.get("mcp.use_blobs", True) and upload_blob is not None:
+            try:
+                digest = await upload_blob(processed_image["data"])
+                return f"{BLOB_URL_PREFIX}{digest}"
+            except Exception as e:
+                logger.warning(f"图像数据块上传失败，改为内嵌base64: {e}")
+
+        return f"data:{processed_image['mime_type']};base64,{base64.b64encode(processed_image['data']).decode('utf-8')}"
+
+    def get_image_stats(self) -> Dict[str, Any]:
+        """图像准备统计：压缩次数、缓存命中、节省字节数与耗时"""
+        with self._image_lock:
+            stats = dict(self._image_stats)
+            stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+            stats["avg_prep_time"] = stats["prep_time"] / stats["prepared"] if stats["prepared"] else 0.0
+            stats["cached_entries"] = len(self._prepared_images)
+            return stats
+
     async def _ai_image_recognition(self, processed_image: Dict[str, Any], grade_level: str) -> Dict[str, Any]:
         """AI图像识别"""
         try:
@@ -168,7 +767,7 @@ class GradingEngine:
                             {"type": "text", "text": prompt},
                             {
                                 "type": "image_url",
-                                "image_url": {"url": f"data:image/jpeg;base64,{processed_image['base64']}"}
+                                "image_url": {"url": await self._image_url(processed_image)}
                             }
                         ]
                     }
@@ -177,7 +776,7 @@ class GradingEngine:
                 "temperature": 0.1
             }
 
-            response = await self.mcp_client.call_tool("nvidia_vision", request_data)
+            response = await self._call_model("nvidia_vision", request_data, "recognition")
 
             # 解析响应
             if isinstance(response, str):
@@ -192,101 +791,334 @@ class GradingEngine:
             logger.error(f"AI图像识别失败: {e}")
             raise
 
+    def _get_call_semaphore(self) -> asyncio.Semaphore:
+        """获取模型调用并发信号量（按事件循环惰性创建）"""
+        loop = asyncio.get_running_loop()
+        if self._call_semaphore is None or self._semaphore_loop is not loop:
+            self._call_semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphore_loop = loop
+        return self._call_semaphore
+
+    async def _call_model(self, tool_name: str, request_data: Dict[str, Any], kind: str = "other") -> Any:
+        """
+        在并发上限内调用模型工具，并根据调用结果更新健康状态
+
+        kind 标明调用所属环节（recognition/analysis/grading/feedback/practice 等），
+        每次调用的耗时、排队时间、token用量和模型都会记录到指标注册表和当前作业的 timings。
+        """
+        queued_at = time.perf_counter()
+        async with self._get_call_semaphore():
+            started_at = time.perf_counter()
+            response = None
+            usage = None
+            error = None
+            try:
+                response, usage = self._unwrap_tool_result(
+                    await self.mcp_client.call_tool(tool_name, request_data)
+                )
+            except Exception as e:
+                error = e
+                if self._counts_as_model_failure(e):
+                    self.health_monitor.record_failure(e)
+                raise
+            else:
+                self.health_monitor.record_success()
+                return response
+            finally:
+                self._record_call(kind, tool_name, request_data, response, error,
+                                  queue_time=started_at - queued_at,
+                                  wall_time=time.perf_counter() - started_at, usage=usage)
+
+    @staticmethod
+    def _counts_as_model_failure(error: BaseException) -> bool:
+        """
+        调用失败是否说明模型服务不健康
+
+        服务器繁忙（准入控制拒绝）只说明本地负载高，请求没有到达模型，不计入熔断器的连续失败次数，
+        否则服务端背压会让后续作业被降级为基础批改。超时照常计入：上游挂起时熔断器需要打开，
+        让后续作业快速降级，而不是每次调用都等满 mcp.call_timeout。
+        """
+        return not isinstance(error, MCPServerBusyError)
+
+    @staticmethod
+    def _unwrap_tool_result(result: Any) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        """
+        从MCP工具结果中取出模型输出文本和上游token用量
+
+        MCP服务器的模型工具返回 {"content": [{"type": "text", ...}], "_meta": {"usage": ...}}，
+        工具报告错误（isError）时抛出异常；直接返回文本或对象的客户端（如模拟客户端）原样使用。
+        """
+        if not (isinstance(result, dict) and isinstance(result.get("content"), list)):
+            return result, None
+
+        text = "".join(part.get("text", "") for part in result["content"] if part.get("type") == "text")
+        if result.get("isError"):
+            raise Exception(f"模型工具调用失败: {text}")
+        usage = (result.get("_meta") or {}).get("usage")
+        return text, usage if isinstance(usage, dict) else None
+
+    def _record_call(self, kind: str, tool_name: str, request_data: Dict[str, Any], response: Any,
+                     error: Optional[Exception], queue_time: float, wall_time: float,
+                     usage: Optional[Dict[str, Any]] = None):
+        """记录一次上游调用的耗时、排队时间、token用量与费用"""
+        model = request_data.get("model") or "unknown"
+        prompt_tokens, completion_tokens = self._token_usage(request_data, response, usage)
+        cost = (prompt_tokens * settings.get("metrics.prompt_price_per_1k", 0.0)
+                + completion_tokens * settings.get("metrics.completion_price_per_1k", 0.0)) / 1000
+
+        metrics_registry.observe("model_call_seconds", wall_time, kind=kind, tool=tool_name, model=model)
+        metrics_registry.observe("model_call_queue_seconds", queue_time, kind=kind)
+        metrics_registry.increment("model_calls_total", kind=kind, model=model, success=error is None)
+        metrics_registry.increment("model_tokens_total", prompt_tokens, kind=kind, model=model, type="prompt")
+        metrics_registry.increment("model_tokens_total", completion_tokens, kind=kind, model=model, type="completion")
+        metrics_registry.increment("model_cost_total", cost, model=model)
+
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.record_call({
+                "kind": kind,
+                "tool": tool_name,
+                "model": model,
+                "success": error is None,
+                "wall_time": wall_time,
+                "queue_time": queue_time,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "cost": cost
+            })
+
+    @staticmethod
+    def _token_usage(request_data: Dict[str, Any], response: Any,
+                     usage: Optional[Dict[str, Any]] = None) -> Tuple[int, int]:
+        """
+        获取调用的token用量
+
+        有上游统计的用量（工具结果的 _meta.usage 或响应的 usage 字段）时使用统计值，
+        否则按字符数估算（中文约一字一token）。
+        """
+        if usage is None and isinstance(response, dict) and isinstance(response.get("usage"), dict):
+            usage = response["usage"]
+        if usage is not None:
+            return int(usage.get("prompt_tokens", 0)), int(usage.get("completion_tokens", 0))
+
+        prompt_chars = 0
+        image_count = 0
+        for message in request_data.get("messages", []):
+            content = message.get("content", "")
+            if isinstance(content, list):
+                for part in content:
+                    if part.get("type") == "text":
+                        prompt_chars += len(part.get("text", ""))
+                    else:
+                        image_count += 1
+            else:
+                prompt_chars += len(str(content))
+
+        prompt_tokens = prompt_chars + image_count * settings.get("metrics.image_tokens", 1000)
+        if response is None:
+            return prompt_tokens, 0
+        completion_text = response if isinstance(response, str) else json.dumps(response, ensure_ascii=False)
+        return prompt_tokens, len(completion_text)
+
+    async def _memoized(self, memo: Optional[QuestionMemo], key: str,
+                        compute: Callable[[], Awaitable[Tuple[Any, bool]]]) -> Any:
+        """
+        先查记忆表，未命中再计算
+
+        compute 返回 (结果, 是否可记忆)。同一键的并发请求共享一次计算，
+        避免整班作业同时批改时重复请求同一道题。所有等待方都被取消（如路由超时）时
+        取消这次计算，让取消传到MCP服务器，不再为没人要的结果付费。
+        """
+        if memo is None:
+            return (await compute())[0]
+
+        cached = await asyncio.to_thread(memo.get, key)
+        if cached is not None:
+            return cached
+
+        future = self._memo_inflight.get(key)
+        if future is None:
+            async def compute_and_store():
+                value, memoizable = await compute()
+                if memoizable:
+                    await asyncio.to_thread(memo.put, key, value)
+                return value
+
+            future = asyncio.ensure_future(compute_and_store())
+            self._memo_inflight[key] = future
+            future.add_done_callback(lambda done: self._forget_inflight(key, done))
+
+        # shield: 某个等待方被取消时不影响其他共享同一计算的题目
+        self._memo_waiters[future] = self._memo_waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self._memo_waiters[future] -= 1
+            if not self._memo_waiters[future]:
+                del self._memo_waiters[future]
+                if not future.done():
+                    # 最后一个等待方已离开，之后的请求重新计算而不是等待被取消的计算
+                    self._forget_inflight(key, future)
+                    future.cancel()
+
+    def _forget_inflight(self, key: str, future: asyncio.Future):
+        """移除进行中的计算（只移除仍登记在该键下的同一个计算）"""
+        if self._memo_inflight.get(key) is future:
+            del self._memo_inflight[key]
+
     async def _ai_analyze_questions(self, ocr_results: Dict[str, Any], grade_level: str) -> List[Dict[str, Any]]:
-        """AI分析题目"""
+        """AI分析题目 - 逐题并发，结果保持题目顺序"""
+        questions = ocr_results.get("questions", [])
+        return list(await asyncio.gather(
+            *(self._analyze_single_question(q, grade_level) for q in questions)
+        ))
+
+    async def _analyze_single_question(self, q: Dict[str, Any], grade_level: str) -> Dict[str, Any]:
+        """分析单道题目（同题同年级复用记忆结果），失败时仅降级本题"""
         try:
-            questions = ocr_results.get("questions", [])
-            analyzed = []
-
-            for q in questions:
-                prompt = f"""
-                分析这道{grade_level}数学题：
-                题目：{q.get('question_text', '')}
-                学生答案：{q.get('student_answer', '')}
-
-                返回JSON：
-                {{
-                    "question_type": "题目类型",
-                    "topic": "知识点",
-                    "difficulty": "难度",
-                    "correct_answer": "正确答案",
-                    "solution_steps": ["解题步骤"]
-                }}
-                """
-
-                request_data = {
-                    "model": settings.get("models.nvidia.model"),
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 1000,
-                    "temperature": 0.1
-                }
+            memo_key = make_memo_key(
+                PROMPT_VERSION, settings.get("models.nvidia.model"), grade_level,
+                normalize_text(q.get('question_text', ''))
+            )
+            analysis = await self._memoized(
+                self.analysis_memo, memo_key, lambda: self._request_question_analysis(q, grade_level)
+            )
 
-                analysis = await self.mcp_client.call_tool("nvidia_chat", request_data)
+            # 合并数据
+            return {**q, **analysis}
 
-                if isinstance(analysis, str):
-                    try:
-                        analysis = json.loads(analysis)
-                    except:
-                        analysis = {"question_type": "计算题", "topic": "未知", "difficulty": "中等"}
+        except Exception as e:
+            logger.error(f"AI题目分析失败: 第{q.get('number', '?')}题, {e}")
+            return {
+                **q,
+                "question_type": "计算题",
+                "topic": "未知",
+                "difficulty": "中等",
+                "analysis_error": str(e)
+            }
 
-                # 合并数据
-                analyzed_q = {**q, **analysis}
-                analyzed.append(analyzed_q)
+    async def _request_question_analysis(self, q: Dict[str, Any], grade_level: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        请求模型分析题目，返回 (分析结果, 是否可记忆)
+
+        分析结果按题目记忆并在不同学生之间复用，提示词中只能出现题目本身，不能带学生答案。
+        """
+        prompt = f"""
+        分析这道{grade_level}数学题：
+        题目：{q.get('question_text', '')}
+
+        返回JSON：
+        {{
+            "question_type": "题目类型",
+            "topic": "知识点",
+            "difficulty": "难度",
+            "correct_answer": "正确答案",
+            "solution_steps": ["解题步骤"]
+        }}
+        """
+
+        request_data = {
+            "model": settings.get("models.nvidia.model"),
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 1000,
+            "temperature": 0.1
+        }
 
-            return analyzed
+        analysis = self._parse_json_response(await self._call_model("nvidia_chat", request_data, "analysis"), None)
+        if not isinstance(analysis, dict):
+            return {"question_type": "计算题", "topic": "未知", "difficulty": "中等", "analysis_error": "解析失败"}, False
 
-        except Exception as e:
-            logger.error(f"AI题目分析失败: {e}")
-            raise
+        return analysis, True
+
+    async def _analyze_and_grade_stream(self, questions: List[Dict[str, Any]],
+                                        grade_level: str) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """逐题先分析后批改，按完成先后产出 (题目序号, 批改结果)"""
+        async def analyze_and_grade(index: int, q: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+            analyzed_q = await self._analyze_single_question(q, grade_level)
+            return index, await self._grade_single_question(analyzed_q, grade_level)
+
+        tasks = [asyncio.create_task(analyze_and_grade(i, q)) for i, q in enumerate(questions)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # 消费方提前退出时取消剩余题目
+            for task in tasks:
+                task.cancel()
 
     async def _ai_grade_questions(self, questions: List[Dict[str, Any]], grade_level: str) -> List[Dict[str, Any]]:
-        """AI批改题目"""
+        """AI批改题目 - 逐题并发，结果保持题目顺序"""
+        return list(await asyncio.gather(
+            *(self._grade_single_question(q, grade_level) for q in questions)
+        ))
+
+    async def _grade_single_question(self, q: Dict[str, Any], grade_level: str) -> Dict[str, Any]:
+        """批改单道题目（同题同答案复用记忆结果），失败时仅降级本题"""
         try:
-            graded = []
-
-            for q in questions:
-                prompt = f"""
-                批改这道{grade_level}数学题：
-                题目：{q.get('question_text', '')}
-                正确答案：{q.get('correct_answer', '')}
-                学生答案：{q.get('student_answer', '')}
-
-                返回JSON：
-                {{
-                    "is_correct": true/false,
-                    "score": 得分,
-                    "max_score": 10,
-                    "feedback": "详细反馈",
-                    "errors": ["错误点"]
-                }}
-                """
-
-                request_data = {
-                    "model": settings.get("models.nvidia.model"),
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 800,
-                    "temperature": 0.1
-                }
+            memo_key = make_memo_key(
+                PROMPT_VERSION, settings.get("models.nvidia.model"), grade_level,
+                normalize_text(q.get('question_text', '')), normalize_answer(q.get('student_answer', '')),
+                normalize_answer(q.get('correct_answer', ''))
+            )
+            # 分析失败或没有正确答案时提示词中的"正确答案"为空，这样的批改结果不记忆也不复用
+            memo = self.grading_memo if self._has_reference_answer(q) else None
+            grading = await self._memoized(
+                memo, memo_key, lambda: self._request_question_grading(q, grade_level)
+            )
 
-                grading = await self.mcp_client.call_tool("nvidia_chat", request_data)
+            return {**q, **grading}
 
-                if isinstance(grading, str):
-                    try:
-                        grading = json.loads(grading)
-                    except:
-                        grading = {"is_correct": False, "score": 0, "max_score": 10, "feedback": "批改失败"}
+        except Exception as e:
+            logger.error(f"AI批改失败: 第{q.get('number', '?')}题, {e}")
+            return {
+                **q,
+                "is_correct": False,
+                "score": 0,
+                "max_score": 10,
+                "feedback": "本题批改失败，请稍后重试",
+                "grading_error": str(e)
+            }
 
-                graded_q = {**q, **grading}
-                graded.append(graded_q)
+    @staticmethod
+    def _has_reference_answer(q: Dict[str, Any]) -> bool:
+        """题目分析成功且给出了正确答案"""
+        return not q.get("analysis_error") and bool(normalize_answer(q.get("correct_answer", "")))
+
+    async def _request_question_grading(self, q: Dict[str, Any], grade_level: str) -> Tuple[Dict[str, Any], bool]:
+        """请求模型批改题目，返回 (批改结果, 是否可记忆)"""
+        prompt = f"""
+        批改这道{grade_level}数学题：
+        题目：{q.get('question_text', '')}
+        正确答案：{q.get('correct_answer', '')}
+        学生答案：{q.get('student_answer', '')}
+
+        返回JSON：
+        {{
+            "is_correct": true/false,
+            "score": 得分,
+            "max_score": 10,
+            "feedback": "详细反馈",
+            "errors": ["错误点"]
+        }}
+        """
+
+        request_data = {
+            "model": settings.get("models.nvidia.model"),
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": 800,
+            "temperature": 0.1
+        }
 
-            return graded
+        grading = self._parse_json_response(await self._call_model("nvidia_chat", request_data, "grading"), None)
+        if not isinstance(grading, dict):
+            return {"is_correct": False, "score": 0, "max_score": 10, "feedback": "批改失败",
+                    "grading_error": "解析失败"}, False
 
-        except Exception as e:
-            logger.error(f"AI批改失败: {e}")
-            raise
+        return grading, True
 
-    async def _generate_ai_feedback(self, graded_questions: List[Dict[str, Any]], grade_level: str) -> Dict[str, Any]:
-        """生成AI反馈"""
+    async def _generate_ai_feedback(self, graded_questions: List[Dict[str, Any]],
+                                    grade_level: str) -> Optional[Dict[str, Any]]:
+        """生成AI反馈，调用或解析失败时返回None"""
         try:
             correct_count = sum(1 for q in graded_questions if q.get('is_correct', False))
             total_questions = len(graded_questions)
@@ -312,22 +1144,50 @@ class GradingEngine:
                 "temperature": 0.3
             }
 
-            feedback = await self.mcp_client.call_tool("nvidia_chat", request_data)
-
-            if isinstance(feedback, str):
-                try:
-                    return json.loads(feedback)
-                except:
-                    return {"overall_assessment": "批改完成", "suggestions": ["继续努力"]}
-
-            return feedback
+            feedback = self._parse_json_response(
+                await self._call_model("nvidia_chat", request_data, "feedback"), None
+            )
+            return feedback if isinstance(feedback, dict) and feedback else None
 
         except Exception as e:
             logger.error(f"AI反馈生成失败: {e}")
-            return {"overall_assessment": "批改完成", "suggestions": ["继续努力"]}
+            return None
 
-    async def _generate_practice_problems(self, graded_questions: List[Dict[str, Any]], grade_level: str) -> List[Dict[str, Any]]:
-        """生成练习题"""
+    async def _generate_feedback_and_practice(self, graded_questions: List[Dict[str, Any]], grade_level: str
+                                              ) -> Tuple[Dict[str, Any], List[Dict[str, Any]], List[str]]:
+        """
+        并发生成AI反馈与练习题，两个分支共享同一截止时间，超时分支返回部分结果
+
+        第三项为使用了默认反馈或部分练习题的环节（feedback/practice），这类结果不进入批改结果缓存。
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.get("grading.post_process_timeout", 60)
+
+        feedback_task = asyncio.create_task(self._generate_ai_feedback(graded_questions, grade_level))
+        practice_task = asyncio.create_task(
+            self._generate_practice_problems(graded_questions, grade_level, deadline=deadline)
+        )
+
+        degraded_steps = []
+        try:
+            ai_feedback = await asyncio.wait_for(feedback_task, timeout=max(0.0, deadline - loop.time()))
+        except asyncio.TimeoutError:
+            logger.warning("AI反馈生成超时，使用默认反馈")
+            ai_feedback = None
+        if ai_feedback is None:
+            ai_feedback = {"overall_assessment": "批改完成", "suggestions": ["继续努力"]}
+            degraded_steps.append("feedback")
+
+        # 练习题分支按截止时间自行收尾，返回已完成知识点的部分结果
+        practice_problems, practice_complete = await practice_task
+        if not practice_complete:
+            degraded_steps.append("practice")
+
+        return ai_feedback, practice_problems, degraded_steps
+
+    async def _generate_practice_problems(self, graded_questions: List[Dict[str, Any]], grade_level: str,
+                                          deadline: Optional[float] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """生成练习题 - 各知识点并发请求，超过截止时间时返回已完成的部分，第二项表示是否全部知识点都已生成"""
         try:
             # 找出错误的知识点
             error_topics = []
@@ -338,82 +1198,111 @@ class GradingEngine:
                         error_topics.append(topic)
 
             if not error_topics:
-                return []
+                return [], True
 
-            practice_problems = []
-            for topic in error_topics[:2]:  # 最多2个知识点
-                prompt = f"""
-                为{grade_level}学生生成关于"{topic}"的练习题：
-                
-                返回JSON：
-                {{
-                    "topic": "{topic}",
-                    "problems": [
-                        {{
-                            "question": "题目",
-                            "answer": "答案",
-                            "hint": "提示"
-                        }}
-                    ]
-                }}
-                """
-
-                request_data = {
-                    "model": settings.get("models.nvidia.model"),
-                    "messages": [{"role": "user", "content": prompt}],
-                    "max_tokens": 1000,
-                    "temperature": 0.5
-                }
+            tasks = [
+                asyncio.create_task(self._generate_topic_problems(topic, grade_level))
+                for topic in error_topics[:2]  # 最多2个知识点
+            ]
 
-                problems = await self.mcp_client.call_tool("nvidia_chat", request_data)
+            timeout = None
+            if deadline is not None:
+                timeout = max(0.0, deadline - asyncio.get_running_loop().time())
 
-                if isinstance(problems, str):
-                    try:
-                        problems = json.loads(problems)
-                        practice_problems.append(problems)
-                    except:
-                        pass
+            done, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.warning(f"练习题生成超时，返回 {len(done)}/{len(tasks)} 个知识点的部分结果")
+
+            # 按知识点顺序收集已完成的结果
+            practice_problems = []
+            for task in tasks:
+                if task in done and task.result():
+                    practice_problems.append(task.result())
 
-            return practice_problems
+            return practice_problems, len(practice_problems) == len(tasks)
 
         except Exception as e:
             logger.error(f"练习题生成失败: {e}")
-            return []
+            return [], False
+
+    async def _generate_topic_problems(self, topic: str, grade_level: str) -> Optional[Dict[str, Any]]:
+        """为单个知识点生成练习题，失败时返回None"""
+        try:
+            prompt = f"""
+            为{grade_level}学生生成关于"{topic}"的练习题：
+
+            返回JSON：
+            {{
+                "topic": "{topic}",
+                "problems": [
+                    {{
+                        "question": "题目",
+                        "answer": "答案",
+                        "hint": "提示"
+                    }}
+                ]
+            }}
+            """
+
+            request_data = {
+                "model": settings.get("models.nvidia.model"),
+                "messages": [{"role": "user", "content": prompt}],
+                "max_tokens": 1000,
+                "temperature": 0.5
+            }
+
+            problems = self._parse_json_response(await self._call_model("nvidia_chat", request_data, "practice"), None)
+            return problems if isinstance(problems, dict) else None
+
+        except Exception as e:
+            logger.error(f"知识点练习题生成失败: {topic}, {e}")
+            return None
+
+    @staticmethod
+    def _format_question_result(q: Dict[str, Any]) -> Dict[str, Any]:
+        """将单题批改数据转换为标准结果格式"""
+        return {
+            "question_text": q.get("question_text", ""),
+            "student_answer": q.get("student_answer", ""),
+            "correct_answer": q.get("correct_answer", ""),
+            "score": q.get("score", 0),
+            "max_score": q.get("max_score", 10),
+            "is_correct": q.get("is_correct", False),
+            "initial_feedback": q.get("feedback", ""),
+            "enhanced_feedback": q.get("feedback", "") + "\n" + "\n".join(q.get("errors", [])),
+            "topic": q.get("topic", "基础数学"),
+            "difficulty": q.get("difficulty", "中等"),
+            "question_type": q.get("question_type", "计算题")
+        }
 
     def _compile_ai_results(self, graded_questions: List[Dict[str, Any]],
                             ai_feedback: Dict[str, Any],
                             practice_problems: List[Dict[str, Any]],
                             processing_time: float,
-                            grade_level: str) -> Dict[str, Any]:
-        """编译AI批改结果"""
+                            grade_level: str,
+                            degraded_steps: Optional[List[str]] = None) -> Dict[str, Any]:
+        """编译AI批改结果，degraded_steps 为使用了默认/部分结果的环节"""
 
         # 转换为标准格式
-        results = []
-        for q in graded_questions:
-            result = {
-                "question_text": q.get("question_text", ""),
-                "student_answer": q.get("student_answer", ""),
-                "correct_answer": q.get("correct_answer", ""),
-                "score": q.get("score", 0),
-                "max_score": q.get("max_score", 10),
-                "is_correct": q.get("is_correct", False),
-                "initial_feedback": q.get("feedback", ""),
-                "enhanced_feedback": q.get("feedback", "") + "\n" + "\n".join(q.get("errors", [])),
-                "topic": q.get("topic", "基础数学"),
-                "difficulty": q.get("difficulty", "中等"),
-                "question_type": q.get("question_type", "计算题")
-            }
-            results.append(result)
+        results = [self._format_question_result(q) for q in graded_questions]
 
         # 计算统计信息
         total_questions = len(results)
         correct_count = sum(1 for r in results if r["is_correct"])
         total_score = sum(r["score"] for r in results)
         max_total_score = sum(r["max_score"] for r in results)
+        degraded_questions = sum(
+            1 for q in graded_questions if q.get("analysis_error") or q.get("grading_error")
+        )
+
+        degraded_steps = list(degraded_steps or [])
 
         return {
             "success": True,
             "mode": "ai_powered",  # 重要：标识这是AI处理的结果
+            "degraded": bool(degraded_questions or degraded_steps),
             "results": results,
             "statistics": {
                 "total_questions": total_questions,
@@ -422,12 +1311,15 @@ class GradingEngine:
                 "total_score": total_score,
                 "max_total_score": max_total_score,
                 "score_percentage": (total_score / max_total_score * 100) if max_total_score > 0 else 0,
+                "degraded_questions": degraded_questions,
+                "degraded_steps": degraded_steps,
                 "topic_breakdown": {}  # 可以进一步完善
             },
             "ai_feedback": ai_feedback,
             "practice_problems": practice_problems,
             "processing_time": processing_time,
             "grade_level": grade_level,
+            "grading_mode": self.mode,
             "ai_features_used": [
                 "AI图像识别",
                 "智能题目分析",
@@ -498,4 +1390,7 @@ RealGradingEngine = GradingEngine  # 别名，指向同一个类
 # 导出所有需要的类
 # ===============================
 
-__all__ = ['GradingEngine', 'RealGradingEngine']
\ No newline at end of file
+__all__ = [
+    'GradingEngine', 'RealGradingEngine',
+    'GRADING_MODE_PIPELINE', 'GRADING_MODE_FUSED', 'GRADING_MODES', 'PROMPT_VERSION'
+]
\ No newline at end of file
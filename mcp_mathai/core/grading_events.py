@@ -0,0 +1,87 @@
+# ===============================
+# core/grading_events.py - 流式批改事件
+# ===============================
+import time
+from enum import Enum
+from typing import Dict, Any, Optional
+
+
+class GradingEventType(str, Enum):
+    """流式批改事件类型"""
+    STAGE_STARTED = "stage_started"          # 阶段开始
+    STAGE_FINISHED = "stage_finished"        # 阶段结束（带耗时）
+    QUESTION_GRADED = "question_graded"      # 单题批改完成
+    FEEDBACK = "feedback"                    # 综合反馈
+    PRACTICE_PROBLEMS = "practice_problems"  # 练习题
+    COMPLETED = "completed"                  # 最终结果
+
+
+# 批改阶段
+STAGE_IMAGE_PROCESSING = "image_processing"
+STAGE_RECOGNITION = "recognition"
+STAGE_QUESTION_GRADING = "question_grading"
+STAGE_FUSED_GRADING = "fused_grading"
+STAGE_FEEDBACK = "feedback"
+
+
+class GradingEvent:
+    """流式批改事件"""
+
+    def __init__(self, event_type: GradingEventType, homework_id: Any, elapsed: float,
+                 stage: Optional[str] = None, data: Any = None, duration: Optional[float] = None):
+        self.type = event_type
+        self.homework_id = homework_id
+        self.elapsed = elapsed      # 距批改开始的秒数
+        self.stage = stage
+        self.data = data
+        self.duration = duration    # 仅阶段结束事件：本阶段耗时
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        event = {
+            "type": self.type.value,
+            "homework_id": self.homework_id,
+            "elapsed": round(self.elapsed, 3)
+        }
+        if self.stage is not None:
+            event["stage"] = self.stage
+        if self.duration is not None:
+            event["duration"] = round(self.duration, 3)
+        if self.data is not None:
+            event["data"] = self.data
+        return event
+
+    def __repr__(self):
+        return f"GradingEvent(type={self.type.value}, stage={self.stage}, elapsed={self.elapsed:.3f})"
+
+
+class GradingTimer:
+    """记录批改起止时间，生成带计时信息的事件"""
+
+    def __init__(self, homework_id: Any):
+        self.homework_id = homework_id
+        self.started_at = time.perf_counter()
+        self.stage_durations: Dict[str, float] = {}
+        self._stage_started: Dict[str, float] = {}
+
+    def elapsed(self) -> float:
+        """距批改开始的秒数"""
+        return time.perf_counter() - self.started_at
+
+    def event(self, event_type: GradingEventType, stage: Optional[str] = None, data: Any = None) -> GradingEvent:
+        """生成普通事件"""
+        return GradingEvent(event_type, self.homework_id, self.elapsed(), stage=stage, data=data)
+
+    def stage_started(self, stage: str) -> GradingEvent:
+        """标记阶段开始"""
+        self._stage_started[stage] = time.perf_counter()
+        return self.event(GradingEventType.STAGE_STARTED, stage=stage)
+
+    def stage_finished(self, stage: str, **data) -> GradingEvent:
+        """标记阶段结束并记录耗时"""
+        duration = time.perf_counter() - self._stage_started.get(stage, self.started_at)
+        self.stage_durations[stage] = duration
+        return GradingEvent(
+            GradingEventType.STAGE_FINISHED, self.homework_id, self.elapsed(),
+            stage=stage, data=data or None, duration=duration
+        )
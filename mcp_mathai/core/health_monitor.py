@@ -0,0 +1,146 @@
+# ===============================
+# core/health_monitor.py - AI服务健康状态与熔断器
+# ===============================
+import threading
+import time
+from enum import Enum
+from typing import Dict, Any, Optional
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger("health_monitor")
+
+
+class HealthState(Enum):
+    """AI服务健康状态"""
+    UNKNOWN = "unknown"
+    HEALTHY = "healthy"
+    UNHEALTHY = "unhealthy"
+
+
+class CircuitState(Enum):
+    """熔断器状态"""
+    CLOSED = "closed"        # 正常放行
+    OPEN = "open"            # 快速失败
+    HALF_OPEN = "half_open"  # 放行单个探测请求
+
+
+class AIHealthMonitor:
+    """
+    AI服务健康监控器
+
+    - 健康状态带TTL缓存，有效期内无需再发探测请求
+    - 真实调用的成功/失败被动更新健康状态
+    - 连续失败达到阈值后熔断，冷却后进入半开状态放行一个探测请求
+    """
+
+    def __init__(self, ttl: Optional[float] = None, failure_threshold: Optional[int] = None,
+                 reset_timeout: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else settings.get("health.ttl", 300)
+        self.failure_threshold = failure_threshold or settings.get("health.failure_threshold", 3)
+        self.reset_timeout = reset_timeout if reset_timeout is not None else settings.get("health.reset_timeout", 30)
+
+        # 引擎可能在GUI线程和Web事件循环中同时使用，状态用线程锁保护
+        self._lock = threading.Lock()
+        self.state = HealthState.UNKNOWN
+        self.circuit = CircuitState.CLOSED
+        self.last_updated = 0.0
+        self.opened_at = 0.0
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self._probe_in_flight = False
+
+    def is_healthy(self) -> bool:
+        """缓存的健康状态是否有效且健康"""
+        with self._lock:
+            return (
+                self.state == HealthState.HEALTHY
+                and self.circuit == CircuitState.CLOSED
+                and time.monotonic() - self.last_updated < self.ttl
+            )
+
+    def allow_request(self) -> bool:
+        """熔断器是否放行请求；打开状态冷却结束后放行一个半开探测"""
+        with self._lock:
+            if self.circuit == CircuitState.CLOSED:
+                return True
+
+            if self.circuit == CircuitState.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.circuit = CircuitState.HALF_OPEN
+                self._probe_in_flight = False
+                logger.info("熔断器进入半开状态，放行探测请求")
+
+            # 半开状态只放行一个探测请求
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        """记录一次成功调用"""
+        with self._lock:
+            if self.circuit != CircuitState.CLOSED:
+                logger.info("AI服务已恢复，熔断器关闭")
+            self.state = HealthState.HEALTHY
+            self.circuit = CircuitState.CLOSED
+            self.consecutive_failures = 0
+            self.last_error = None
+            self.last_updated = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_failure(self, error: Any = None):
+        """记录一次失败调用"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self.last_error = str(error) if error is not None else None
+            self.last_updated = time.monotonic()
+            self._probe_in_flight = False
+
+            if self.circuit == CircuitState.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.circuit != CircuitState.OPEN:
+                    logger.warning(f"AI服务连续失败{self.consecutive_failures}次，熔断器打开")
+                self.state = HealthState.UNHEALTHY
+                self.circuit = CircuitState.OPEN
+                self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """
+        释放半开状态的探测名额
+
+        探测调用被取消（CancelledError 不是 Exception），或以不计入健康状态的错误结束时，
+        record_success/record_failure 都不会执行，需由发起探测的一方释放，否则熔断器一直停在半开状态。
+        """
+        with self._lock:
+            if self.circuit == CircuitState.HALF_OPEN:
+                self._probe_in_flight = False
+
+    def reset(self):
+        """重置为初始状态"""
+        with self._lock:
+            self.state = HealthState.UNKNOWN
+            self.circuit = CircuitState.CLOSED
+            self.last_updated = 0.0
+            self.opened_at = 0.0
+            self.consecutive_failures = 0
+            self.last_error = None
+            self._probe_in_flight = False
+
+    def get_status(self) -> Dict[str, Any]:
+        """获取健康状态快照"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                "state": self.state.value,
+                "circuit": self.circuit.value,
+                "consecutive_failures": self.consecutive_failures,
+                "last_error": self.last_error,
+                "seconds_since_update": now - self.last_updated if self.last_updated else None,
+                "ttl": self.ttl
+            }
+
+
+# 全局共享的健康监控器
+ai_health_monitor = AIHealthMonitor()
@@ -0,0 +1,178 @@
+# ===============================
+# core/metrics.py - 进程内指标注册表
+# ===============================
+import bisect
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from config.settings import settings
+
+# 默认延迟直方图桶上界（秒）
+DEFAULT_LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120]
+
+
+class LatencyHistogram:
+    """
+    延迟直方图
+
+    按桶累计计数，同时保留最近若干个样本用于计算 p50/p95/p99。
+    """
+
+    def __init__(self, buckets: Optional[List[float]] = None, reservoir_size: int = 1024):
+        self.buckets = sorted(buckets or DEFAULT_LATENCY_BUCKETS)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)  # 最后一个为 +Inf 桶
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._recent: deque = deque(maxlen=reservoir_size)
+
+    def observe(self, value: float):
+        """记录一个样本"""
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self._recent.append(value)
+
+    def percentile(self, p: float) -> float:
+        """最近样本的分位数"""
+        if not self._recent:
+            return 0.0
+        samples = sorted(self._recent)
+        return samples[min(len(samples) - 1, int(round(p * (len(samples) - 1))))]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        bounds = [str(b) for b in self.buckets] + ["+Inf"]
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "avg": self.sum / self.count if self.count else 0.0,
+            "min": self.min or 0.0,
+            "max": self.max or 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip(bounds, self.bucket_counts))
+        }
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表
+
+    指标按 名称+标签 区分，支持延迟直方图和累加计数器。
+    批改引擎可能同时在GUI线程和Web事件循环中使用，所有操作用线程锁保护。
+    """
+
+    def __init__(self, buckets: Optional[List[float]] = None):
+        self.buckets = buckets or settings.get("metrics.latency_buckets", DEFAULT_LATENCY_BUCKETS)
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, tuple], LatencyHistogram] = {}
+        self._counters: Dict[Tuple[str, tuple], float] = {}
+        self.started_at = time.time()
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, tuple]:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def observe(self, name: str, value: float, **labels):
+        """向直方图记录一个样本"""
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram(self.buckets)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        """累加计数器"""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def snapshot(self, prefix: Optional[str] = None) -> Dict[str, Any]:
+        """获取全部指标快照，可按名称前缀过滤"""
+        with self._lock:
+            histograms = [
+                {"name": name, "labels": dict(labels), **histogram.to_dict()}
+                for (name, labels), histogram in sorted(self._histograms.items())
+                if not prefix or name.startswith(prefix)
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+                if not prefix or name.startswith(prefix)
+            ]
+            return {
+                "uptime": time.time() - self.started_at,
+                "histograms": histograms,
+                "counters": counters
+            }
+
+    def reset(self):
+        """清空全部指标"""
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self.started_at = time.time()
+
+
+class GradingTimings:
+    """单份作业的计时明细：各阶段耗时与每次上游调用的耗时、排队时间、token和模型"""
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.calls: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record_stage(self, stage: str, duration: float):
+        """记录阶段耗时"""
+        with self._lock:
+            self.stages[stage] = duration
+
+    def record_call(self, call: Dict[str, Any]):
+        """记录一次上游调用"""
+        with self._lock:
+            self.calls.append(call)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """汇总为结果中的 timings 字段"""
+        with self._lock:
+            by_kind: Dict[str, Dict[str, Any]] = {}
+            for call in self.calls:
+                kind = by_kind.setdefault(call["kind"], {
+                    "calls": 0, "errors": 0, "wall_time": 0.0, "max_wall_time": 0.0,
+                    "queue_time": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0
+                })
+                kind["calls"] += 1
+                kind["errors"] += 0 if call["success"] else 1
+                kind["wall_time"] += call["wall_time"]
+                kind["max_wall_time"] = max(kind["max_wall_time"], call["wall_time"])
+                kind["queue_time"] += call["queue_time"]
+                kind["prompt_tokens"] += call["prompt_tokens"]
+                kind["completion_tokens"] += call["completion_tokens"]
+                kind["cost"] += call["cost"]
+
+            return {
+                "total": time.perf_counter() - self.started_at,
+                "stages": dict(self.stages),
+                "calls_by_kind": by_kind,
+                "totals": {
+                    "calls": len(self.calls),
+                    "queue_time": sum(c["queue_time"] for c in self.calls),
+                    "prompt_tokens": sum(c["prompt_tokens"] for c in self.calls),
+                    "completion_tokens": sum(c["completion_tokens"] for c in self.calls),
+                    "cost": sum(c["cost"] for c in self.calls)
+                },
+                "calls": list(self.calls)
+            }
+
+
+# 全局共享的指标注册表
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,171 @@
+# ===============================
+# core/question_memo.py - 逐题分析/批改结果记忆表
+# ===============================
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger("question_memo")
+
+
+def normalize_text(text: Any) -> str:
+    """规范化题目/答案文本：全角转半角、去掉全部空白、统一小写"""
+    text = unicodedata.normalize("NFKC", str(text or ""))
+    text = re.sub(r"\s+", "", text)
+    return text.lower()
+
+
+def normalize_answer(answer: Any) -> str:
+    """规范化学生答案，额外去掉末尾标点"""
+    return normalize_text(answer).rstrip("。.，,；;")
+
+
+def make_memo_key(*parts: Any) -> str:
+    """由若干字段计算记忆表键"""
+    return hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+class QuestionMemo:
+    """
+    带容量上限和TTL的记忆表
+
+    内存中保留LRU热数据，所有条目写穿到SQLite文件，重启后仍可复用。
+    多个记忆表可共用同一个数据库文件，按 namespace 区分。
+    """
+
+    def __init__(self, namespace: str, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 db_path: Optional[str] = None):
+        self.namespace = namespace
+        self.max_entries = max_entries or settings.get("memo.max_entries", 5000)
+        self.ttl = ttl or settings.get("memo.ttl", 7 * 24 * 3600)
+        self.db_path = Path(db_path or settings.get("memo.path", settings.DATA_DIR / "question_memo.db"))
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.hits = 0
+        self.misses = 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        """惰性打开数据库连接（调用方持有锁）"""
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS question_memo (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+            """)
+            self._conn.execute(
+                "DELETE FROM question_memo WHERE namespace = ? AND expires_at < ?",
+                (self.namespace, time.time())
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查询记忆表，过期条目视为未命中"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at >= now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+            try:
+                row = self._get_conn().execute(
+                    "SELECT value, expires_at FROM question_memo WHERE namespace = ? AND key = ?",
+                    (self.namespace, key)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"读取记忆表失败: {e}")
+                row = None
+
+            if row is None or row[1] < now:
+                self.misses += 1
+                return None
+
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        """写入记忆表，超过容量时淘汰最早写入的条目"""
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+            try:
+                conn = self._get_conn()
+                conn.execute(
+                    "INSERT OR REPLACE INTO question_memo (namespace, key, value, created_at, expires_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, key, json.dumps(value, ensure_ascii=False), now, expires_at)
+                )
+                conn.execute(
+                    "DELETE FROM question_memo WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM question_memo WHERE namespace = ? "
+                    "ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.namespace, self.namespace, self.max_entries)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入记忆表失败: {e}")
+
+    def clear(self):
+        """清空本记忆表"""
+        with self._lock:
+            self._memory.clear()
+            try:
+                conn = self._get_conn()
+                conn.execute("DELETE FROM question_memo WHERE namespace = ?", (self.namespace,))
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"清空记忆表失败: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "namespace": self.namespace,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl
+            }
+
+    def _remember(self, key: str, value: Dict[str, Any], expires_at: float):
+        """写入内存LRU（调用方持有锁）"""
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+
+# 全局共享的记忆表：题目分析（按题目+年级）与批改（按题目+学生答案+年级）
+analysis_memo = QuestionMemo("analysis")
+grading_memo = QuestionMemo("grading")
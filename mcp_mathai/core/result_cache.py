@@ -0,0 +1,175 @@
+# ===============================
+# core/result_cache.py - 批改结果缓存
+# ===============================
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+from config.settings import settings
+from utils.logger import setup_logger
+
+logger = setup_logger("result_cache")
+
+
+class GradingResultCache:
+    """
+    按内容寻址的批改结果缓存
+
+    缓存键为图像字节的SHA-256加上年级、模型名、批改模式和提示词版本。
+    两级存储：内存LRU + 按总字节数限额的磁盘目录（按访问时间淘汰）。
+    """
+
+    def __init__(self, memory_entries: Optional[int] = None, cache_dir: Optional[str] = None,
+                 max_disk_bytes: Optional[int] = None):
+        self.memory_entries = memory_entries or settings.get("cache.memory_entries", 256)
+        self.cache_dir = Path(cache_dir or settings.get("cache.dir", settings.DATA_DIR / "result_cache"))
+        self.max_disk_bytes = max_disk_bytes or settings.get("cache.max_disk_bytes", 200 * 1024 * 1024)
+
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None  # 首次写入时统计
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(image_data: bytes, grade_level: str, model: str, mode: str, prompt_version: str) -> str:
+        """计算缓存键"""
+        digest = hashlib.sha256(image_data).hexdigest()
+        meta = f"{digest}|{grade_level}|{model}|{mode}|{prompt_version}"
+        return hashlib.sha256(meta.encode("utf-8")).hexdigest()
+
+    def _path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """查询缓存，磁盘命中会提升到内存层"""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+            path = self._path_for(key)
+            try:
+                result = json.loads(path.read_text(encoding="utf-8"))
+                os.utime(path)  # 更新访问时间，供磁盘LRU淘汰使用
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._remember(key, result)
+            return result
+
+    def put(self, key: str, result: Dict[str, Any]):
+        """写入缓存"""
+        with self._lock:
+            self._remember(key, result)
+
+            path = self._path_for(key)
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                data = json.dumps(result, ensure_ascii=False).encode("utf-8")
+                old_size = path.stat().st_size if path.exists() else 0
+                disk_bytes = self._current_disk_bytes()  # 首次写入时的扫描须在写文件之前，避免重复计入
+
+                # 先写临时文件再替换，避免读到半个文件
+                tmp_path = path.with_suffix(".tmp")
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, path)
+
+                self._disk_bytes = disk_bytes + len(data) - old_size
+                self._evict_disk()
+            except OSError as e:
+                logger.warning(f"写入磁盘缓存失败: {e}")
+
+    def invalidate(self, key: str) -> bool:
+        """删除单条缓存"""
+        with self._lock:
+            removed = self._memory.pop(key, None) is not None
+            path = self._path_for(key)
+            try:
+                size = path.stat().st_size
+                path.unlink()
+                if self._disk_bytes is not None:
+                    self._disk_bytes -= size
+                removed = True
+            except OSError:
+                pass
+            return removed
+
+    def clear(self):
+        """清空全部缓存"""
+        with self._lock:
+            self._memory.clear()
+            for path in self.cache_dir.glob("*/*.json"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._disk_bytes = 0
+            logger.info("批改结果缓存已清空")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._current_disk_bytes(),
+                "max_disk_bytes": self.max_disk_bytes
+            }
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        """写入内存LRU层（调用方持有锁）"""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _current_disk_bytes(self) -> int:
+        """磁盘层当前占用（调用方持有锁）"""
+        if self._disk_bytes is None:
+            self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+        return self._disk_bytes
+
+    def _evict_disk(self):
+        """超过磁盘限额时按访问时间淘汰最旧的条目（调用方持有锁）"""
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+
+        entries = []
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+            except OSError:
+                continue
+        entries.sort()
+
+        for _, size, path in entries:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+                self._disk_bytes -= size
+                self.evictions += 1
+            except OSError:
+                continue
+
+
+# 全局共享的批改结果缓存
+grading_result_cache = GradingResultCache()
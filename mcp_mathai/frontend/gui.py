@@ -12,6 +12,7 @@ import json
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, scrolledtext
 import asyncio
+import concurrent.futures
 import threading
 from typing import Dict, Any, Optional
 import logging
@@ -24,7 +25,8 @@ from datetime import datetime
 from config.settings import settings
 from data.models import HomeworkStatus, GradeLevel, Student, Homework
 from utils.logger import setup_logger
-from mcp_client.client import MCPClient
+from mcp_client.client import run_with_deadline
+from mcp_client.in_process import create_default_client
 from core.grading_engine import GradingEngine
 from core.model_selector import ModelSelector
 from data.database import db_manager
@@ -315,9 +317,14 @@ class MathGradingGUI:
         def grade_task():
             try:
                 future = asyncio.run_coroutine_threadsafe(
-                    self._async_grade_homework(), self.loop
+                    run_with_deadline(self._async_grade_homework(), 300), self.loop
                 )
-                results = future.result(timeout=300)  # 5分钟超时
+                try:
+                    results = future.result(timeout=300)  # 5分钟超时
+                except concurrent.futures.TimeoutError:
+                    # 取消批改协程，进行中的MCP调用随之通知服务器停止处理
+                    future.cancel()
+                    raise
 
                 # 在主线程中更新UI
                 self.root.after(0, self._create_success_handler(results))
@@ -341,17 +348,33 @@ class MathGradingGUI:
             self._on_grading_error(error_msg)
         return handler
 
+    async def _image_arguments(self, image_data: bytes) -> Dict[str, Any]:
+        """
+        analyze_homework 的图像参数
+
+        开启 mcp.use_blobs 时以二进制分块上传（服务器已有相同图像时不再传输），只传内容哈希；
+        关闭或上传失败时退回内嵌base64。
+        """
+        if settings.get("mcp.use_blobs", True):
+            try:
+                return {"image_ref": await self.mcp_client.upload_blob(image_data)}
+            except Exception as e:
+                logger.warning(f"图像数据块上传失败，改为内嵌base64: {e}")
+
+        return {"image_data": base64.b64encode(image_data).decode("utf-8")}
+
     async def _async_grade_homework(self) -> Dict[str, Any]:
         """修复版：确保调用真正的AI批改引擎"""
         try:
             # 1. 首先尝试连接MCP客户端
             if not self.mcp_client:
-                self.mcp_client = MCPClient()
+                self.mcp_client = create_default_client()
                 try:
                     await self.mcp_client.connect()
                     logger.info("✅ MCP客户端连接成功")
                 except Exception as mcp_error:
                     logger.warning(f"MCP连接失败: {mcp_error}")
+                    self.mcp_client = None
                     # 如果MCP连接失败，使用离线模式
                     return await self._offline_grade_homework()
 
@@ -363,19 +386,14 @@ class MathGradingGUI:
             logger.info("🚀 开始调用MCP批改服务...")
 
             try:
-                # 读取图像数据
-                with open(self.current_image_path, 'rb') as f:
-                    image_data = f.read()
-
-                # 转换为base64
-                import base64
-                image_base64 = base64.b64encode(image_data).decode('utf-8')
+                # 读取图像数据（在工作线程中读取，不阻塞事件循环）
+                image_data = await asyncio.to_thread(Path(self.current_image_path).read_bytes)
 
                 # 调用MCP工具
                 result = await self.mcp_client.call_tool(
                     "analyze_homework",
                     {
-                        "image_data": image_base64,
+                        **await self._image_arguments(image_data),
                         "grade_level": grade_level,
                         "student_name": student_name,
                         "analysis_type": "comprehensive"
@@ -972,9 +990,9 @@ class MathGradingGUI:
         if messagebox.askokcancel("退出", "确定要退出数学批改系统吗？"):
             try:
                 # 清理资源
-                if self.mcp_client:
-                    # 这里可以添加清理MCP连接的代码
-                    pass
+                if self.mcp_client and self.loop:
+                    future = asyncio.run_coroutine_threadsafe(self.mcp_client.disconnect(), self.loop)
+                    future.result(timeout=5)
 
                 if self.loop:
                     self.loop.call_soon_threadsafe(self.loop.stop)
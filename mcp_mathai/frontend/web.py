@@ -5,6 +5,7 @@ from flask import Flask, render_template, request, jsonify, redirect, url_for, f
 from flask_socketio import SocketIO, emit
 import os
 import asyncio
+import concurrent.futures
 import logging
 from pathlib import Path
 from werkzeug.utils import secure_filename
@@ -14,6 +15,7 @@ from datetime import datetime
 from ..config.settings import settings
 from ..api.handlers import HomeworkHandler, StudentHandler, GradingHandler, StatisticsHandler
 from ..utils.logger import setup_logger
+from ..mcp_client import run_with_deadline
 
 logger = setup_logger("web")
 
@@ -49,6 +51,15 @@ def create_web_app():
     import threading
     threading.Thread(target=run_loop, daemon=True).start()
 
+    def run_async(coro, timeout: float):
+        """在后台事件循环中执行协程并等待结果，超时后取消协程（进行中的MCP调用随之取消）"""
+        future = asyncio.run_coroutine_threadsafe(run_with_deadline(coro, timeout), loop)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
     # ============ 路由定义 ============
 
     @app.route('/')
@@ -110,10 +121,9 @@ def create_web_app():
             file.save(file_path)
 
             # 异步处理上传
-            future = asyncio.run_coroutine_threadsafe(
-                _async_handle_upload(file_path, student_name, grade_level), loop
+            result = run_async(
+                _async_handle_upload(file_path, student_name, grade_level), timeout=30
             )
-            result = future.result(timeout=30)
 
             if result['success']:
                 homework_id = result['homework_id']
@@ -172,15 +182,17 @@ def create_web_app():
     def grade_homework_web(homework_id):
         """Web界面批改作业"""
         try:
-            # 异步执行批改
-            future = asyncio.run_coroutine_threadsafe(
-                grading_handler.grade_homework(homework_id), loop
-            )
+            # 逐题推送批改进度
+            def emit_progress(event):
+                socketio.emit('grading_progress', event)
 
             # 发送实时更新
             socketio.emit('grading_started', {'homework_id': homework_id})
 
-            result = future.result(timeout=300)  # 5分钟超时
+            # 异步执行批改
+            result = run_async(
+                grading_handler.grade_homework(homework_id, on_event=emit_progress), timeout=300
+            )  # 5分钟超时
 
             if result.get('success'):
                 flash('批改完成！', 'success')
@@ -276,10 +288,9 @@ def create_web_app():
             if not original_question:
                 return jsonify({"error": "缺少原始题目"}), 400
 
-            future = asyncio.run_coroutine_threadsafe(
-                grading_handler.generate_similar_problems(original_question, count), loop
+            result = run_async(
+                grading_handler.generate_similar_problems(original_question, count), timeout=60
             )
-            result = future.result(timeout=60)
 
             return jsonify(result)
 
@@ -123,11 +123,15 @@ class PortManager:
 class SystemManager:
     """系统管理器 - 统一管理所有组件"""
 
-    def __init__(self):
+    def __init__(self, workers: int = 1):
         self.mcp_server_running = False
         self.mcp_server_thread = None
         self.server_instance = None
+        self.mcp_server = None   # MathGradingMCPServer 实例，供进程内传输直接调用
+        self.mcp_loop = None     # MCP服务器所在的事件循环
         self.mcp_port = 8765
+        self.workers = workers   # MCP服务进程数，大于1时使用多进程服务器
+        self.supervisor = None
         self.port_manager = PortManager()
 
     def prepare_mcp_port(self) -> int:
@@ -172,7 +176,10 @@ class SystemManager:
             raise
 
     def start_mcp_server(self):
-        """在后台线程启动MCP服务器"""
+        """在后台线程启动MCP服务器（workers 大于1时启动多进程服务器）"""
+        if self.workers != 1:
+            return self.start_mcp_workers()
+
         def run_server():
             try:
                 from mcp_server.server import MathGradingMCPServer
@@ -185,6 +192,8 @@ class SystemManager:
                     # 使用准备好的端口
                     server = MathGradingMCPServer(host="localhost", port=self.mcp_port)
                     self.server_instance = await server.start_server()
+                    self.mcp_server = server
+                    self.mcp_loop = loop
                     self.mcp_server_running = True
                     logger.info(f"✅ MCP服务器在端口 {self.mcp_port} 启动成功")
 
@@ -220,6 +229,32 @@ class SystemManager:
             logger.error(f"端口准备失败: {e}")
             return False
 
+    def start_mcp_workers(self) -> bool:
+        """启动多个MCP服务进程监听同一端口，GUI通过连接池连接"""
+        from mcp_server.workers import ServerSupervisor
+
+        try:
+            actual_port = self.prepare_mcp_port()
+            self.supervisor = ServerSupervisor(host="localhost", port=actual_port, workers=self.workers or None)
+            self.supervisor.start()
+
+            logger.info(f"⏳ 等待 {self.supervisor.workers} 个MCP服务进程启动...")
+            self.mcp_server_running = self.supervisor.wait_ready()
+            return self.mcp_server_running
+
+        except Exception as e:
+            logger.error(f"MCP服务进程启动失败: {e}")
+            return False
+
+    def enable_in_process_transport(self) -> bool:
+        """登记同进程的MCP服务器，GUI的MCP调用直接提交到服务器事件循环，不经过websocket"""
+        if self.mcp_server is None or self.mcp_loop is None:
+            return False
+
+        from mcp_client.in_process import register_local_server
+        register_local_server(self.mcp_server, self.mcp_loop)
+        return True
+
     def test_mcp_connection(self):
         """测试MCP连接"""
         try:
@@ -320,13 +355,18 @@ class SystemManager:
             logger.error(f"GUI启动失败: {e}")
             raise
 
-def start_server_only():
+def start_server_only(workers: int = 1):
     """仅启动MCP服务器模式"""
     try:
-        manager = SystemManager()
+        manager = SystemManager(workers)
         port = manager.prepare_mcp_port()
         logger.info(f"🔧 启动服务器模式 (端口 {port})...")
 
+        if workers != 1:
+            from mcp_server.workers import ServerSupervisor
+            ServerSupervisor(host="localhost", port=port, workers=workers or None).run_forever()
+            return
+
         from mcp_server.server import main as server_main
         asyncio.run(server_main())
     except Exception as e:
@@ -352,12 +392,12 @@ def start_web_only():
     except Exception as e:
         logger.error(f"Web模式失败: {e}")
 
-def start_all_services():
+def start_all_services(workers: int = 1):
     """启动所有服务 - 修复版"""
     logger.info("🚀 启动完整系统...")
 
     # 创建系统管理器
-    manager = SystemManager()
+    manager = SystemManager(workers)
 
     # 1. 检查数据库
     logger.info("📋 步骤1: 检查数据库...")
@@ -375,6 +415,10 @@ def start_all_services():
             logger.info("✅ MCP服务完全就绪")
         else:
             logger.warning("⚠️ MCP连接测试失败，但继续启动GUI")
+
+        # 服务器与GUI在同一进程，GUI使用进程内传输
+        if manager.enable_in_process_transport():
+            logger.info("🔗 GUI将使用进程内MCP传输")
     else:
         logger.error("❌ MCP服务器启动失败，但继续启动GUI")
 
@@ -391,8 +435,13 @@ def main():
     parser.add_argument("--mode", choices=["server", "gui", "web", "all", "test", "port-check"],
                         default="all", help="启动模式")
     parser.add_argument("--port", type=int, default=8765, help="MCP服务器端口")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="MCP服务进程数，大于1时多个进程监听同一端口，0表示CPU核数（默认读取 server.workers 配置）")
 
     args = parser.parse_args()
+    if args.workers is None:
+        from config.settings import settings
+        args.workers = settings.get("server.workers", 1)
 
     logger.info(f"🎯 启动模式: {args.mode}")
     logger.info("=" * 50)
@@ -408,7 +457,7 @@ def main():
             except Exception as e:
                 logger.error(f"❌ 端口检查失败: {e}")
         elif args.mode == "server":
-            start_server_only()
+            start_server_only(args.workers)
         elif args.mode == "gui":
             start_gui_only()
         elif args.mode == "web":
@@ -419,7 +468,7 @@ def main():
             import subprocess
             subprocess.run([sys.executable, "test_system.py"])
         elif args.mode == "all":
-            start_all_services()
+            start_all_services(args.workers)
         else:
             logger.error(f"未知模式: {args.mode}")
 
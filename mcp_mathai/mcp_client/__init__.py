@@ -4,6 +4,8 @@
 
 from .client import (
     MCPClient,
+    call_deadline,
+    run_with_deadline,
     create_mcp_client,
     get_global_client,
     get_global_client_sync,
@@ -12,10 +14,24 @@ from .client import (
     quick_mcp_call,
     check_mcp_server_health
 )
+from .pool import MCPClientPool
+from .in_process import (
+    InProcessMCPClient,
+    create_default_client,
+    register_local_server,
+    unregister_local_server
+)
 
 # 导出所有公共接口
 __all__ = [
     'MCPClient',
+    'MCPClientPool',
+    'InProcessMCPClient',
+    'create_default_client',
+    'register_local_server',
+    'unregister_local_server',
+    'call_deadline',
+    'run_with_deadline',
     'create_mcp_client',
     'get_global_client',
     'get_global_client_sync',
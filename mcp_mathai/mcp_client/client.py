@@ -2,64 +2,316 @@
 # mcp_client/client.py
 # ===============================
 import asyncio
+import contextlib
 import websockets
 import json
 import logging
-from typing import Dict, Any, Optional
+import random
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 import time
 
+from config.settings import settings
+from utils.exceptions import MCPConnectionError, MCPCallInterruptedError, MCPDeadlineExceededError, MCPServerBusyError
+from utils.mcp_protocol import (
+    CODEC_JSON, ERROR_BLOB_NOT_FOUND, ERROR_DEADLINE_EXCEEDED, ERROR_SERVER_BUSY, META_TIMEOUT_MS, NOTIFICATION_CANCELLED, NOTIFICATION_TOOLS_CHANGED,
+    MessageCodec, available_codecs, blob_hash, encode_blob_chunk, iter_blob_chunks, negotiate_codec
+)
+from .tool_cache import ToolResultCache
+
 logger = logging.getLogger(__name__)
 
-class MCPClient:
-    """MCP客户端 - 修复版"""
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """第 attempt 次重试前的等待时间：指数退避，上限 cap，乘以 0.5~1.5 的随机抖动"""
+    return min(cap, base * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+
+# 当前调用链的截止时间（time.monotonic()），其中发起的MCP请求超时都不会超过它
+_call_deadline: ContextVar[Optional[float]] = ContextVar("mcp_call_deadline", default=None)
+
+
+@contextlib.contextmanager
+def call_deadline(timeout: float):
+    """在此范围内发起的MCP请求共享一个截止时间，嵌套时取更早的一个"""
+    deadline = time.monotonic() + timeout
+    current = _call_deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _call_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _call_deadline.reset(token)
+
+
+async def run_with_deadline(coro, timeout: float):
+    """在截止时间内执行协程，用于从其他线程提交到事件循环的请求处理"""
+    with call_deadline(timeout):
+        return await coro
+
+
+def effective_timeout(timeout: float) -> float:
+    """按当前截止时间收紧超时；截止时间已过时抛出 asyncio.TimeoutError"""
+    deadline = _call_deadline.get()
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise asyncio.TimeoutError("MCP调用截止时间已过")
+    return min(timeout, remaining)
+
+
+def raise_for_busy(response: Dict[str, Any]):
+    """应答为服务器繁忙错误时抛出 MCPServerBusyError（请求未被执行，可安全重试）"""
+    error = response.get("error")
+    if error and error.get("code") == ERROR_SERVER_BUSY:
+        retry_after_ms = (error.get("data") or {}).get("retry_after_ms", 1000)
+        raise MCPServerBusyError(error.get("message", "MCP服务器繁忙"), retry_after_ms / 1000)
+
+
+def raise_for_deadline(response: Dict[str, Any]):
+    """应答为截止时间已过错误时抛出 MCPDeadlineExceededError（服务器已放弃处理）"""
+    error = response.get("error")
+    if error and error.get("code") == ERROR_DEADLINE_EXCEEDED:
+        raise MCPDeadlineExceededError(error.get("message", "MCP调用截止时间已过"))
+
+
+async def wait_busy_retry(error: MCPServerBusyError, attempt: int, max_attempts: int, label: str):
+    """
+    服务器繁忙时按其建议的时间等待，加 0~50% 的随机抖动错开同时被拒绝的请求
+
+    已重试 max_attempts 次，或等待后会超过当前截止时间时，直接抛出该错误。
+    """
+    if attempt >= max_attempts:
+        raise error
+    delay = error.retry_after * random.uniform(1.0, 1.5)
+    deadline = _call_deadline.get()
+    if deadline is not None and time.monotonic() + delay >= deadline:
+        raise error
+    logger.warning(f"MCP服务器繁忙，{delay:.2f}秒后第{attempt + 1}次重试: {label}")
+    await asyncio.sleep(delay)
+
+
+class BlobCache:
+    """客户端最近上传的数据块，按总字节数LRU淘汰；连接池中的各连接共用一份"""
+
+    def __init__(self, max_bytes: Optional[int] = None):
+        self.max_bytes = max_bytes or settings.get("mcp.blob_cache_bytes", 64 * 1024 * 1024)
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+
+    def put(self, digest: str, data: bytes):
+        if digest in self._blobs:
+            self._blobs.move_to_end(digest)
+            return
+        self._blobs[digest] = data
+        self._bytes += len(data)
+        while self._bytes > self.max_bytes and len(self._blobs) > 1:
+            _, evicted = self._blobs.popitem(last=False)
+            self._bytes -= len(evicted)
+
+    def get(self, digest: str) -> Optional[bytes]:
+        return self._blobs.get(digest)
+
+
+class MathToolsMixin:
+    """常用数学工具的便捷方法，由各MCP客户端共用，依赖 call_tool"""
+
+    @staticmethod
+    def parse_tool_text(result: Dict[str, Any]) -> Any:
+        """解析工具结果中的JSON文本内容，工具报告错误时抛出异常"""
+        content = (result or {}).get("content") or []
+        if not content:
+            raise Exception("MCP工具返回内容为空")
+
+        text = content[0].get("text", "")
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError:
+            parsed = {"text": text}
+
+        if result.get("isError") or (isinstance(parsed, dict) and parsed.get("error")):
+            message = parsed.get("error") if isinstance(parsed, dict) else text
+            raise Exception(f"MCP工具报告错误: {message}")
+        return parsed
+
+    async def validate_math_expression(self, expression: str, expected_result: Optional[str] = None) -> Dict[str, Any]:
+        """验证数学表达式（结果按 mcp.tool_cache 策略缓存）"""
+        arguments = {"expression": expression}
+        if expected_result is not None:
+            arguments["expected_result"] = expected_result
+        return self.parse_tool_text(await self.call_tool("validate_math_expression", arguments))
+
+    async def generate_similar_problems(self, original_question: str, count: int = 3,
+                                        difficulty: str = "same") -> List[Dict[str, Any]]:
+        """生成相似题目"""
+        parsed = self.parse_tool_text(await self.call_tool(
+            "generate_similar_problems",
+            {"original_question": original_question, "count": count, "difficulty_level": difficulty}
+        ))
+        return parsed.get("problems", []) if isinstance(parsed, dict) else parsed
+
+    async def generate_detailed_feedback(self, question_text: str, student_answer: str,
+                                         correct_answer: str) -> Dict[str, Any]:
+        """生成单题的详细反馈"""
+        return self.parse_tool_text(await self.call_tool(
+            "generate_detailed_feedback",
+            {"question_text": question_text, "student_answer": student_answer, "correct_answer": correct_answer}
+        ))
+
+
+class MCPClient(MathToolsMixin):
+    """
+    MCP客户端 - 多路复用版
+
+    连接建立后由一个后台读取任务接收全部消息：带 id 的响应按 JSON-RPC id 分发给
+    对应的等待中 Future，服务器主动推送的通知交给注册的通知处理器。
+    因此同一连接可以同时承载大量并发调用，每个调用各自超时。
 
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    连接意外断开后在后台按指数退避自动重连；幂等工具的调用在重连后自动重试，
+    非幂等调用若已发出则以 MCPCallInterruptedError 单独报告。
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 8765, call_timeout: Optional[float] = None,
+                 auto_reconnect: bool = True, idempotent_tools: Optional[List[str]] = None,
+                 blob_cache: Optional["BlobCache"] = None, tool_cache: Optional[ToolResultCache] = None):
         self.host = host
         self.port = port
+        self.call_timeout = call_timeout or settings.get("mcp.call_timeout", 60)
         self.websocket = None
         self.connected = False
         self.request_id = 0
 
+        # 重连与重试配置
+        self.auto_reconnect = auto_reconnect
+        self.retry_attempts = settings.get("mcp.retry_attempts", 3)
+        self.retry_delay = settings.get("mcp.retry_delay", 2)
+        self.max_retry_delay = settings.get("mcp.max_retry_delay", 30)
+        self.busy_retry_attempts = settings.get("mcp.busy_retry_attempts", 5)
+        self.idempotent_tools = set(
+            idempotent_tools if idempotent_tools is not None else settings.get("mcp.idempotent_tools", [])
+        )
+
+        self._pending: Dict[Any, asyncio.Future] = {}
+        self._reader_task: Optional[asyncio.Task] = None
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._connected_event: Optional[asyncio.Event] = None
+        self._closing = False
+        self._notification_handlers: Dict[str, List[Callable[[Dict[str, Any]], Any]]] = {}
+        self._background: set = set()
+
+        # 最近上传的数据块，服务器缺少时（重连到其他服务进程、被淘汰）据此重新上传
+        self.blob_cache = blob_cache or BlobCache()
+
+        # 只读工具的结果缓存，服务器报告新的工具版本时失效
+        self.tool_cache = tool_cache or ToolResultCache()
+        self.on_notification(NOTIFICATION_TOOLS_CHANGED, self._on_tools_changed)
+
+        # 消息编码：连接时按偏好与服务器协商，未协商时为json文本帧
+        self.preferred_codecs = settings.get("mcp.codecs", [CODEC_JSON])
+        self.compression = settings.get("mcp.compression")
+        self.compression_threshold = settings.get("mcp.compression_threshold", 4096)
+        self._codec = MessageCodec()
+
+        # 连接统计
+        self.reconnects = 0
+        self.retried_calls = 0
+        self.interrupted_calls = 0
+        self.blob_bytes_sent = 0
+        self.blob_dedup_hits = 0
+        self.cancelled_calls = 0
+        self.busy_retries = 0
+
     async def connect(self) -> bool:
         """连接到MCP服务器"""
+        self._closing = False
         try:
             uri = f"ws://{self.host}:{self.port}"
             logger.info(f"尝试连接到MCP服务器: {uri}")
 
             # 设置连接超时
-            self.websocket = await asyncio.wait_for(
+            websocket = await asyncio.wait_for(
                 websockets.connect(uri),
                 timeout=10.0
             )
 
             # 接收欢迎消息
             welcome_msg = await asyncio.wait_for(
-                self.websocket.recv(),
+                websocket.recv(),
                 timeout=5.0
             )
 
             welcome_data = json.loads(welcome_msg)
             if welcome_data.get("type") == "welcome":
+                self._codec = await self._negotiate(websocket, welcome_data.get("server_info", {}))
+                self.tool_cache.set_schema_version(welcome_data.get("server_info", {}).get("tools_version"))
+                self.websocket = websocket
                 self.connected = True
+                self._reader_task = asyncio.create_task(self._read_loop(websocket))
+                self._get_connected_event().set()
                 logger.info("✅ MCP客户端连接成功")
                 logger.info(f"服务器信息: {welcome_data.get('server_info', {})}")
                 return True
             else:
+                await websocket.close()
                 raise Exception(f"未收到欢迎消息: {welcome_data}")
 
         except asyncio.TimeoutError:
             logger.error("连接MCP服务器超时")
-            raise Exception("连接MCP服务器超时")
+            raise MCPConnectionError("连接MCP服务器超时")
         except ConnectionRefusedError:
             logger.error(f"无法连接到MCP服务器 {self.host}:{self.port} - 连接被拒绝")
-            raise Exception(f"MCP服务器不可用 ({self.host}:{self.port})")
+            raise MCPConnectionError(f"MCP服务器不可用 ({self.host}:{self.port})")
         except Exception as e:
             logger.error(f"连接MCP服务器失败: {e}")
-            raise Exception(f"MCP连接失败: {e}")
+            raise MCPConnectionError(f"MCP连接失败: {e}")
+
+    async def _negotiate(self, websocket, server_info: Dict[str, Any]) -> MessageCodec:
+        """
+        与服务器协商消息编码和压缩
+
+        服务器在欢迎消息中列出支持的编码；双方都只支持json且不压缩时（或旧版服务器）不协商。
+        协商在读取任务启动前完成，应答直接从连接读取。
+        """
+        encodings = server_info.get("encodings")
+        if not encodings:
+            return MessageCodec()
+
+        local = available_codecs()
+        codec = negotiate_codec([c for c in self.preferred_codecs if c in local], encodings.get("codecs", []))
+        compression = self.compression if self.compression in encodings.get("compression", []) else None
+        if codec == CODEC_JSON and not compression:
+            return MessageCodec()
+
+        request_id = f"negotiate_{self._next_request_id()}"
+        await websocket.send(json.dumps({
+            "type": "negotiate",
+            "id": request_id,
+            "codecs": [codec],
+            "compression": compression,
+            "threshold": self.compression_threshold
+        }))
+        reply = json.loads(await asyncio.wait_for(websocket.recv(), timeout=5.0))
+        if reply.get("type") != "negotiated" or reply.get("id") != request_id:
+            raise MCPConnectionError(f"消息编码协商失败: {reply}")
+
+        negotiated = MessageCodec(reply["codec"], reply.get("compression"),
+                                  reply.get("threshold", self.compression_threshold))
+        logger.info(f"MCP消息编码: {negotiated.codec}, 压缩: {negotiated.compression or '无'}")
+        return negotiated
 
     async def disconnect(self):
         """断开连接"""
+        self._closing = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._reconnect_task
+            self._reconnect_task = None
+
         if self.websocket:
+            self.connected = False  # 先标记断开，读取任务结束时不再当作异常断线
             try:
                 await self.websocket.close()
                 logger.info("MCP客户端已断开连接")
@@ -69,15 +321,368 @@ class MCPClient:
                 self.connected = False
                 self.websocket = None
 
-    async def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
-        """调用MCP工具"""
-        if not self.connected or not self.websocket:
-            raise Exception("MCP客户端未连接")
+        if self._reader_task:
+            self._reader_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await self._reader_task
+            self._reader_task = None
+
+        if self._connected_event:
+            self._connected_event.clear()
+        self._fail_pending(MCPConnectionError("MCP客户端已断开连接"))
+
+    def _get_connected_event(self) -> asyncio.Event:
+        """连接可用事件（惰性创建，绑定当前事件循环）"""
+        if self._connected_event is None:
+            self._connected_event = asyncio.Event()
+        return self._connected_event
 
+    async def _read_loop(self, websocket):
+        """后台读取任务：按id把响应分发给等待方，其余消息作为通知处理"""
         try:
-            # 生成请求ID
-            self.request_id += 1
-            request_id = self.request_id
+            async for raw in websocket:
+                try:
+                    message = self._codec.decode(raw)
+                except Exception as e:
+                    logger.error(f"消息解析错误: {e}")
+                    continue
+                self._dispatch(message)
+
+            if self.connected and self.websocket is websocket:
+                logger.warning("MCP服务器关闭了连接")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"MCP连接读取中断: {e}")
+        finally:
+            if self.websocket is websocket:
+                self.connected = False
+                self._get_connected_event().clear()
+            self._fail_pending(MCPCallInterruptedError("MCP连接在收到响应前断开"))
+
+            if self.websocket is websocket and self.auto_reconnect and not self._closing:
+                self._start_reconnect()
+
+    def _start_reconnect(self):
+        """启动后台重连任务"""
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.create_task(self._reconnect_loop())
+
+    async def _reconnect_loop(self):
+        """按带抖动的指数退避持续重连，直到成功或客户端被关闭"""
+        attempt = 0
+        while not self._closing:
+            delay = backoff_delay(attempt, self.retry_delay, self.max_retry_delay)
+            logger.info(f"{delay:.1f}秒后尝试重连MCP服务器（第{attempt + 1}次）")
+            await asyncio.sleep(delay)
+            try:
+                await self.connect()
+                self.reconnects += 1
+                logger.info(f"✅ MCP客户端已重连（累计{self.reconnects}次）")
+                return
+            except MCPConnectionError as e:
+                logger.warning(f"重连MCP服务器失败: {e}")
+                attempt += 1
+
+    async def _wait_connected(self, timeout: float):
+        """等待连接可用；连接已断开且未在重连时立即失败"""
+        if self.is_connected():
+            return
+        if not self.auto_reconnect or self._closing or self._connected_event is None:
+            raise MCPConnectionError("MCP客户端未连接")
+
+        self._start_reconnect()
+        try:
+            await asyncio.wait_for(self._connected_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise MCPConnectionError("等待MCP重连超时")
+
+    def _dispatch(self, message: Any):
+        """分发一条收到的消息，批量应答（数组）逐条分发"""
+        if isinstance(message, list):
+            for item in message:
+                if isinstance(item, dict):
+                    self._dispatch(item)
+            return
+
+        request_id = message.get("id")
+        if request_id is not None:
+            future = self._pending.pop(request_id, None)
+            if future is not None:
+                if not future.done():
+                    future.set_result(message)
+                return
+            if "method" not in message:
+                # 已超时的调用的迟到响应
+                logger.debug(f"丢弃无人等待的响应: id={request_id}")
+                return
+
+        # 通知：JSON-RPC 用 method 区分，自定义协议用 type 区分
+        self._notify(message.get("method") or message.get("type") or "unknown", message)
+
+    def _notify(self, name: str, message: Dict[str, Any]):
+        """调用通知处理器，协程处理器在后台任务中运行"""
+        handlers = self._notification_handlers.get(name, []) + self._notification_handlers.get("*", [])
+        if not handlers:
+            logger.debug(f"收到未处理的通知: {name}")
+            return
+
+        for handler in handlers:
+            try:
+                result = handler(message)
+                if asyncio.iscoroutine(result):
+                    asyncio.create_task(result)
+            except Exception as e:
+                logger.error(f"通知处理器出错 ({name}): {e}")
+
+    def on_notification(self, name: str, handler: Callable[[Dict[str, Any]], Any]):
+        """
+        注册通知处理器
+
+        Args:
+            name: JSON-RPC通知的 method 或自定义消息的 type，"*" 表示接收全部通知
+            handler: 处理函数，接收完整消息，可以是普通函数或协程函数
+        """
+        self._notification_handlers.setdefault(name, []).append(handler)
+
+    def remove_notification_handler(self, name: str, handler: Callable[[Dict[str, Any]], Any]):
+        """移除通知处理器"""
+        handlers = self._notification_handlers.get(name, [])
+        if handler in handlers:
+            handlers.remove(handler)
+
+    def _fail_pending(self, error: Exception):
+        """连接断开时让所有等待中的调用立即失败"""
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(error)
+
+    def _next_request_id(self) -> int:
+        """生成请求ID"""
+        self.request_id += 1
+        return self.request_id
+
+    async def _request(self, request_id: Any, message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """
+        发送消息并等待同id的响应
+
+        JSON-RPC请求在 params._meta 中带上剩余时间；超时或被调用方取消时通知服务器取消该请求。
+        """
+        if not self.is_connected():
+            raise MCPConnectionError("MCP客户端未连接")
+
+        timeout = effective_timeout(timeout)
+        is_jsonrpc = message.get("jsonrpc") == "2.0"
+        if is_jsonrpc:
+            message = self._with_timeout_meta(message, timeout)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            try:
+                await self.websocket.send(self._codec.encode(message))
+            except websockets.exceptions.ConnectionClosed as e:
+                # 发送失败说明服务器没有收到请求，可以安全重试
+                raise MCPConnectionError(f"MCP连接已断开: {e}")
+            try:
+                return await asyncio.wait_for(future, timeout=timeout)
+            except asyncio.TimeoutError:
+                if is_jsonrpc:
+                    self._cancel_remote(request_id, "timeout")
+                raise
+            except asyncio.CancelledError:
+                if is_jsonrpc:
+                    self._cancel_remote(request_id, "cancelled")
+                raise
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def _request_batch(self, messages: List[Dict[str, Any]], timeout: float) -> List[Dict[str, Any]]:
+        """把多个JSON-RPC请求作为一个批量请求（数组）发送，按请求顺序返回应答"""
+        if not self.is_connected():
+            raise MCPConnectionError("MCP客户端未连接")
+
+        timeout = effective_timeout(timeout)
+        messages = [self._with_timeout_meta(message, timeout) for message in messages]
+
+        loop = asyncio.get_running_loop()
+        futures = {message["id"]: loop.create_future() for message in messages}
+        self._pending.update(futures)
+        try:
+            try:
+                await self.websocket.send(self._codec.encode(messages))
+            except websockets.exceptions.ConnectionClosed as e:
+                raise MCPConnectionError(f"MCP连接已断开: {e}")
+            try:
+                return list(await asyncio.wait_for(asyncio.gather(*futures.values()), timeout=timeout))
+            except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+                reason = "timeout" if isinstance(e, asyncio.TimeoutError) else "cancelled"
+                for request_id, future in futures.items():
+                    if not future.done():
+                        self._cancel_remote(request_id, reason)
+                raise
+        finally:
+            for request_id in futures:
+                self._pending.pop(request_id, None)
+
+    @staticmethod
+    def _with_timeout_meta(message: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """在 params._meta 中带上剩余时间，服务器据此跳过已过期的排队请求并在超时后停止处理"""
+        params = message.get("params")
+        if not isinstance(params, dict):
+            return message
+        meta = {**params.get("_meta", {}), META_TIMEOUT_MS: int(timeout * 1000)}
+        return {**message, "params": {**params, "_meta": meta}}
+
+    def _cancel_remote(self, request_id: Any, reason: str):
+        """通知服务器取消请求（不等待发送完成，调用方可能正在被取消）"""
+        websocket = self.websocket
+        if websocket is None or not self.is_connected():
+            return
+
+        self.cancelled_calls += 1
+        notification = {
+            "jsonrpc": "2.0",
+            "method": NOTIFICATION_CANCELLED,
+            "params": {"requestId": request_id, "reason": reason}
+        }
+
+        async def send():
+            with contextlib.suppress(Exception):
+                await websocket.send(self._codec.encode(notification))
+
+        task = asyncio.ensure_future(send())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    @property
+    def in_flight(self) -> int:
+        """当前等待响应的调用数"""
+        return len(self._pending)
+
+    def is_idempotent(self, tool_name: str) -> bool:
+        """工具调用是否可以安全重试"""
+        return tool_name in self.idempotent_tools
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any],
+                        timeout: Optional[float] = None, idempotent: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        调用MCP工具，可同时发起多个调用
+
+        连接断开时等待后台重连。请求未发出时总是重试；已发出但连接在响应前断开时，
+        幂等工具（mcp.idempotent_tools，或 idempotent=True）重试，其余抛出 MCPCallInterruptedError。
+        服务器繁忙拒绝的请求按其建议的等待时间重试，重试次数用尽时抛出 MCPServerBusyError。
+        """
+        cached = self.tool_cache.get(tool_name, arguments)
+        if cached is not None:
+            logger.debug(f"MCP工具结果缓存命中: {tool_name}")
+            return cached
+
+        timeout = timeout or self.call_timeout
+        if idempotent is None:
+            idempotent = self.is_idempotent(tool_name)
+
+        with call_deadline(timeout):
+            result = await self._with_retry(
+                tool_name, timeout, idempotent, lambda: self._call_tool_once(tool_name, arguments, timeout)
+            )
+        self.tool_cache.put(tool_name, arguments, result)
+        return result
+
+    async def call_tools_batch(self, calls: List[Dict[str, Any]], timeout: Optional[float] = None,
+                               return_exceptions: bool = False) -> List[Any]:
+        """
+        以一个JSON-RPC批量请求调用多个工具，服务器并发执行后一次返回全部结果
+
+        Args:
+            calls: [{"name": 工具名, "arguments": {...}}, ...]
+            timeout: 整个批量请求的超时时间
+            return_exceptions: 为True时失败的调用以异常对象出现在结果中，否则抛出第一个失败
+
+        Returns:
+            与 calls 顺序对应的结果列表
+
+        连接断开时，只有全部工具都是幂等工具才重试整个批量请求；被服务器以繁忙拒绝的调用单独重发。
+        """
+        if not calls:
+            return []
+
+        # 命中缓存的调用不再发送
+        results: List[Any] = [self.tool_cache.get(call["name"], call.get("arguments", {})) for call in calls]
+        missing = [i for i, result in enumerate(results) if result is None]
+
+        timeout = timeout or self.call_timeout
+        busy_attempt = 0
+        with call_deadline(timeout):
+            while missing:
+                pending = [calls[i] for i in missing]
+                idempotent = all(self.is_idempotent(call["name"]) for call in pending)
+                label = f"批量调用({len(pending)}个)"
+                fetched = await self._with_retry(
+                    label, timeout, idempotent, lambda: self._call_tools_batch_once(pending, timeout)
+                )
+
+                busy = []
+                for i, call, result in zip(missing, pending, fetched):
+                    results[i] = result
+                    if isinstance(result, MCPServerBusyError):
+                        busy.append(i)
+                    elif not isinstance(result, Exception):
+                        self.tool_cache.put(call["name"], call.get("arguments", {}), result)
+                if not busy:
+                    break
+
+                # 只重发被拒绝的调用，等待时间取其中最长的建议值；无法重试时保留错误结果
+                try:
+                    await wait_busy_retry(max((results[i] for i in busy), key=lambda e: e.retry_after),
+                                          busy_attempt, self.busy_retry_attempts, label)
+                except MCPServerBusyError:
+                    break
+                busy_attempt += 1
+                self.busy_retries += 1
+                missing = busy
+
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return results
+
+    async def _with_retry(self, label: str, timeout: float, idempotent: bool,
+                          operation: Callable[[], Awaitable[Any]]) -> Any:
+        """在截止时间内执行调用，连接断开时按退避重试，服务器繁忙时按其建议的时间重试"""
+        attempt = 0
+        busy_attempt = 0
+        while True:
+            try:
+                await self._wait_connected(effective_timeout(timeout))
+                return await operation()
+            except MCPServerBusyError as e:
+                await wait_busy_retry(e, busy_attempt, self.busy_retry_attempts, label)
+                busy_attempt += 1
+                self.busy_retries += 1
+            except MCPConnectionError as e:
+                interrupted = isinstance(e, MCPCallInterruptedError)
+                if interrupted and not idempotent:
+                    self.interrupted_calls += 1
+                    logger.error(f"MCP工具调用被连接中断，结果未知，不自动重试: {label}")
+                    raise
+                if not self.auto_reconnect or self._closing or attempt >= self.retry_attempts:
+                    if interrupted:
+                        self.interrupted_calls += 1
+                    raise
+
+                attempt += 1
+                self.retried_calls += 1
+                delay = backoff_delay(attempt - 1, self.retry_delay, self.max_retry_delay)
+                logger.warning(f"MCP工具调用因连接断开失败，{delay:.1f}秒后第{attempt}次重试: {label}")
+                await asyncio.sleep(effective_timeout(delay))
+
+    async def _call_tool_once(self, tool_name: str, arguments: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """发送一次工具调用"""
+        try:
+            request_id = self._next_request_id()
 
             # 构造JSON-RPC请求
             request = {
@@ -91,67 +696,199 @@ class MCPClient:
             }
 
             logger.info(f"发送MCP工具调用: {tool_name}")
-            logger.debug(f"请求数据: {json.dumps(request, indent=2)}")
-
-            # 发送请求
-            await self.websocket.send(json.dumps(request))
-
-            # 接收响应（设置较长的超时时间）
-            response_str = await asyncio.wait_for(
-                self.websocket.recv(),
-                timeout=60.0  # 给AI处理更多时间
-            )
-
-            response = json.loads(response_str)
-            logger.debug(f"收到MCP响应: {json.dumps(response, indent=2)}")
-
-            # 检查响应
-            if response.get("id") != request_id:
-                raise Exception(f"响应ID不匹配: 期望{request_id}, 收到{response.get('id')}")
-
-            if "error" in response:
-                error = response["error"]
-                raise Exception(f"MCP工具调用失败: {error.get('message', '未知错误')}")
-
-            result = response.get("result")
-            if not result:
-                raise Exception("MCP工具调用返回空结果")
-
-            logger.info(f"✅ MCP工具调用成功: {tool_name}")
-            return result
+            # 请求中可能带有大段base64图像，只在需要时才格式化
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"请求数据: {json.dumps(request, indent=2)}")
+
+            response = await self._request(request_id, request, timeout)
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"收到MCP响应: {json.dumps(response, indent=2)}")
+
+            error = response.get("error")
+            if error and error.get("code") == ERROR_BLOB_NOT_FOUND:
+                # 引用的图像不在该连接的服务进程上：从本地缓存重新上传后重试一次
+                digest = (error.get("data") or {}).get("hash")
+                data = self.blob_cache.get(digest) if digest else None
+                if data is not None:
+                    logger.info(f"服务器缺少数据块，重新上传: {digest[:12]}")
+                    await self._send_blob(digest, data, timeout)
+                    request["id"] = request_id = self._next_request_id()
+                    response = await self._request(request_id, request, timeout)
+
+            return self._tool_result(tool_name, response)
 
         except asyncio.TimeoutError:
             logger.error(f"MCP工具调用超时: {tool_name}")
-            raise Exception(f"工具调用超时: {tool_name}")
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON解析错误: {e}")
-            raise Exception(f"响应格式错误: {e}")
+            raise MCPDeadlineExceededError(f"工具调用超时: {tool_name}")
+        except MCPServerBusyError:
+            raise
         except Exception as e:
             logger.error(f"MCP工具调用失败: {e}")
             raise
 
-    async def send_custom_message(self, message_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
-        """发送自定义消息"""
-        if not self.connected or not self.websocket:
-            raise Exception("MCP客户端未连接")
+    async def _call_tools_batch_once(self, calls: List[Dict[str, Any]], timeout: float) -> List[Any]:
+        """发送一次批量工具调用，各调用的失败以异常对象返回"""
+        requests = [
+            {
+                "jsonrpc": "2.0",
+                "id": self._next_request_id(),
+                "method": "tools/call",
+                "params": {"name": call["name"], "arguments": call.get("arguments", {})}
+            }
+            for call in calls
+        ]
+
+        logger.info(f"发送MCP批量工具调用: {len(requests)}个 ({', '.join(sorted({c['name'] for c in calls}))})")
+        try:
+            responses = await self._request_batch(requests, timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"MCP批量工具调用超时: {len(requests)}个")
+            raise MCPDeadlineExceededError(f"批量工具调用超时: {len(requests)}个")
 
+        results = []
+        for call, response in zip(calls, responses):
+            try:
+                error = response.get("error")
+                if error and error.get("code") == ERROR_BLOB_NOT_FOUND:
+                    # 单独重发，由 _call_tool_once 补传缺少的数据块
+                    results.append(await self._call_tool_once(call["name"], call.get("arguments", {}), timeout))
+                else:
+                    results.append(self._tool_result(call["name"], response))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    @staticmethod
+    def _tool_result(tool_name: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        """从工具调用应答中取出结果，错误应答或空结果抛出异常"""
+        raise_for_busy(response)
+        raise_for_deadline(response)
+        error = response.get("error")
+        if error:
+            raise Exception(f"MCP工具调用失败: {error.get('message', '未知错误')}")
+
+        result = response.get("result")
+        if not result:
+            raise Exception("MCP工具调用返回空结果")
+
+        logger.info(f"✅ MCP工具调用成功: {tool_name}")
+        return result
+
+    async def _call_method(self, method: str, params: Dict[str, Any], timeout: Optional[float] = None) -> Any:
+        """发送一个JSON-RPC请求并返回result，服务器繁忙时按其建议的时间重试"""
+        attempt = 0
+        while True:
+            request_id = self._next_request_id()
+            request = {
+                "jsonrpc": "2.0",
+                "id": request_id,
+                "method": method,
+                "params": params
+            }
+            try:
+                response = await self._request(request_id, request, timeout or self.call_timeout)
+            except asyncio.TimeoutError:
+                raise Exception(f"MCP请求超时: {method}")
+
+            try:
+                raise_for_busy(response)
+                break
+            except MCPServerBusyError as e:
+                await wait_busy_retry(e, attempt, self.busy_retry_attempts, method)
+                attempt += 1
+                self.busy_retries += 1
+
+        if "error" in response:
+            raise Exception(f"MCP请求失败 ({method}): {response['error'].get('message', '未知错误')}")
+        return response.get("result")
+
+    async def list_tools(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """获取服务器的工具列表（按 tools/list 策略缓存）"""
+        cached = self.tool_cache.get("tools/list", {})
+        if cached is not None:
+            return cached
+
+        result = await self._call_method("tools/list", {}, timeout) or {}
+        self.tool_cache.set_schema_version(result.get("version"))
+        tools = result.get("tools", [])
+        self.tool_cache.apply_tool_hints(tools)
+        self.tool_cache.put("tools/list", {}, tools)
+        return tools
+
+    def _on_tools_changed(self, message: Dict[str, Any]):
+        """服务器工具定义变化：清空工具结果缓存"""
+        version = (message.get("params") or {}).get("version")
+        if version is None or version == self.tool_cache.schema_version:
+            self.tool_cache.invalidate()
+        self.tool_cache.set_schema_version(version)
+
+    async def upload_blob(self, data: bytes, timeout: Optional[float] = None) -> str:
+        """
+        以二进制分块帧上传数据（如作业图像），返回内容哈希
+
+        服务器已有相同内容时只需一次 blobs/check 往返，不再传输数据。
+        返回的哈希可作为 analyze_homework 的 image_ref，或以 "blob:<哈希>" 形式出现在图像URL中。
+        """
+        digest = blob_hash(data)
+        self.blob_cache.put(digest, data)
+
+        check = await self._call_method("blobs/check", {"hashes": [digest]}, timeout)
+        if digest in (check or {}).get("present", []):
+            self.blob_dedup_hits += 1
+            return digest
+
+        await self._send_blob(digest, data, timeout)
+        return digest
+
+    async def _send_blob(self, digest: str, data: bytes, timeout: Optional[float] = None):
+        """发送数据块帧并提交"""
+        if not self.is_connected():
+            raise MCPConnectionError("MCP客户端未连接")
+
+        chunks = 0
+        try:
+            for index, chunk in iter_blob_chunks(data):
+                await self.websocket.send(encode_blob_chunk(digest, index, chunk))
+                chunks += 1
+        except websockets.exceptions.ConnectionClosed as e:
+            raise MCPConnectionError(f"MCP连接已断开: {e}")
+
+        await self._call_method("blobs/commit", {"hash": digest, "size": len(data), "chunks": chunks}, timeout)
+        self.blob_bytes_sent += len(data)
+        logger.info(f"数据块上传完成: {digest[:12]} ({len(data)} bytes, {chunks}块)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接统计"""
+        return {
+            "endpoint": f"{self.host}:{self.port}",
+            "connected": self.is_connected(),
+            "reconnecting": self._reconnect_task is not None and not self._reconnect_task.done(),
+            "in_flight": self.in_flight,
+            "codec": self._codec.describe(),
+            "reconnects": self.reconnects,
+            "retried_calls": self.retried_calls,
+            "interrupted_calls": self.interrupted_calls,
+            "blob_bytes_sent": self.blob_bytes_sent,
+            "blob_dedup_hits": self.blob_dedup_hits,
+            "cancelled_calls": self.cancelled_calls,
+            "busy_retries": self.busy_retries,
+            "tool_cache": self.tool_cache.get_stats()
+        }
+
+    async def send_custom_message(self, message_type: str, data: Dict[str, Any],
+                                  timeout: float = 30.0) -> Dict[str, Any]:
+        """发送自定义消息，服务器在响应中回传同一id"""
         try:
+            request_id = self._next_request_id()
             message = {
                 "type": message_type,
+                "id": request_id,
                 "timestamp": time.time(),
                 **data
             }
 
             logger.info(f"发送自定义消息: {message_type}")
-            await self.websocket.send(json.dumps(message))
-
-            # 接收响应
-            response_str = await asyncio.wait_for(
-                self.websocket.recv(),
-                timeout=30.0
-            )
-
-            response = json.loads(response_str)
+            response = await self._request(request_id, message, timeout)
             logger.info(f"收到自定义消息响应: {response.get('type', 'unknown')}")
 
             return response
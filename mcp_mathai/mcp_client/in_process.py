@@ -0,0 +1,283 @@
+# ===============================
+# mcp_client/in_process.py - 同进程MCP传输
+# ===============================
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Optional, List, Tuple
+
+from config.settings import settings
+from utils.exceptions import MCPConnectionError, MCPDeadlineExceededError, MCPServerBusyError
+from .client import (
+    MathToolsMixin, call_deadline, effective_timeout, raise_for_busy, raise_for_deadline, wait_busy_retry
+)
+from .pool import MCPClientPool
+from .tool_cache import ToolResultCache
+
+logger = logging.getLogger(__name__)
+
+# 当前进程内运行的MCP服务器及其事件循环，由 register_local_server 登记
+_local_server: Optional[Tuple[Any, asyncio.AbstractEventLoop]] = None
+
+
+def register_local_server(server, loop: asyncio.AbstractEventLoop):
+    """登记同进程内运行的MCP服务器，之后 create_default_client 会使用进程内传输"""
+    global _local_server
+    _local_server = (server, loop)
+    logger.info("已登记同进程MCP服务器，将使用进程内传输")
+
+
+def unregister_local_server():
+    """取消登记（服务器停止时调用）"""
+    global _local_server
+    _local_server = None
+
+
+def get_local_server() -> Optional[Tuple[Any, asyncio.AbstractEventLoop]]:
+    """获取已登记且事件循环仍在运行的同进程MCP服务器"""
+    if _local_server is None:
+        return None
+    server, loop = _local_server
+    if loop.is_closed() or not loop.is_running():
+        return None
+    return _local_server
+
+
+def create_default_client():
+    """
+    创建当前进程适用的MCP客户端
+
+    同进程内已登记MCP服务器且 mcp.in_process 开启时使用进程内传输，否则使用websocket连接池。
+    """
+    local = get_local_server() if settings.get("mcp.in_process", True) else None
+    if local is not None:
+        return InProcessMCPClient(*local)
+    return MCPClientPool()
+
+
+class InProcessMCPClient(MathToolsMixin):
+    """
+    同进程MCP传输
+
+    通过 asyncio.run_coroutine_threadsafe 把请求直接提交到服务器所在的事件循环执行，
+    参数和结果以Python对象传递，没有编码、websocket收发和解码的开销。
+    请求与websocket连接一样经过服务器的准入控制，服务器繁忙时按其建议的时间重试。
+    接口与 MCPClient 保持一致，可直接替换。
+    """
+
+    def __init__(self, server, server_loop: asyncio.AbstractEventLoop, call_timeout: Optional[float] = None,
+                 tool_cache: Optional[ToolResultCache] = None):
+        self.server = server
+        self.server_loop = server_loop
+        self.call_timeout = call_timeout or settings.get("mcp.call_timeout", 60)
+        self.tool_cache = tool_cache or ToolResultCache()
+        self.connected = False
+        self.request_id = 0
+        self._in_flight = 0
+        self.busy_retry_attempts = settings.get("mcp.busy_retry_attempts", 5)
+        # 服务器为本客户端维护的连接状态，单个客户端的并发与排队上限同websocket连接
+        self._connection = server.local_connection()
+
+        # 调用统计
+        self.calls = 0
+        self.errors = 0
+        self.cancelled_calls = 0
+        self.busy_retries = 0
+        self.total_time = 0.0
+
+    async def connect(self) -> bool:
+        """检查服务器事件循环可用"""
+        if self.server_loop.is_closed() or not self.server_loop.is_running():
+            raise MCPConnectionError("同进程MCP服务器未运行")
+        self.tool_cache.set_schema_version(self.server.tools_version())
+        self.connected = True
+        logger.info("✅ MCP客户端使用进程内传输")
+        return True
+
+    async def disconnect(self):
+        """断开连接（进程内传输无需释放资源）"""
+        self.connected = False
+
+    def is_connected(self) -> bool:
+        return self.connected and self.server_loop.is_running()
+
+    @property
+    def in_flight(self) -> int:
+        """当前执行中的调用数"""
+        return self._in_flight
+
+    def _next_request_id(self) -> str:
+        self.request_id += 1
+        return f"local_{self.request_id}"
+
+    async def _run_on_server(self, coro, timeout: float) -> Any:
+        """在服务器事件循环中执行协程；超时或被取消时一并取消服务器端的任务"""
+        if not self.is_connected():
+            coro.close()
+            raise MCPConnectionError("MCP客户端未连接")
+
+        timeout = effective_timeout(timeout)
+        if self.server_loop is asyncio.get_running_loop():
+            return await asyncio.wait_for(coro, timeout=timeout)
+
+        future = asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.server_loop))
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            self.cancelled_calls += 1
+            raise
+
+    async def _execute(self, method: str, params: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        """执行一个JSON-RPC请求，返回应答对象"""
+        request = {
+            "jsonrpc": "2.0",
+            "id": self._next_request_id(),
+            "method": method,
+            "params": params
+        }
+        self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            return await self._run_on_server(self.server.execute_local_request(self._connection, request), timeout)
+        finally:
+            self._in_flight -= 1
+            self.total_time += time.perf_counter() - start
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any],
+                        timeout: Optional[float] = None, idempotent: Optional[bool] = None) -> Dict[str, Any]:
+        """调用MCP工具（idempotent 仅为与 MCPClient 接口一致，进程内调用不会因断线中断）"""
+        cached = self.tool_cache.get(tool_name, arguments)
+        if cached is not None:
+            return cached
+
+        timeout = timeout or self.call_timeout
+        self.calls += 1
+        try:
+            with call_deadline(timeout):
+                attempt = 0
+                while True:
+                    response = await self._execute("tools/call", {"name": tool_name, "arguments": arguments}, timeout)
+                    try:
+                        result = self._tool_result(tool_name, response)
+                        break
+                    except MCPServerBusyError as e:
+                        await wait_busy_retry(e, attempt, self.busy_retry_attempts, tool_name)
+                        attempt += 1
+                        self.busy_retries += 1
+            self.tool_cache.put(tool_name, arguments, result)
+            return result
+        except asyncio.TimeoutError:
+            self.errors += 1
+            logger.error(f"MCP工具调用超时: {tool_name}")
+            raise MCPDeadlineExceededError(f"工具调用超时: {tool_name}")
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"MCP工具调用失败: {e}")
+            raise
+
+    async def call_tools_batch(self, calls: List[Dict[str, Any]], timeout: Optional[float] = None,
+                               return_exceptions: bool = False) -> List[Any]:
+        """并发调用多个工具，参数与返回值同 MCPClient.call_tools_batch"""
+        if not calls:
+            return []
+
+        timeout = timeout or self.call_timeout
+        with call_deadline(timeout):
+            results = await asyncio.gather(
+                *(self.call_tool(call["name"], call.get("arguments", {}), timeout) for call in calls),
+                return_exceptions=True
+            )
+
+        if not return_exceptions:
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+        return list(results)
+
+    async def list_tools(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """获取服务器的工具列表（按 tools/list 策略缓存，服务器工具版本变化时清空工具结果缓存）"""
+        # 进程内传输收不到 tools/list_changed 通知，查缓存前直接比对服务器的工具版本
+        self.tool_cache.set_schema_version(self.server.tools_version())
+        cached = self.tool_cache.get("tools/list", {})
+        if cached is not None:
+            return cached
+
+        response = await self._execute("tools/list", {}, timeout or self.call_timeout)
+        raise_for_busy(response)
+        result = response.get("result") or {}
+        self.tool_cache.set_schema_version(result.get("version"))
+        tools = result.get("tools", [])
+        self.tool_cache.apply_tool_hints(tools)
+        self.tool_cache.put("tools/list", {}, tools)
+        return tools
+
+    @staticmethod
+    def _tool_result(tool_name: str, response: Dict[str, Any]) -> Dict[str, Any]:
+        """从工具调用应答中取出结果，错误应答或空结果抛出异常"""
+        raise_for_busy(response)
+        raise_for_deadline(response)
+        error = response.get("error")
+        if error:
+            raise Exception(f"MCP工具调用失败: {error.get('message', '未知错误')}")
+
+        result = response.get("result")
+        if not result:
+            raise Exception("MCP工具调用返回空结果")
+
+        logger.info(f"✅ MCP工具调用成功: {tool_name}")
+        return result
+
+    async def upload_blob(self, data: bytes, timeout: Optional[float] = None) -> str:
+        """把数据块直接存入服务器的数据块存储，返回内容哈希"""
+        async def put():
+            return self.server.blob_store.put(data)
+
+        return await self._run_on_server(put(), timeout or self.call_timeout)
+
+    async def send_custom_message(self, message_type: str, data: Dict[str, Any],
+                                  timeout: float = 30.0) -> Dict[str, Any]:
+        """自定义消息：进程内传输只支持ping"""
+        if message_type != "ping":
+            raise Exception(f"进程内传输不支持自定义消息: {message_type}")
+
+        async def pong():
+            return {
+                "type": "pong",
+                "timestamp": data.get("timestamp"),
+                "server_time": asyncio.get_running_loop().time(),
+                "transport": "in_process"
+            }
+
+        return await self._run_on_server(pong(), timeout)
+
+    async def ping(self) -> bool:
+        """测试服务器事件循环是否响应"""
+        try:
+            response = await self.send_custom_message("ping", {"timestamp": time.time()}, timeout=5.0)
+            return response.get("type") == "pong"
+        except Exception as e:
+            logger.error(f"Ping测试失败: {e}")
+            return False
+
+    def get_stats(self) -> Dict[str, Any]:
+        """调用统计"""
+        return {
+            "transport": "in_process",
+            "connected": self.is_connected(),
+            "in_flight": self._in_flight,
+            "calls": self.calls,
+            "errors": self.errors,
+            "cancelled_calls": self.cancelled_calls,
+            "busy_retries": self.busy_retries,
+            "tool_cache": self.tool_cache.get_stats(),
+            "avg_call_time": self.total_time / self.calls if self.calls else 0.0
+        }
+
+    async def __aenter__(self):
+        """异步上下文管理器入口"""
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器出口"""
+        await self.disconnect()
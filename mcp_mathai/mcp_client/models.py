@@ -15,33 +15,66 @@ from utils.exceptions import APIConnectionError
 logger = logging.getLogger(__name__)
 
 class NVIDIAModelClient:
-    """NVIDIA API客户端"""
+    """
+    NVIDIA API客户端（OpenAI兼容的 /chat/completions 接口）
 
-    def __init__(self, api_key: str = None):
+    api_base 默认取 models.api_base，可指向本地替身服务器做离线压测。
+    可用作异步上下文管理器（退出时关闭会话），也可长期持有：open() 后复用连接，用完调用 close()。
+    """
+
+    def __init__(self, api_key: str = None, api_base: str = None):
         self.api_key = api_key or settings.get_api_key()
-        self.api_base = settings.get("models.api_base")
+        self.api_base = (api_base or settings.get("models.api_base")).rstrip("/")
         self.session = None
 
+    async def open(self) -> "NVIDIAModelClient":
+        """创建HTTP会话（已有可用会话时复用）"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=settings.get("models.request_timeout", 300)),
+                connector=aiohttp.TCPConnector(limit=settings.get("models.max_connections", 100)),
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json"
+                }
+            )
+        return self
+
+    async def close(self):
+        """关闭HTTP会话"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
     async def __aenter__(self):
         """异步上下文管理器入口"""
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=300),  # 5分钟超时
-            headers={
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-        )
-        return self
+        return await self.open()
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """异步上下文管理器出口"""
-        if self.session:
-            await self.session.close()
+        await self.close()
 
-    async def call_vision_model(self, model_name: str, image_data: str, prompt: str, max_tokens: int = 2000) -> Dict[str, Any]:
-        """调用视觉模型"""
+    async def chat_completions(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """发送 /chat/completions 请求，返回完整响应"""
         url = f"{self.api_base}/chat/completions"
+        await self.open()
 
+        try:
+            async with self.session.post(url, json=payload) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"NVIDIA API调用失败: {response.status} - {error_text}")
+                    raise APIConnectionError(f"API调用失败: {response.status}")
+
+                result = await response.json()
+                return result
+
+        except aiohttp.ClientError as e:
+            logger.error(f"网络错误: {e}")
+            raise APIConnectionError(f"网络连接错误: {e}")
+
+    async def call_vision_model(self, model_name: str, image_data: str, prompt: str, max_tokens: int = 2000) -> Dict[str, Any]:
+        """调用视觉模型"""
         # 构建请求数据
         messages = [
             {
@@ -70,24 +103,10 @@ class NVIDIAModelClient:
             "stream": False
         }
 
-        try:
-            async with self.session.post(url, json=payload) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"NVIDIA API调用失败: {response.status} - {error_text}")
-                    raise APIConnectionError(f"API调用失败: {response.status}")
-
-                result = await response.json()
-                return result
-
-        except aiohttp.ClientError as e:
-            logger.error(f"网络错误: {e}")
-            raise APIConnectionError(f"网络连接错误: {e}")
+        return await self.chat_completions(payload)
 
     async def call_text_model(self, model_name: str, prompt: str, max_tokens: int = 1000) -> Dict[str, Any]:
         """调用文本模型"""
-        url = f"{self.api_base}/chat/completions"
-
         payload = {
             "model": model_name,
             "messages": [
@@ -102,19 +121,7 @@ class NVIDIAModelClient:
             "stream": False
         }
 
-        try:
-            async with self.session.post(url, json=payload) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    logger.error(f"NVIDIA API调用失败: {response.status} - {error_text}")
-                    raise APIConnectionError(f"API调用失败: {response.status}")
-
-                result = await response.json()
-                return result
-
-        except aiohttp.ClientError as e:
-            logger.error(f"网络错误: {e}")
-            raise APIConnectionError(f"网络连接错误: {e}")
+        return await self.chat_completions(payload)
 
 class MathGradingAI:
     """数学批改AI接口"""
@@ -181,7 +188,8 @@ class MathGradingAI:
         content = response.get("choices", [{}])[0].get("message", {}).get("content", "")
         return content.strip()
 
-    def _build_homework_analysis_prompt(self, grade_level: str) -> str:
+    @staticmethod
+    def _build_homework_analysis_prompt(grade_level: str) -> str:
         """构建作业分析提示词"""
         return f"""你是一个专业的{grade_level}数学老师。请仔细分析这张数学作业图片，并按照以下要求进行批改：
 
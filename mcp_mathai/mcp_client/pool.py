@@ -0,0 +1,341 @@
+# ===============================
+# mcp_client/pool.py - MCP连接池
+# ===============================
+import asyncio
+import contextlib
+import logging
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+
+from config.settings import settings
+from utils.exceptions import MCPConnectionError, MCPCallInterruptedError
+from .tool_cache import ToolResultCache
+from .client import MCPClient, MathToolsMixin, BlobCache, backoff_delay, call_deadline, effective_timeout
+
+logger = logging.getLogger(__name__)
+
+
+def parse_endpoints(endpoints: Optional[List[Any]] = None) -> List[Tuple[str, int]]:
+    """
+    解析服务器地址列表
+
+    支持 "host:port" 字符串或 (host, port) 元组；未配置时使用 server.host/server.port。
+    """
+    endpoints = endpoints or settings.get("mcp.endpoints") or []
+    parsed = []
+    for endpoint in endpoints:
+        if isinstance(endpoint, str):
+            host, _, port = endpoint.rpartition(":")
+            parsed.append((host or "localhost", int(port)))
+        else:
+            host, port = endpoint
+            parsed.append((host, int(port)))
+
+    if not parsed:
+        parsed.append((settings.get("server.host", "localhost"), int(settings.get("server.port", 8765))))
+    return parsed
+
+
+class _PooledConnection:
+    """连接池中的一个连接槽位"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.client: Optional[MCPClient] = None
+        self.calls = 0
+        self.errors = 0
+        self.replacements = 0
+        self.failures = 0   # 连续重建失败次数，用于退避
+        self.replacing: Optional[asyncio.Task] = None
+
+    @property
+    def endpoint(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def is_connected(self) -> bool:
+        return self.client is not None and self.client.is_connected()
+
+
+class MCPClientPool(MathToolsMixin):
+    """
+    MCP连接池
+
+    维护多条到一个或多个MCP服务器的连接，每次调用发往在途请求最少的连接。
+    断开的连接由后台任务重建，调用方无需感知。接口与 MCPClient 保持一致，可直接替换。
+    """
+
+    def __init__(self, endpoints: Optional[List[Any]] = None, size: Optional[int] = None,
+                 health_interval: Optional[float] = None):
+        self.endpoints = parse_endpoints(endpoints)
+        self.size = max(1, int(size or settings.get("mcp.pool_size", 4)))
+        self.health_interval = health_interval or settings.get("mcp.pool_health_interval", 5)
+
+        # 连接按轮询方式分布到各服务器
+        self._slots = [
+            _PooledConnection(*self.endpoints[i % len(self.endpoints)]) for i in range(self.size)
+        ]
+        self.idempotent_tools = set(settings.get("mcp.idempotent_tools", []))
+        self.retry_attempts = settings.get("mcp.retry_attempts", 3)
+        self.retry_delay = settings.get("mcp.retry_delay", 2)
+        self.max_retry_delay = settings.get("mcp.max_retry_delay", 30)
+        self.retried_calls = 0
+        self.interrupted_calls = 0
+        self.call_timeout = settings.get("mcp.call_timeout", 60)
+        self._available: Optional[asyncio.Event] = None
+
+        # 各连接共用的已上传数据块缓存，调用落到缺少该数据块的服务进程时自动补传
+        self.blob_cache = BlobCache()
+        # 各连接共用的工具结果缓存
+        self.tool_cache = ToolResultCache()
+
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._next_slot = 0
+        self._closed = False
+
+    async def connect(self) -> bool:
+        """建立全部连接，至少一条成功即可使用"""
+        self._closed = False
+        results = await asyncio.gather(
+            *(self._connect_slot(slot) for slot in self._slots), return_exceptions=True
+        )
+        connected = sum(1 for r in results if r is True)
+
+        if not self._monitor_task or self._monitor_task.done():
+            self._monitor_task = asyncio.create_task(self._monitor_loop())
+
+        if connected == 0:
+            await self.disconnect()
+            raise MCPConnectionError(f"MCP连接池没有可用连接: {results[0]}")
+
+        logger.info(f"✅ MCP连接池已就绪: {connected}/{self.size} 条连接")
+        return True
+
+    async def _connect_slot(self, slot: _PooledConnection) -> bool:
+        """为槽位建立新连接"""
+        # 断线由连接池统一重建，单个连接不自行重连
+        client = MCPClient(host=slot.host, port=slot.port, auto_reconnect=False,
+                           blob_cache=self.blob_cache, tool_cache=self.tool_cache)
+        await client.connect()
+        old_client, slot.client = slot.client, client
+        if old_client is not None:
+            with contextlib.suppress(Exception):
+                await old_client.disconnect()
+        return True
+
+    def _schedule_replace(self, slot: _PooledConnection):
+        """后台重建断开的连接，同一槽位同时只有一个重建任务"""
+        if self._closed or (slot.replacing and not slot.replacing.done()):
+            return
+
+        async def replace():
+            if slot.failures:
+                await asyncio.sleep(backoff_delay(slot.failures - 1, self.retry_delay, self.max_retry_delay))
+            try:
+                await self._connect_slot(slot)
+                slot.failures = 0
+                slot.replacements += 1
+                self._get_available_event().set()
+                logger.info(f"MCP连接已重建: {slot.endpoint}")
+            except Exception as e:
+                slot.failures += 1
+                logger.warning(f"重建MCP连接失败 ({slot.endpoint}): {e}")
+
+        slot.replacing = asyncio.create_task(replace())
+
+    async def _monitor_loop(self):
+        """定期检查连接，断开的连接在后台重建"""
+        while not self._closed:
+            await asyncio.sleep(self.health_interval)
+            for slot in self._slots:
+                if not slot.is_connected():
+                    self._schedule_replace(slot)
+
+    def _select(self) -> _PooledConnection:
+        """选择在途请求最少的可用连接，相同负载时轮询"""
+        best = None
+        for offset in range(self.size):
+            slot = self._slots[(self._next_slot + offset) % self.size]
+            if not slot.is_connected():
+                self._schedule_replace(slot)
+                continue
+            if best is None or slot.client.in_flight < best.client.in_flight:
+                best = slot
+
+        if best is None:
+            raise MCPConnectionError("MCP连接池没有可用连接")
+
+        self._next_slot = (self._next_slot + 1) % self.size
+        return best
+
+    def _get_available_event(self) -> asyncio.Event:
+        """有连接重建成功时触发的事件（惰性创建，绑定当前事件循环）"""
+        if self._available is None:
+            self._available = asyncio.Event()
+        return self._available
+
+    async def _acquire(self, timeout: float) -> _PooledConnection:
+        """选择可用连接；全部断开时等待后台重建，最长等待 timeout 秒"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            try:
+                return self._select()
+            except MCPConnectionError:
+                remaining = deadline - loop.time()
+                if remaining <= 0 or self._closed:
+                    raise
+                available = self._get_available_event()
+                available.clear()
+                try:
+                    await asyncio.wait_for(available.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    raise MCPConnectionError("等待MCP连接重建超时")
+
+    async def call_tool(self, tool_name: str, arguments: Dict[str, Any],
+                        timeout: Optional[float] = None, idempotent: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        通过负载最低的连接调用MCP工具
+
+        连接断开导致的失败换一条连接重试：请求未发出时总是重试，
+        已发出的只有幂等工具才重试，否则抛出 MCPCallInterruptedError。重试不会超过 timeout 对应的截止时间。
+        """
+        if idempotent is None:
+            idempotent = tool_name in self.idempotent_tools
+
+        with call_deadline(timeout or self.call_timeout):
+            return await self._with_retry(
+                tool_name, timeout, idempotent,
+                lambda client: client.call_tool(tool_name, arguments, timeout=timeout, idempotent=idempotent)
+            )
+
+    async def call_tools_batch(self, calls: List[Dict[str, Any]], timeout: Optional[float] = None,
+                               return_exceptions: bool = False) -> List[Any]:
+        """通过负载最低的连接发送批量工具调用，参数与返回值同 MCPClient.call_tools_batch"""
+        if not calls:
+            return []
+
+        idempotent = all(call["name"] in self.idempotent_tools for call in calls)
+        with call_deadline(timeout or self.call_timeout):
+            return await self._with_retry(
+                f"批量调用({len(calls)}个)", timeout, idempotent,
+                lambda client: client.call_tools_batch(calls, timeout=timeout, return_exceptions=return_exceptions)
+            )
+
+    async def _with_retry(self, label: str, timeout: Optional[float], idempotent: bool,
+                          operation: Callable[[MCPClient], Awaitable[Any]]) -> Any:
+        """在截止时间内通过选中的连接执行调用，连接断开时换连接重试"""
+        attempt = 0
+        while True:
+            slot = None
+            try:
+                slot = await self._acquire(effective_timeout(timeout or self.call_timeout))
+                slot.calls += 1
+                return await operation(slot.client)
+            except MCPConnectionError as e:
+                interrupted = isinstance(e, MCPCallInterruptedError)
+                if slot is not None:
+                    slot.errors += 1
+                    self._schedule_replace(slot)
+                if (interrupted and not idempotent) or self._closed or attempt >= self.retry_attempts:
+                    if interrupted:
+                        self.interrupted_calls += 1
+                    raise
+
+                attempt += 1
+                self.retried_calls += 1
+                delay = backoff_delay(attempt - 1, self.retry_delay, self.max_retry_delay)
+                logger.warning(f"MCP工具调用因连接断开失败，{delay:.1f}秒后换连接第{attempt}次重试: {label}")
+                await asyncio.sleep(effective_timeout(delay))
+            except Exception:
+                if slot is not None:
+                    slot.errors += 1
+                raise
+
+    async def list_tools(self, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """获取服务器的工具列表"""
+        with call_deadline(timeout or self.call_timeout):
+            return await self._with_retry(
+                "tools/list", timeout, True, lambda client: client.list_tools(timeout=timeout)
+            )
+
+    async def upload_blob(self, data: bytes, timeout: Optional[float] = None) -> str:
+        """通过负载最低的连接上传数据块，返回内容哈希；其他连接的服务进程缺少时调用会自动补传"""
+        slot = await self._acquire(timeout or self.call_timeout)
+        return await slot.client.upload_blob(data, timeout=timeout)
+
+    async def send_custom_message(self, message_type: str, data: Dict[str, Any],
+                                  timeout: float = 30.0) -> Dict[str, Any]:
+        """通过负载最低的连接发送自定义消息"""
+        return await self._select().client.send_custom_message(message_type, data, timeout=timeout)
+
+    async def ping(self) -> bool:
+        """测试连接"""
+        try:
+            return await self._select().client.ping()
+        except Exception as e:
+            logger.error(f"Ping测试失败: {e}")
+            return False
+
+    def is_connected(self) -> bool:
+        """是否至少有一条可用连接"""
+        return any(slot.is_connected() for slot in self._slots)
+
+    @property
+    def connected(self) -> bool:
+        return self.is_connected()
+
+    @property
+    def in_flight(self) -> int:
+        """全部连接上等待响应的调用数"""
+        return sum(slot.client.in_flight for slot in self._slots if slot.client is not None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """连接池统计"""
+        return {
+            "size": self.size,
+            "connected": sum(1 for slot in self._slots if slot.is_connected()),
+            "in_flight": self.in_flight,
+            "endpoints": [f"{host}:{port}" for host, port in self.endpoints],
+            "retried_calls": self.retried_calls,
+            "interrupted_calls": self.interrupted_calls,
+            "cancelled_calls": sum(slot.client.cancelled_calls for slot in self._slots if slot.client is not None),
+            "tool_cache": self.tool_cache.get_stats(),
+            "connections": [
+                {
+                    "endpoint": slot.endpoint,
+                    "connected": slot.is_connected(),
+                    "in_flight": slot.client.in_flight if slot.client is not None else 0,
+                    "calls": slot.calls,
+                    "errors": slot.errors,
+                    "replacements": slot.replacements
+                }
+                for slot in self._slots
+            ]
+        }
+
+    async def disconnect(self):
+        """关闭全部连接"""
+        self._closed = True
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._monitor_task
+            self._monitor_task = None
+
+        for slot in self._slots:
+            if slot.replacing and not slot.replacing.done():
+                slot.replacing.cancel()
+            if slot.client is not None:
+                with contextlib.suppress(Exception):
+                    await slot.client.disconnect()
+                slot.client = None
+        logger.info("MCP连接池已关闭")
+
+    async def __aenter__(self):
+        """异步上下文管理器入口"""
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器出口"""
+        await self.disconnect()
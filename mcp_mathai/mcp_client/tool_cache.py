@@ -0,0 +1,156 @@
+# ===============================
+# mcp_client/tool_cache.py - MCP工具结果缓存
+# ===============================
+import copy
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def canonical_arguments(arguments: Any, key_fields: Optional[List[str]] = None) -> str:
+    """
+    参数的规范化JSON表示，用于计算缓存键
+
+    字典按键排序，字符串去掉首尾空白，二进制数据以内容哈希代替；
+    以下划线开头的键（如 _meta）不参与计算。指定 key_fields 时只取这些参数。
+    """
+    def normalize(value):
+        if isinstance(value, dict):
+            return {str(k): normalize(v) for k, v in value.items() if not str(k).startswith("_")}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        if isinstance(value, (bytes, bytearray)):
+            return {"sha256": hashlib.sha256(value).hexdigest()}
+        if isinstance(value, str):
+            return value.strip()
+        return value
+
+    if key_fields is not None and isinstance(arguments, dict):
+        arguments = {field: arguments.get(field) for field in key_fields}
+    return json.dumps(normalize(arguments), sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+class CachePolicy:
+    """单个工具的缓存策略"""
+
+    def __init__(self, ttl: float, max_entries: int = 256, key_fields: Optional[List[str]] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_fields = key_fields
+
+    def make_key(self, arguments: Any) -> str:
+        return hashlib.sha256(canonical_arguments(arguments, self.key_fields).encode("utf-8")).hexdigest()
+
+
+class ToolResultCache:
+    """
+    按工具配置TTL的结果缓存
+
+    只缓存配置了策略的工具（只读且结果确定的工具，以及 tools/list），每个工具单独LRU淘汰。
+    服务器报告新的工具版本时全部失效。连接池中的各连接共用一份。
+    """
+
+    def __init__(self, policies: Optional[Dict[str, Any]] = None, enabled: Optional[bool] = None):
+        self.enabled = settings.get("mcp.tool_cache.enabled", True) if enabled is None else enabled
+        policies = policies if policies is not None else settings.get("mcp.tool_cache.policies", {})
+        self.policies: Dict[str, CachePolicy] = {
+            name: policy if isinstance(policy, CachePolicy) else CachePolicy(**policy)
+            for name, policy in policies.items()
+        }
+        self.schema_version: Optional[str] = None
+
+        self._entries: Dict[str, "OrderedDict[str, Tuple[float, Any]]"] = {}
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.invalidations = 0
+
+    def policy_for(self, tool_name: str) -> Optional[CachePolicy]:
+        return self.policies.get(tool_name) if self.enabled else None
+
+    def _tool_stats(self, tool_name: str) -> Dict[str, int]:
+        return self._stats.setdefault(tool_name, {"hits": 0, "misses": 0, "expired": 0, "evictions": 0})
+
+    def get(self, tool_name: str, arguments: Any) -> Optional[Any]:
+        """查询缓存，命中时返回结果副本；工具没有缓存策略时返回None且不计入统计"""
+        policy = self.policy_for(tool_name)
+        if policy is None:
+            return None
+
+        stats = self._tool_stats(tool_name)
+        entries = self._entries.get(tool_name)
+        key = policy.make_key(arguments)
+        entry = entries.get(key) if entries else None
+        if entry is None:
+            stats["misses"] += 1
+            return None
+
+        expires_at, result = entry
+        if time.monotonic() >= expires_at:
+            del entries[key]
+            stats["expired"] += 1
+            stats["misses"] += 1
+            return None
+
+        entries.move_to_end(key)
+        stats["hits"] += 1
+        return copy.deepcopy(result)
+
+    def put(self, tool_name: str, arguments: Any, result: Any):
+        """保存结果（工具报告错误的结果不缓存）"""
+        policy = self.policy_for(tool_name)
+        if policy is None or (isinstance(result, dict) and result.get("isError")):
+            return
+
+        entries = self._entries.setdefault(tool_name, OrderedDict())
+        entries[policy.make_key(arguments)] = (time.monotonic() + policy.ttl, copy.deepcopy(result))
+        while len(entries) > policy.max_entries:
+            entries.popitem(last=False)
+            self._tool_stats(tool_name)["evictions"] += 1
+
+    def apply_tool_hints(self, tools: List[Dict[str, Any]]):
+        """按 tools/list 中工具声明的 annotations.cacheTtl 为尚未配置策略的工具添加缓存策略"""
+        for tool in tools:
+            ttl = (tool.get("annotations") or {}).get("cacheTtl")
+            if ttl and tool.get("name") and tool["name"] not in self.policies:
+                self.policies[tool["name"]] = CachePolicy(ttl)
+
+    def invalidate(self, tool_name: Optional[str] = None):
+        """使缓存失效，不指定工具时全部失效"""
+        if tool_name is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(tool_name, None)
+        self.invalidations += 1
+
+    def set_schema_version(self, version: Optional[str]):
+        """记录服务器的工具版本，与之前不同时全部失效"""
+        if version is None:
+            return
+        if self.schema_version is not None and version != self.schema_version:
+            logger.info(f"MCP工具版本变化 ({self.schema_version} -> {version})，清空工具结果缓存")
+            self.invalidate()
+        self.schema_version = version
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        hits = sum(s["hits"] for s in self._stats.values())
+        misses = sum(s["misses"] for s in self._stats.values())
+        return {
+            "enabled": self.enabled,
+            "schema_version": self.schema_version,
+            "entries": sum(len(entries) for entries in self._entries.values()),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "invalidations": self.invalidations,
+            "tools": {
+                name: {**stats, "entries": len(self._entries.get(name, ()))}
+                for name, stats in self._stats.items()
+            }
+        }
@@ -4,10 +4,12 @@
 """MCP服务器模块"""
 
 from .server import MathGradingMCPServer
+from .workers import ServerSupervisor
 from .tools import math_grading_tools, MathGradingTools
 
 __all__ = [
     "MathGradingMCPServer",
+    "ServerSupervisor",
     "math_grading_tools",
     "MathGradingTools"
 ]
@@ -0,0 +1,97 @@
+# ===============================
+# mcp_server/admission.py - 请求准入控制
+# ===============================
+import asyncio
+from typing import Dict, Any, Optional
+
+from config.settings import settings
+
+
+class ServerBusyError(Exception):
+    """等待队列已满，请求未被接受；retry_after_ms 为建议的重试等待时间"""
+
+    def __init__(self, message: str, retry_after_ms: int):
+        super().__init__(message)
+        self.retry_after_ms = retry_after_ms
+
+
+class AdmissionController:
+    """
+    服务器的全局准入控制
+
+    全部连接同时执行的请求数不超过 max_in_flight，超出的请求在有界队列中按到达顺序等待；
+    队列已满或单个客户端排队的请求过多时立即拒绝，并按近期请求耗时估算建议的重试等待时间，
+    避免突发请求全部堆积到上游超时。
+
+    Args:
+        max_in_flight: 全部连接同时执行的请求数上限
+        max_queue: 全部连接等待执行的请求数上限
+        max_queue_per_client: 单个连接等待执行的请求数上限，避免一个客户端占满队列
+    """
+
+    # 请求耗时的指数移动平均系数
+    _EWMA_ALPHA = 0.2
+
+    def __init__(self, max_in_flight: Optional[int] = None, max_queue: Optional[int] = None,
+                 max_queue_per_client: Optional[int] = None):
+        self.max_in_flight = max_in_flight or settings.get("server.admission.max_in_flight", 64)
+        self.max_queue = max_queue if max_queue is not None else settings.get("server.admission.max_queue", 256)
+        self.max_queue_per_client = max_queue_per_client if max_queue_per_client is not None else \
+            settings.get("server.admission.max_queue_per_client", 64)
+        self.min_retry_ms = settings.get("server.admission.min_retry_ms", 100)
+        self.max_retry_ms = settings.get("server.admission.max_retry_ms", 10000)
+
+        self.slots = asyncio.Semaphore(self.max_in_flight)
+        self.waiting = 0            # 已接受、等待执行的请求数
+        self.avg_run_time = 0.5     # 请求耗时的移动平均(秒)，没有样本时按0.5秒估算
+
+        # 统计
+        self.admitted = 0
+        self.rejected = 0
+        self.peak_waiting = 0
+
+    def retry_after_ms(self) -> int:
+        """按排在前面的请求数和平均耗时估算队列腾出空位的时间"""
+        estimate = self.avg_run_time * (self.waiting + 1) / self.max_in_flight * 1000
+        return int(min(self.max_retry_ms, max(self.min_retry_ms, estimate)))
+
+    def admit(self, client_waiting: int):
+        """
+        接受一个请求进入等待队列，调用方在请求开始执行或放弃等待时调用 dequeue
+
+        Raises:
+            ServerBusyError: 全局队列或该客户端的队列已满
+        """
+        if self.waiting >= self.max_queue:
+            reason = "服务器繁忙"
+        elif client_waiting >= self.max_queue_per_client:
+            reason = "该连接排队的请求过多"
+        else:
+            self.waiting += 1
+            self.admitted += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            return
+
+        self.rejected += 1
+        retry_after_ms = self.retry_after_ms()
+        raise ServerBusyError(f"{reason}，请在 {retry_after_ms} 毫秒后重试", retry_after_ms)
+
+    def dequeue(self):
+        self.waiting -= 1
+
+    def record(self, elapsed: float):
+        """记录一个请求的执行耗时"""
+        self.avg_run_time += self._EWMA_ALPHA * (elapsed - self.avg_run_time)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "max_queue_per_client": self.max_queue_per_client,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_run_ms": self.avg_run_time * 1000,
+            "retry_after_ms": self.retry_after_ms()
+        }
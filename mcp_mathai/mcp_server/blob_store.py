@@ -0,0 +1,146 @@
+# ===============================
+# mcp_server/blob_store.py - 服务器端数据块存储
+# ===============================
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from utils.mcp_protocol import blob_hash, sniff_image_mime
+
+
+class BlobNotFoundError(KeyError):
+    """引用的数据块不存在"""
+
+    def __init__(self, digest: str):
+        super().__init__(digest)
+        self.digest = digest
+
+
+class BlobStore:
+    """
+    按内容哈希存储客户端上传的数据块（作业图像）
+
+    客户端以二进制帧分块上传，提交时校验哈希与大小后合并保存。
+    已完成的数据块按总字节数做LRU淘汰，未完成的上传超时后丢弃。
+    保存时按文件头记录数据块的MIME类型，供解析 "blob:<哈希>" 引用时生成 data URL。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, partial_ttl: float = 600):
+        self.max_bytes = max_bytes
+        self.partial_ttl = partial_ttl
+        self.logger = logging.getLogger(__name__)
+
+        self._blobs: "OrderedDict[str, bytes]" = OrderedDict()
+        self._mime_types: Dict[str, str] = {}
+        self._bytes = 0
+        self._partial: Dict[str, Dict[int, bytes]] = {}
+        self._partial_touched: Dict[str, float] = {}
+
+        self.uploads = 0
+        self.dedup_hits = 0
+        self.evictions = 0
+
+    def has(self, digest: str) -> bool:
+        return digest in self._blobs
+
+    def check(self, digests: List[str]) -> Dict[str, List[str]]:
+        """查询哪些数据块已存在"""
+        present = [d for d in digests if d in self._blobs]
+        self.dedup_hits += len(present)
+        for digest in present:
+            self._blobs.move_to_end(digest)
+        return {"present": present, "missing": [d for d in digests if d not in self._blobs]}
+
+    def add_chunk(self, digest: str, index: int, chunk: bytes):
+        """暂存一个上传中的块"""
+        now = time.monotonic()
+        self._drop_stale_partials(now)
+        if digest in self._blobs:
+            return
+        self._partial.setdefault(digest, {})[index] = chunk
+        self._partial_touched[digest] = now
+
+    def commit(self, digest: str, size: int, chunks: int) -> Dict[str, Any]:
+        """
+        合并已上传的块并校验
+
+        Raises:
+            ValueError: 块不完整、大小或哈希不匹配
+        """
+        if digest in self._blobs:
+            self._partial.pop(digest, None)
+            self._partial_touched.pop(digest, None)
+            self._blobs.move_to_end(digest)
+            return {"hash": digest, "size": len(self._blobs[digest]), "stored": True}
+
+        parts = self._partial.pop(digest, {})
+        self._partial_touched.pop(digest, None)
+        missing = [i for i in range(chunks) if i not in parts]
+        if missing:
+            raise ValueError(f"数据块不完整，缺少第 {missing[:5]} 块")
+
+        data = b"".join(parts[i] for i in range(chunks))
+        if len(data) != size:
+            raise ValueError(f"数据块大小不匹配: 期望{size}, 实际{len(data)}")
+        if blob_hash(data) != digest:
+            raise ValueError("数据块哈希校验失败")
+
+        self._store(digest, data)
+        return {"hash": digest, "size": size, "stored": True}
+
+    def put(self, data: bytes) -> str:
+        """直接保存完整数据块（同进程客户端使用），返回内容哈希"""
+        digest = blob_hash(data)
+        if digest in self._blobs:
+            self.dedup_hits += 1
+            self._blobs.move_to_end(digest)
+            return digest
+
+        self._store(digest, data)
+        return digest
+
+    def _store(self, digest: str, data: bytes):
+        self._blobs[digest] = data
+        self._mime_types[digest] = sniff_image_mime(data)
+        self._bytes += len(data)
+        self.uploads += 1
+        self._evict()
+
+    def get(self, digest: str) -> Optional[bytes]:
+        """读取数据块"""
+        data = self._blobs.get(digest)
+        if data is not None:
+            self._blobs.move_to_end(digest)
+        return data
+
+    def mime_type(self, digest: str) -> Optional[str]:
+        """数据块的MIME类型，数据块不存在时返回None"""
+        return self._mime_types.get(digest)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "blobs": len(self._blobs),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "partial_uploads": len(self._partial),
+            "uploads": self.uploads,
+            "dedup_hits": self.dedup_hits,
+            "evictions": self.evictions
+        }
+
+    def _evict(self):
+        """超过容量时淘汰最久未使用的数据块"""
+        while self._bytes > self.max_bytes and len(self._blobs) > 1:
+            digest, data = self._blobs.popitem(last=False)
+            self._mime_types.pop(digest, None)
+            self._bytes -= len(data)
+            self.evictions += 1
+
+    def _drop_stale_partials(self, now: float):
+        """丢弃超时未提交的上传"""
+        for digest, touched in list(self._partial_touched.items()):
+            if now - touched > self.partial_ttl:
+                self._partial.pop(digest, None)
+                del self._partial_touched[digest]
+                self.logger.warning(f"丢弃未完成的上传: {digest[:12]}")
@@ -0,0 +1,145 @@
+# ===============================
+# mcp_server/cpu_pool.py - CPU密集型工具的进程池
+# ===============================
+import asyncio
+import functools
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Dict, Any, Optional, Callable
+
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _run_with_shared_memory(func: Callable, name: str, size: int, args: tuple, kwargs: dict):
+    """
+    子进程入口：挂载共享内存，以内存视图调用 func(数据, *args, **kwargs)
+
+    返回 (开始时间, 结束时间, 结果)，时间用于统计排队等待与执行耗时。
+    """
+    started = time.time()
+    shm = shared_memory.SharedMemory(name=name)
+    view = shm.buf[:size]
+    try:
+        result = func(view, *args, **kwargs)
+    finally:
+        view.release()
+        shm.close()
+    return started, time.time(), result
+
+
+def _run_plain(func: Callable, args: tuple, kwargs: dict):
+    """子进程入口：没有大块数据的调用"""
+    started = time.time()
+    result = func(*args, **kwargs)
+    return started, time.time(), result
+
+
+class CPUWorkerPool:
+    """
+    服务器的CPU密集型工具进程池
+
+    图像解码、OpenCV轮廓提取、PIL增强缩放等工作放到子进程执行，不阻塞服务器事件循环。
+    图像字节写入共享内存后只把块名传给子进程，避免pickle复制整张图像；
+    被调用的函数收到内存视图（memoryview），np.frombuffer 可零拷贝使用，io.BytesIO 也可直接接受。
+    进程池在首次使用时创建，max_workers 为0时在线程池中执行（不使用子进程）。
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        if max_workers is None:
+            max_workers = settings.get("server.cpu_workers", 2)
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+        # 统计
+        self.pending = 0            # 已提交未完成的任务数
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+        self.shared_bytes = 0       # 经共享内存传递的字节数
+        self.total_wait = 0.0       # 提交到子进程开始执行的累计时间
+        self.total_run = 0.0        # 子进程执行的累计时间
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn 避免复制服务器进程中的事件循环、套接字和线程
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"CPU工具进程池已启动: {self.max_workers} 个进程")
+        return self._executor
+
+    @property
+    def queue_depth(self) -> int:
+        """等待空闲进程的任务数"""
+        return max(0, self.pending - max(self.max_workers, 1))
+
+    async def run(self, func: Callable, data: Optional[bytes] = None, *args, **kwargs) -> Any:
+        """
+        在进程池中执行 func，给出 data 时经共享内存传入并作为第一个参数
+
+        func 必须是可pickle的模块级函数（或类的静态方法）。
+        """
+        loop = asyncio.get_running_loop()
+        if self.max_workers <= 0:
+            call_args = (data, *args) if data is not None else args
+            return await loop.run_in_executor(None, functools.partial(func, *call_args, **kwargs))
+
+        shm = None
+        self.pending += 1
+        self.peak_queue_depth = max(self.peak_queue_depth, self.queue_depth)
+        submitted = time.time()
+        try:
+            if data is not None:
+                shm = shared_memory.SharedMemory(create=True, size=max(len(data), 1))
+                shm.buf[:len(data)] = data
+                self.shared_bytes += len(data)
+                call = (_run_with_shared_memory, func, shm.name, len(data), args, kwargs)
+            else:
+                call = (_run_plain, func, args, kwargs)
+
+            started, finished, result = await loop.run_in_executor(self._get_executor(), *call)
+            self.completed += 1
+            self.total_wait += max(0.0, started - submitted)
+            self.total_run += finished - started
+            return result
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，下次调用时重建
+            self.failed += 1
+            logger.error("CPU工具进程池的子进程异常退出，将重建进程池")
+            self.shutdown()
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """进程池统计：queue_depth 为等待空闲进程的任务数"""
+        return {
+            "max_workers": self.max_workers,
+            "started": self._executor is not None,
+            "pending": self.pending,
+            "queue_depth": self.queue_depth,
+            "peak_queue_depth": self.peak_queue_depth,
+            "completed": self.completed,
+            "failed": self.failed,
+            "shared_bytes": self.shared_bytes,
+            "avg_wait_ms": self.total_wait / self.completed * 1000 if self.completed else 0.0,
+            "avg_run_ms": self.total_run / self.completed * 1000 if self.completed else 0.0
+        }
+
+    def shutdown(self):
+        """关闭进程池，取消尚未开始的任务"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
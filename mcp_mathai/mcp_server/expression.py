@@ -0,0 +1,133 @@
+# ===============================
+# mcp_server/expression.py - 算术表达式校验
+# ===============================
+import ast
+import math
+import operator
+from fractions import Fraction
+from typing import Dict, Any, Optional
+
+# 作业中常见的书写方式替换为Python运算符
+_REPLACEMENTS = {
+    "×": "*", "÷": "/", "·": "*", "−": "-", "（": "(", "）": ")",
+    "＝": "=", "^": "**", "＋": "+", "－": "-"
+}
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# 限制指数和表达式长度，避免 9**9**9 之类的输入耗尽CPU
+MAX_EXPONENT = 100
+MAX_BITS = 100000
+MAX_LENGTH = 500
+
+
+class ExpressionError(ValueError):
+    """表达式无法解析或包含不支持的内容"""
+
+
+def normalize_expression(expression: str) -> str:
+    for old, new in _REPLACEMENTS.items():
+        expression = expression.replace(old, new)
+    return expression.strip()
+
+
+def evaluate(expression: str) -> Fraction:
+    """
+    精确计算算术表达式（整数、小数、四则运算、乘方、括号），结果为分数
+
+    Raises:
+        ExpressionError: 语法错误、含未知数或函数调用、除以零、指数过大
+    """
+    expression = normalize_expression(expression)
+    if not expression:
+        raise ExpressionError("表达式为空")
+    if len(expression) > MAX_LENGTH:
+        raise ExpressionError(f"表达式过长（超过{MAX_LENGTH}个字符）")
+
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise ExpressionError(f"无法解析的表达式: {expression}")
+
+    def visit(node) -> Fraction:
+        if isinstance(node, ast.Expression):
+            return visit(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) \
+                and not isinstance(node.value, bool):
+            # 1e400 之类的字面量解析为 inf
+            if isinstance(node.value, float) and not math.isfinite(node.value):
+                raise ExpressionError("数值过大")
+            return Fraction(str(node.value))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            left, right = visit(node.left), visit(node.right)
+            if isinstance(node.op, ast.Pow):
+                if right.denominator != 1 or abs(right) > MAX_EXPONENT:
+                    raise ExpressionError("只支持绝对值不超过100的整数指数")
+                if max(left.numerator.bit_length(), left.denominator.bit_length()) * abs(int(right)) > MAX_BITS:
+                    raise ExpressionError("计算结果过大")
+                if left == 0 and right < 0:
+                    raise ExpressionError("除数不能为零")
+                return left ** int(right)
+            try:
+                return _BINARY_OPS[type(node.op)](left, right)
+            except ZeroDivisionError:
+                raise ExpressionError("除数不能为零")
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return _UNARY_OPS[type(node.op)](visit(node.operand))
+        if isinstance(node, ast.Name):
+            raise ExpressionError(f"暂不支持含未知数的表达式: {node.id}")
+        raise ExpressionError(f"不支持的表达式内容: {ast.dump(node)[:40]}")
+
+    return visit(tree)
+
+
+def format_value(value: Fraction) -> str:
+    """整数按整数显示，其余显示为最简分数"""
+    return str(value.numerator) if value.denominator == 1 else f"{value.numerator}/{value.denominator}"
+
+
+def validate_expression(expression: str, expected_result: Optional[str] = None) -> Dict[str, Any]:
+    """
+    校验表达式：计算表达式的值；表达式是等式（a = b）时判断两边是否相等，
+    给出 expected_result 时判断计算结果是否等于期望值
+
+    Raises:
+        ExpressionError: 表达式或期望结果无法计算
+    """
+    sides = normalize_expression(expression).split("=")
+    if len(sides) > 2:
+        raise ExpressionError("表达式中只能有一个等号")
+
+    value = evaluate(sides[0])
+    try:
+        decimal = float(value)
+    except OverflowError:
+        decimal = None
+
+    result = {
+        "success": True,
+        "expression": expression,
+        "value": format_value(value),
+        "decimal": decimal,
+        "is_correct": None
+    }
+
+    if len(sides) == 2:
+        result["is_correct"] = value == evaluate(sides[1])
+    if expected_result is not None and str(expected_result).strip():
+        expected_ok = value == evaluate(str(expected_result))
+        result["is_correct"] = expected_ok if result["is_correct"] is None else result["is_correct"] and expected_ok
+    return result
@@ -0,0 +1,236 @@
+# ===============================
+# mcp_server/registry.py - MCP工具注册表
+# ===============================
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+ToolHandler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+Validator = Callable[[Any], Dict[str, Any]]
+
+
+class ToolInputError(ValueError):
+    """工具参数不符合输入模式，服务器以JSON-RPC -32602 应答"""
+
+
+# JSON Schema 基本类型对应的Python类型（bool 是 int 的子类，单独排除）
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
+
+
+def _compile_property(name: str, prop: Dict[str, Any]) -> Callable[[Any], None]:
+    """把单个参数的模式编译为检查函数，只保留该参数实际用到的约束"""
+    checks: List[Callable[[Any], Optional[str]]] = []
+
+    expected_type = prop.get("type")
+    if expected_type in _TYPE_CHECKS:
+        type_ok = _TYPE_CHECKS[expected_type]
+        checks.append(lambda v: None if type_ok(v) else f"应为{expected_type}类型")
+
+    if "enum" in prop:
+        allowed = frozenset(prop["enum"])
+        checks.append(lambda v: None if v in allowed else f"取值应为 {sorted(allowed)} 之一")
+
+    if "minimum" in prop:
+        minimum = prop["minimum"]
+        checks.append(lambda v: None if v >= minimum else f"不能小于 {minimum}")
+    if "maximum" in prop:
+        maximum = prop["maximum"]
+        checks.append(lambda v: None if v <= maximum else f"不能大于 {maximum}")
+
+    if "maxLength" in prop:
+        max_length = prop["maxLength"]
+        checks.append(lambda v: None if len(v) <= max_length else f"长度不能超过 {max_length}")
+
+    def check(value: Any):
+        # 类型检查排在最前，类型不符时不会执行后续约束
+        for rule in checks:
+            error = rule(value)
+            if error:
+                raise ToolInputError(f"参数 {name} {error}")
+
+    return check
+
+
+def compile_validator(schema: Dict[str, Any]) -> Validator:
+    """
+    把工具的输入模式（JSON Schema子集）编译为校验函数
+
+    支持 required、properties 的 type/enum/minimum/maximum/maxLength 和 default。
+    校验函数返回补全默认值后的参数，不符合时抛出 ToolInputError；未声明的参数原样保留。
+    """
+    properties = schema.get("properties", {})
+    required = tuple(schema.get("required", ()))
+    property_checks = [(name, _compile_property(name, prop)) for name, prop in properties.items()]
+    defaults = {name: prop["default"] for name, prop in properties.items() if "default" in prop}
+
+    def validate(arguments: Any) -> Dict[str, Any]:
+        if not isinstance(arguments, dict):
+            raise ToolInputError("参数必须是对象")
+
+        missing = [name for name in required if arguments.get(name) is None]
+        if missing:
+            raise ToolInputError(f"缺少必填参数: {', '.join(missing)}")
+
+        for name, check in property_checks:
+            if name in arguments:
+                check(arguments[name])
+        return {**defaults, **arguments} if defaults else arguments
+
+    return validate
+
+
+class ToolSpec:
+    """
+    一个已注册的工具：处理函数、输入模式与运行限制
+
+    Args:
+        max_concurrency: 全部连接上同时执行的上限，超出的调用排队等待，None 不限制
+        timeout: 单次执行的超时(秒)，None 不限制（仍受请求截止时间约束）
+        cache_ttl: 结果可被客户端缓存的时间(秒)，None 表示不可缓存；通过 tools/list 告知客户端
+    """
+
+    def __init__(self, name: str, description: str, input_schema: Dict[str, Any], handler: ToolHandler,
+                 max_concurrency: Optional[int] = None, timeout: Optional[float] = None,
+                 cache_ttl: Optional[float] = None):
+        self.name = name
+        self.description = description
+        self.input_schema = input_schema
+        self.handler = handler
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+
+        # 注册时编译一次，调用时直接使用
+        self.validate = compile_validator(input_schema)
+        self._slots = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        # 调用统计
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.invalid_calls = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def definition(self) -> Dict[str, Any]:
+        """tools/list 中的工具定义"""
+        definition = {
+            "name": self.name,
+            "description": self.description,
+            "inputSchema": self.input_schema
+        }
+        if self.cache_ttl is not None:
+            definition["annotations"] = {"readOnlyHint": True, "idempotentHint": True, "cacheTtl": self.cache_ttl}
+        return definition
+
+    async def call(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """校验参数后在并发上限和超时内执行，记录耗时与错误"""
+        try:
+            arguments = self.validate(arguments)
+        except ToolInputError:
+            self.invalid_calls += 1
+            raise
+
+        if self._slots is not None:
+            self.waiting += 1
+            try:
+                await self._slots.acquire()
+            finally:
+                self.waiting -= 1
+
+        self.calls += 1
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(self.handler(arguments), timeout=self.timeout)
+            if isinstance(result, dict) and result.get("isError"):
+                self.errors += 1
+            return result
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self.errors += 1
+            logger.warning(f"工具执行超时: {self.name} ({self.timeout}秒)")
+            return tool_error(f"工具执行超时: {self.name}")
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            self.total_time += elapsed
+            self.max_time = max(self.max_time, elapsed)
+            self.in_flight -= 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "invalid_calls": self.invalid_calls,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "avg_ms": self.total_time / self.calls * 1000 if self.calls else 0.0,
+            "max_ms": self.max_time * 1000,
+            "max_concurrency": self.max_concurrency,
+            "timeout": self.timeout
+        }
+
+
+def tool_error(message: str) -> Dict[str, Any]:
+    """工具报告错误的结果（isError），与正常结果一样以文本内容返回"""
+    return {
+        "content": [{"type": "text", "text": json.dumps({"error": message})}],
+        "isError": True
+    }
+
+
+class ToolRegistry:
+    """按名称索引的工具表，tools/list 与 tools/call 都由它驱动"""
+
+    def __init__(self):
+        self._tools: Dict[str, ToolSpec] = {}
+
+    def register(self, spec: ToolSpec) -> ToolSpec:
+        if spec.name in self._tools:
+            logger.warning(f"工具重复注册，覆盖原定义: {spec.name}")
+        self._tools[spec.name] = spec
+        return spec
+
+    def unregister(self, name: str):
+        self._tools.pop(name, None)
+
+    def get(self, name: str) -> Optional[ToolSpec]:
+        return self._tools.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._tools)
+
+    def definitions(self) -> List[Dict[str, Any]]:
+        """全部工具定义（按注册顺序）"""
+        return [spec.definition() for spec in self._tools.values()]
+
+    async def call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """调用工具，未注册的工具返回 isError 结果"""
+        spec = self._tools.get(name)
+        if spec is None:
+            return tool_error(f"未知工具: {name}")
+        return await spec.call(arguments)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各工具的调用次数、错误、超时与耗时"""
+        return {name: spec.get_stats() for name, spec in self._tools.items()}
@@ -2,21 +2,73 @@
 # mcp_server/server.py
 # ===============================
 import asyncio
+import contextlib
 import aiohttp
 import websockets
 import json
 import logging
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List
 import traceback
 from pathlib import Path
 import random
+import base64
+import hashlib
+import os
+import time
+
+from utils.mcp_protocol import (
+    BLOB_URL_PREFIX, ERROR_BLOB_NOT_FOUND, ERROR_DEADLINE_EXCEEDED, ERROR_SERVER_BUSY, FRAME_BLOB_CHUNK,
+    META_TIMEOUT_MS, NOTIFICATION_CANCELLED, NOTIFICATION_TOOLS_CHANGED, MessageCodec, available_codecs,
+    available_compressions, decode_blob_chunk, negotiate_codec
+)
+from config.settings import settings
+from mcp_client.models import NVIDIAModelClient
+from utils.exceptions import APIConnectionError
+from .admission import AdmissionController, ServerBusyError
+from .blob_store import BlobStore, BlobNotFoundError
+from .cpu_pool import CPUWorkerPool
+from .expression import ExpressionError, validate_expression
+from .registry import ToolInputError, ToolRegistry, ToolSpec, tool_error
+from .tools import math_grading_tools
+
+
+class _ClientConnection:
+    """一个客户端连接上未完成的请求（进程内传输的连接没有websocket）"""
+
+    def __init__(self, websocket, max_in_flight: int):
+        self.websocket = websocket
+        self.slots = asyncio.Semaphore(max_in_flight)     # 同时执行的请求数上限
+        self.queued = 0                                   # 已接受、等待执行的请求数
+        self.running: Dict[Any, asyncio.Task] = {}        # 按请求id索引，用于取消
+        self.tasks: set = set()                           # 全部请求任务（含批量应答任务）
+        self.in_flight = 0
+
+    def track(self, task: asyncio.Task, request_id: Any = None):
+        """登记请求任务，完成后自动移除"""
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        if request_id is not None:
+            self.running[request_id] = task
+            task.add_done_callback(
+                lambda t: self.running.pop(request_id, None) if self.running.get(request_id) is t else None
+            )
+
+    def close(self):
+        """连接断开：取消所有未完成的请求"""
+        for task in list(self.tasks):
+            task.cancel()
 
 class MathGradingMCPServer:
     """基于WebSocket的MCP服务器"""
 
-    def __init__(self, host: str = "localhost", port: int = 8765):
+    def __init__(self, host: str = "localhost", port: int = 8765, max_in_flight: Optional[int] = None,
+                 cpu_workers: Optional[int] = None, max_clients: Optional[int] = None):
         self.host = host
         self.port = port
+        # 每个连接同时执行的请求数上限，超出的请求等待空位（ping等自定义消息不受限制）
+        self.max_in_flight = max_in_flight or settings.get("server.admission.max_in_flight_per_client", 16)
+        # 同时连接的客户端数上限
+        self.max_clients = max_clients or settings.get("server.max_clients", 256)
         self.logger = logging.getLogger(__name__)
 
         # 设置日志
@@ -28,9 +80,43 @@ class MathGradingMCPServer:
         # 存储连接的客户端
         self.clients = set()
 
+        # 全部连接共享的执行上限与有界等待队列，队列满时立即拒绝并告知建议的重试时间
+        self.admission = AdmissionController()
+
         # API密钥（如果需要的话）
         self.api_key = self._load_api_key()
 
+        # nvidia_chat/nvidia_vision 工具转发到 models.api_base，各请求复用同一个HTTP连接池
+        self.model_client = NVIDIAModelClient(api_key=self.api_key)
+
+        # 客户端以二进制帧上传的图像等数据块，按内容哈希存储
+        self.blob_store = BlobStore()
+
+        # 图像处理等CPU密集型工具在子进程中执行，默认进程数取 server.cpu_workers
+        self.cpu_pool = CPUWorkerPool(cpu_workers)
+
+        # 每个连接协商后的消息编码，未协商的连接使用json文本帧
+        self._codecs: Dict[Any, MessageCodec] = {}
+        self._default_codec = MessageCodec()
+        # 每个连接的发送锁：多个请求任务并发应答时逐条写入
+        self._send_locks: Dict[Any, asyncio.Lock] = {}
+
+        # 已实现的工具：输入模式取自 tools.py 的工具定义，tools/list 与 tools/call 都由注册表驱动
+        self.registry = ToolRegistry()
+        self._register_builtin_tools()
+
+        # 工具定义的版本号（定义内容的哈希），客户端据此使缓存失效
+        self._tools_version: Optional[str] = None
+
+        # 请求取消与截止时间统计
+        self.cancelled_requests = 0
+        self.expired_requests = 0
+        self.rejected_connections = 0
+        self.requests = 0           # 已执行的JSON-RPC请求数
+        self.in_flight = 0          # 全部连接上正在执行的请求数
+        self.peak_in_flight = 0     # 单个连接同时执行请求数的峰值
+        self.started_at = time.time()
+
     def _load_api_key(self) -> Optional[str]:
         """加载API密钥"""
         try:
@@ -46,10 +132,19 @@ class MathGradingMCPServer:
     async def handle_client(self, websocket):
         """处理客户端连接"""
         client_id = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}" if websocket.remote_address else "unknown"
+        if len(self.clients) >= self.max_clients:
+            # 连接数已满：1013 (Try Again Later) 告知客户端稍后重连
+            self.rejected_connections += 1
+            self.logger.warning(f"连接数已达上限({self.max_clients})，拒绝客户端: {client_id}")
+            await websocket.close(1013, "服务器连接数已满")
+            return
+
         self.logger.info(f"客户端连接: {client_id}")
 
         # 添加到客户端集合
         self.clients.add(websocket)
+        self._send_locks[websocket] = asyncio.Lock()
+        connection = _ClientConnection(websocket, self.max_in_flight)
 
         try:
             # 发送欢迎消息
@@ -58,17 +153,34 @@ class MathGradingMCPServer:
                 "message": "连接到改进版MCP数学批改服务器",
                 "server_info": {
                     "version": "2.0",
-                    "capabilities": ["enhanced_analysis", "grade_specific", "detailed_feedback"]
+                    "capabilities": ["enhanced_analysis", "grade_specific", "detailed_feedback"],
+                    "tools_version": self.tools_version(),
+                    "encodings": {
+                        "codecs": available_codecs(),
+                        "compression": available_compressions()
+                    }
                 }
             }
-            await websocket.send(json.dumps(welcome_message))
+            await self.send_message(websocket, welcome_message)
 
             # 处理消息循环
             async for message in websocket:
                 try:
-                    await self.handle_message(websocket, message)
-                except json.JSONDecodeError as e:
-                    await self.send_error(websocket, f"JSON解析错误: {e}")
+                    if isinstance(message, bytes) and message[:1] == bytes([FRAME_BLOB_CHUNK]):
+                        await self.handle_binary_frame(websocket, message)
+                        continue
+
+                    codec = self._codecs.get(websocket, self._default_codec)
+                    data = codec.decode(message)
+                    if isinstance(data, dict) and data.get("method") == NOTIFICATION_CANCELLED:
+                        self.handle_cancel(connection, data.get("params") or {})
+                    elif isinstance(data, dict) and "jsonrpc" not in data:
+                        # ping、编码协商等自定义消息处理很快，直接在读取循环中应答
+                        await self.handle_custom_message(websocket, data)
+                    else:
+                        self._dispatch_request(connection, data)
+                except ValueError as e:
+                    await self.send_error(websocket, f"消息解析错误: {e}")
                 except Exception as e:
                     self.logger.error(f"处理消息错误: {e}", exc_info=True)
                     await self.send_error(websocket, f"处理消息时出错: {e}")
@@ -82,15 +194,205 @@ class MathGradingMCPServer:
         finally:
             # 从客户端集合中移除
             self.clients.discard(websocket)
+            connection.close()
+            self._codecs.pop(websocket, None)
+            self._send_locks.pop(websocket, None)
             self.logger.info(f"客户端已断开: {client_id}")
 
-    async def handle_message(self, websocket, message: str):
-        """处理客户端消息"""
+    async def handle_binary_frame(self, websocket, frame: bytes):
+        """处理二进制帧：目前只有数据块上传，块不单独应答，提交时统一校验"""
+        try:
+            digest, index, chunk = decode_blob_chunk(frame)
+            self.blob_store.add_chunk(digest, index, chunk)
+        except ValueError as e:
+            await self.send_error(websocket, f"二进制帧错误: {e}")
+
+    async def send_message(self, websocket, message: Dict[str, Any]):
+        """按连接协商的编码发送消息；编码在发送锁之外进行，同一连接的消息逐条写入"""
+        frame = self._codecs.get(websocket, self._default_codec).encode(message)
+        async with self._send_locks.get(websocket) or contextlib.nullcontext():
+            await websocket.send(frame)
+
+    @staticmethod
+    def _request_deadline(data: Any) -> Optional[float]:
+        """按 params._meta.timeoutMs 计算截止时间（从收到请求时起算）"""
+        params = data.get("params") if isinstance(data, dict) else None
+        meta = params.get("_meta") if isinstance(params, dict) else None
+        if isinstance(meta, dict) and meta.get(META_TIMEOUT_MS):
+            return asyncio.get_running_loop().time() + float(meta[META_TIMEOUT_MS]) / 1000
+        return None
+
+    def _dispatch_request(self, connection: _ClientConnection, data: Any):
+        """
+        为请求创建任务，读取循环不等待其完成
+
+        各请求并发执行，应答按完成顺序发送，客户端按id匹配。
+        JSON-RPC批量请求（数组）中的各请求各自成为任务，全部完成后以数组一次应答。
+        等待队列已满时请求立即以 ERROR_SERVER_BUSY 应答，批量请求中的各请求分别判断。
+        """
+        is_batch = isinstance(data, list)
+        entries = data if is_batch else [data]
+        if is_batch and not entries:
+            connection.track(asyncio.create_task(self.handle_message(connection.websocket, [])))
+            return
+
+        tasks = []
+        for entry in entries:
+            request_id = entry.get("id") if isinstance(entry, dict) else None
+            try:
+                self._admit(connection)
+                work = self._run_request(connection, entry, self._request_deadline(entry), batch=is_batch)
+            except ServerBusyError as e:
+                work = self._reject_busy(connection.websocket, request_id, e, batch=is_batch)
+            task = asyncio.create_task(work)
+            connection.track(task, request_id)
+            tasks.append(task)
+
+        if is_batch:
+            connection.track(asyncio.create_task(self._send_batch(connection, tasks)))
+
+    def _admit(self, connection: _ClientConnection):
+        """请求进入等待队列，队列已满时抛出 ServerBusyError"""
+        self.admission.admit(connection.queued)
+        connection.queued += 1
+
+    def _leave_queue(self, connection: _ClientConnection):
+        connection.queued -= 1
+        self.admission.dequeue()
+
+    def handle_cancel(self, connection: _ClientConnection, params: Dict[str, Any]):
+        """处理客户端的取消通知：取消请求任务，等待执行的请求不再执行"""
+        request_id = params.get("requestId")
+        task = connection.running.get(request_id)
+        if task is None or task.done():
+            return
+
+        task.cancel()
+        self.cancelled_requests += 1
+        self.logger.info(f"客户端取消请求: {request_id} ({params.get('reason', '未说明原因')})")
+
+    async def _send_batch(self, connection: _ClientConnection, tasks: List[asyncio.Task]):
+        """等待批量请求中的各请求完成后以数组一次应答"""
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        # 通知和被取消的请求没有应答；全部都没有应答时不发送
+        responses = [result for result in results if isinstance(result, dict)]
+        if responses:
+            with contextlib.suppress(Exception):
+                await self.send_message(connection.websocket, responses)
+
+    async def _run_request(self, connection: _ClientConnection, data: Any, deadline: Optional[float],
+                           batch: bool) -> Optional[Dict[str, Any]]:
+        """
+        在连接和全局的并发上限内执行一个已被接受的请求，等待期间已过期的请求不再执行，
+        执行超过截止时间的请求会被取消
+
+        单个请求由处理函数直接应答，返回None；批量请求中的请求返回应答，由调用方合并发送。
+        """
+        loop = asyncio.get_running_loop()
+        websocket = connection.websocket
+        request_id = data.get("id") if isinstance(data, dict) else None
+
+        queued = True
         try:
-            data = json.loads(message)
+            # 先占用连接的空位再排全局队列，一个连接的请求不会占满全局执行上限
+            async with connection.slots, self.admission.slots:
+                self._leave_queue(connection)
+                queued = False
+                if deadline is not None and loop.time() >= deadline:
+                    return await self._reject_expired(websocket, request_id, "请求在等待执行时已过截止时间", batch)
+
+                connection.in_flight += 1
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, connection.in_flight)
+                start = loop.time()
+                try:
+                    if batch:
+                        work = self.execute_jsonrpc_request(data)
+                    else:
+                        work = self.handle_message(websocket, data)
+                    timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                    response = await asyncio.wait_for(work, timeout=timeout)
+                except asyncio.TimeoutError:
+                    return await self._reject_expired(websocket, request_id, "请求处理超过截止时间", batch)
+                finally:
+                    connection.in_flight -= 1
+                    self.in_flight -= 1
+                    self.admission.record(loop.time() - start)
+        finally:
+            if queued:
+                # 在等待时被取消（客户端取消或断开）
+                self._leave_queue(connection)
+
+        # 通知（没有id的请求对象）不应答；无效的请求对象按JSON-RPC规范以 id=null 应答
+        if not batch or (isinstance(data, dict) and "id" not in data):
+            return None
+        return response
+
+    async def _reject_expired(self, websocket, request_id: Any, message: str,
+                              batch: bool = False) -> Optional[Dict[str, Any]]:
+        """放弃已过截止时间的请求，客户端多半已超时，应答仅用于诊断"""
+        self.expired_requests += 1
+        self.logger.warning(f"{message}: {request_id}")
+        if request_id is None:
+            return None
 
+        response = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {"code": ERROR_DEADLINE_EXCEEDED, "message": message}
+        }
+        if batch:
+            return response
+        with contextlib.suppress(Exception):
+            await self.send_message(websocket, response)
+        return None
+
+    async def _reject_busy(self, websocket, request_id: Any, error: ServerBusyError,
+                           batch: bool = False) -> Optional[Dict[str, Any]]:
+        """拒绝未被接受的请求，应答中带建议的重试等待时间；通知直接丢弃"""
+        self.logger.warning(f"{error}: {request_id}")
+        if request_id is None:
+            return None
+
+        response = {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {
+                "code": ERROR_SERVER_BUSY,
+                "message": str(error),
+                "data": {"retry_after_ms": error.retry_after_ms}
+            }
+        }
+        if batch:
+            return response
+        with contextlib.suppress(Exception):
+            await self.send_message(websocket, response)
+        return None
+
+    def local_connection(self) -> _ClientConnection:
+        """为进程内传输创建连接，其请求与websocket连接一样受准入控制"""
+        return _ClientConnection(None, self.max_in_flight)
+
+    async def execute_local_request(self, connection: _ClientConnection, data: Dict[str, Any]) -> Dict[str, Any]:
+        """经准入控制执行进程内传输的JSON-RPC请求，返回应答"""
+        try:
+            self._admit(connection)
+        except ServerBusyError as e:
+            return await self._reject_busy(None, data.get("id"), e, batch=True)
+        return await self._run_request(connection, data, None, batch=True)
+
+    async def handle_message(self, websocket, data: Any):
+        """处理一条已解码的客户端消息"""
+        try:
+            if isinstance(data, list):
+                # 空的批量请求（非空的由 _dispatch_request 拆分处理）
+                await self.send_message(websocket, {
+                    "jsonrpc": "2.0",
+                    "id": None,
+                    "error": {"code": -32600, "message": "无效请求: 空的批量请求"}
+                })
             # 检查是否是JSON-RPC请求
-            if "jsonrpc" in data and data.get("jsonrpc") == "2.0":
+            elif "jsonrpc" in data and data.get("jsonrpc") == "2.0":
                 await self.handle_jsonrpc_request(websocket, data)
             else:
                 # 处理自定义协议
@@ -102,6 +404,18 @@ class MathGradingMCPServer:
 
     async def handle_jsonrpc_request(self, websocket, data: Dict[str, Any]):
         """处理JSON-RPC 2.0请求"""
+        await self.send_message(websocket, await self.execute_jsonrpc_request(data))
+
+    async def execute_jsonrpc_request(self, data: Any) -> Dict[str, Any]:
+        """执行JSON-RPC 2.0请求并返回应答"""
+        self.requests += 1
+        if not isinstance(data, dict) or data.get("jsonrpc") != "2.0":
+            return {
+                "jsonrpc": "2.0",
+                "id": data.get("id") if isinstance(data, dict) else None,
+                "error": {"code": -32600, "message": "无效请求: 不是JSON-RPC 2.0请求对象"}
+            }
+
         try:
             method = data.get("method")
             params = data.get("params", {})
@@ -116,6 +430,16 @@ class MathGradingMCPServer:
                 result = await self.handle_list_tools()
             elif method == "tools/call":
                 result = await self.handle_call_tool(params)
+            elif method == "blobs/check":
+                result = self.blob_store.check(params.get("hashes", []))
+            elif method == "blobs/commit":
+                try:
+                    result = self.blob_store.commit(params["hash"], int(params["size"]), int(params["chunks"]))
+                except (KeyError, ValueError) as e:
+                    error = {
+                        "code": -32602,
+                        "message": f"数据块提交失败: {e}"
+                    }
             else:
                 error = {
                     "code": -32601,
@@ -133,8 +457,24 @@ class MathGradingMCPServer:
             else:
                 response["result"] = result
 
-            await websocket.send(json.dumps(response))
+            return response
 
+        except ToolInputError as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": data.get("id"),
+                "error": {"code": -32602, "message": f"工具参数无效: {e}"}
+            }
+        except BlobNotFoundError as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": data.get("id"),
+                "error": {
+                    "code": ERROR_BLOB_NOT_FOUND,
+                    "message": f"数据块不存在: {e.digest}",
+                    "data": {"hash": e.digest}
+                }
+            }
         except Exception as e:
             error_response = {
                 "jsonrpc": "2.0",
@@ -144,28 +484,61 @@ class MathGradingMCPServer:
                     "message": f"内部错误: {e}"
                 }
             }
-            await websocket.send(json.dumps(error_response))
+            return error_response
 
     async def handle_list_tools(self) -> Dict[str, Any]:
         """返回可用工具列表"""
-        tools = [
-            {
-                "name": "analyze_homework",
-                "description": "使用改进算法分析作业图像并智能批改",
-                "inputSchema": {
-                    "type": "object",
-                    "properties": {
-                        "image_data": {"type": "string", "description": "Base64编码的图像数据"},
-                        "grade_level": {"type": "string", "description": "年级水平"},
-                        "student_name": {"type": "string", "description": "学生姓名"},
-                        "analysis_type": {"type": "string", "description": "分析类型"}
-                    },
-                    "required": ["image_data", "grade_level"]
-                }
-            }
+        return {"tools": self._tool_definitions(), "version": self.tools_version()}
+
+    def tools_version(self) -> str:
+        """工具定义的版本号"""
+        if self._tools_version is None:
+            definitions = json.dumps(self._tool_definitions(), sort_keys=True, ensure_ascii=False)
+            self._tools_version = hashlib.sha256(definitions.encode("utf-8")).hexdigest()[:12]
+        return self._tools_version
+
+    async def notify_tools_changed(self):
+        """工具定义变化后通知所有已连接的客户端"""
+        self._tools_version = None
+        notification = {
+            "jsonrpc": "2.0",
+            "method": NOTIFICATION_TOOLS_CHANGED,
+            "params": {"version": self.tools_version()}
+        }
+        for websocket in list(self.clients):
+            with contextlib.suppress(Exception):
+                await self.send_message(websocket, notification)
+
+    def _tool_definitions(self) -> List[Dict[str, Any]]:
+        """工具定义（名称、说明与参数模式）"""
+        return self.registry.definitions()
+
+    def _register_builtin_tools(self):
+        """注册服务器实现的工具及其运行限制"""
+        model_limits = {
+            "timeout": settings.get("models.request_timeout", 300),
+            "max_concurrency": settings.get("models.max_connections", 100)
+        }
+        builtin = [
+            ("analyze_homework", self.tool_enhanced_analyze_homework, {"timeout": 120}),
+            # 图像处理在CPU工具进程池中执行，限制同时提交的数量，避免进程池队列无限增长
+            ("extract_text_from_image", self.tool_extract_text_from_image,
+             {"timeout": 60, "max_concurrency": max(1, self.cpu_pool.max_workers) * 2}),
+            ("validate_math_expression", self.tool_validate_math_expression, {"timeout": 5, "cache_ttl": 3600}),
+            # 模型调用：并发上限与到模型API的连接数一致，多出的调用在服务器排队，不堆积在HTTP连接池中
+            ("nvidia_chat", self.tool_chat_completion, model_limits),
+            ("nvidia_vision", self.tool_chat_completion, model_limits),
+            ("generate_detailed_feedback", self.tool_generate_detailed_feedback, model_limits),
+            ("generate_similar_problems", self.tool_generate_similar_problems, model_limits),
         ]
+        for name, handler, limits in builtin:
+            tool = math_grading_tools.get_tool_by_name(name)
+            self.registry.register(ToolSpec(tool.name, tool.description, tool.parameters, handler, **limits))
 
-        return {"tools": tools}
+    async def register_tool(self, spec: ToolSpec):
+        """运行中注册（或替换）工具，并通知已连接的客户端工具列表已变化"""
+        self.registry.register(spec)
+        await self.notify_tools_changed()
 
     async def handle_call_tool(self, params: Dict[str, Any]) -> Dict[str, Any]:
         """调用工具"""
@@ -174,24 +547,46 @@ class MathGradingMCPServer:
 
         self.logger.info(f"🎯 调用改进版工具: {tool_name}")
 
-        if tool_name == "analyze_homework":
-            return await self.tool_enhanced_analyze_homework(arguments)
-        else:
-            return {
-                "content": [
-                    {
-                        "type": "text",
-                        "text": json.dumps({"error": f"未知工具: {tool_name}"})
-                    }
-                ]
-            }
+        # 把参数中对已上传数据块的引用替换为实际数据
+        arguments = self._resolve_blob_refs(arguments)
+
+        return await self.registry.call(tool_name, arguments)
+
+    def _resolve_blob_refs(self, value: Any) -> Any:
+        """
+        解析参数中的数据块引用
+
+        - image_ref: 内容哈希，解析为 image_bytes（原始字节）
+        - 任意位置的 "blob:<哈希>" 字符串（如图像消息的url），按数据块的MIME类型解析为base64 data URL，供上游模型API使用
+
+        Raises:
+            BlobNotFoundError: 引用的数据块不存在（已被淘汰或未上传）
+        """
+        if isinstance(value, dict):
+            resolved = {k: self._resolve_blob_refs(v) for k, v in value.items() if k != "image_ref"}
+            if value.get("image_ref"):
+                resolved["image_bytes"] = self._get_blob(value["image_ref"])
+            return resolved
+        if isinstance(value, list):
+            return [self._resolve_blob_refs(v) for v in value]
+        if isinstance(value, str) and value.startswith(BLOB_URL_PREFIX):
+            digest = value[len(BLOB_URL_PREFIX):]
+            data = self._get_blob(digest)
+            return f"data:{self.blob_store.mime_type(digest)};base64,{base64.b64encode(data).decode('utf-8')}"
+        return value
+
+    def _get_blob(self, digest: str) -> bytes:
+        data = self.blob_store.get(digest)
+        if data is None:
+            raise BlobNotFoundError(digest)
+        return data
 
     async def tool_enhanced_analyze_homework(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
         """✨ 改进版作业分析工具 - 提供真实的数学分析"""
         try:
             grade_level = arguments.get("grade_level", "高一")
             student_name = arguments.get("student_name", "学生")
-            image_data = arguments.get("image_data", "")
+            image_data = arguments.get("image_bytes") or arguments.get("image_data", "")
 
             self.logger.info(f"🔍 正在进行{grade_level}数学智能分析...")
 
@@ -220,6 +615,170 @@ class MathGradingMCPServer:
                 ]
             }
 
+    async def tool_extract_text_from_image(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """提取图像中的文本区域：OpenCV轮廓分析在CPU工具进程池中执行，不阻塞其他连接"""
+        image_bytes = arguments.get("image_bytes")
+        if image_bytes is None and arguments.get("image_data"):
+            image_data = arguments["image_data"]
+            image_bytes = base64.b64decode(image_data.split(",", 1)[-1] if image_data.startswith("data:") else image_data)
+
+        if not image_bytes:
+            result = {"success": False, "error": "缺少图像数据（image_data 或 image_ref）", "regions": []}
+        else:
+            try:
+                from utils.image_processor import ImageProcessor
+                result = await self.cpu_pool.run(ImageProcessor.extract_text_regions, image_bytes)
+            except ImportError as e:
+                result = {"success": False, "error": f"图像处理依赖未安装: {e}", "regions": []}
+
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": json.dumps(result)
+                }
+            ],
+            "isError": not result.get("success")
+        }
+
+    async def tool_validate_math_expression(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """验证算术表达式或等式的计算结果（精确分数运算，不执行任意代码）"""
+        try:
+            result = validate_expression(arguments["expression"], arguments.get("expected_result"))
+        except ExpressionError as e:
+            return tool_error(str(e))
+
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": json.dumps(result)
+                }
+            ]
+        }
+
+    async def tool_chat_completion(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        转发到模型API的 /chat/completions，返回模型输出文本
+
+        图像的 blob:<哈希> 引用已在 handle_call_tool 中替换为data URL；上游返回的token用量放在 _meta.usage。
+        """
+        payload = {
+            key: arguments[key] for key in ("model", "messages", "max_tokens", "temperature", "top_p")
+            if key in arguments
+        }
+        payload["stream"] = False
+
+        try:
+            response = await self.model_client.chat_completions(payload)
+        except APIConnectionError as e:
+            return tool_error(str(e))
+
+        choices = response.get("choices") or [{}]
+        content = (choices[0].get("message") or {}).get("content") or ""
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": content
+                }
+            ],
+            "_meta": {
+                "model": response.get("model"),
+                "usage": response.get("usage")
+            }
+        }
+
+    async def _complete_json(self, prompt: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        """
+        用文本模型完成提示词并解析为JSON对象
+
+        返回 {"result": 解析结果} 或 {"error": 工具错误结果}；模型输出不是JSON时 result 为 None，text 为原文。
+        """
+        reply = await self.tool_chat_completion({
+            "model": settings.get("models.nvidia.model"),
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        })
+        if reply.get("isError"):
+            return {"error": reply}
+
+        text = reply["content"][0]["text"].strip()
+        # 模型常把JSON包在代码块或说明文字中，取最外层的花括号
+        start, end = text.find("{"), text.rfind("}")
+        try:
+            result = json.loads(text[start:end + 1]) if start != -1 and end > start else None
+        except ValueError:
+            result = None
+        return {"result": result if isinstance(result, dict) else None, "text": text, "_meta": reply.get("_meta")}
+
+    async def tool_generate_detailed_feedback(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """由文本模型为错误答案生成教学反馈"""
+        tone = {
+            "brief": "简明扼要，只指出错误和正确思路",
+            "detailed": "详细说明错误原因、正确的解题步骤和学习建议",
+            "encouraging": "语气温和、多加鼓励，帮助学生理解错误并改进"
+        }[arguments["feedback_type"]]
+
+        prompt = f"""请为学生的数学答案提供教学反馈，要求{tone}。
+
+题目：{arguments['question_text']}
+学生答案：{arguments['student_answer']}
+正确答案：{arguments['correct_answer']}
+
+返回JSON：
+{{
+    "feedback": "反馈内容",
+    "suggestions": ["学习建议"],
+    "difficulty_level": "题目难度"
+}}"""
+
+        completion = await self._complete_json(prompt, max_tokens=1000, temperature=0.3)
+        if "error" in completion:
+            return completion["error"]
+
+        # 模型没有按JSON返回时，把原文作为反馈内容
+        feedback = completion["result"] or {"feedback": completion["text"]}
+        feedback.setdefault("suggestions", [])
+        feedback.setdefault("difficulty_level", "中等")
+        return {
+            "content": [{"type": "text", "text": json.dumps(feedback, ensure_ascii=False)}],
+            "_meta": completion["_meta"]
+        }
+
+    async def tool_generate_similar_problems(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """由文本模型生成与原题考查相同知识点的练习题"""
+        difficulty = {"easier": "比原题简单", "same": "与原题难度相同", "harder": "比原题稍难"}[arguments["difficulty_level"]]
+        count = arguments["count"]
+
+        prompt = f"""请根据下面的数学题，生成{count}道考查相同知识点、{difficulty}的练习题。
+
+原题：{arguments['original_question']}
+
+返回JSON：
+{{
+    "problems": [
+        {{
+            "question": "题目",
+            "answer": "答案",
+            "hint": "提示"
+        }}
+    ]
+}}"""
+
+        completion = await self._complete_json(prompt, max_tokens=300 * count + 200, temperature=0.7)
+        if "error" in completion:
+            return completion["error"]
+
+        problems = (completion["result"] or {}).get("problems")
+        if not isinstance(problems, list):
+            return tool_error("模型返回的练习题无法解析")
+        return {
+            "content": [{"type": "text", "text": json.dumps({"problems": problems[:count]}, ensure_ascii=False)}],
+            "_meta": completion["_meta"]
+        }
+
     async def _smart_analyze_by_grade(self, grade_level: str, student_name: str) -> Dict[str, Any]:
         """🧠 根据年级智能分析数学题目"""
 
@@ -555,41 +1114,102 @@ class MathGradingMCPServer:
 
         if message_type == "ping":
             await self.handle_ping(websocket, data)
+        elif message_type == "negotiate":
+            await self.handle_negotiate(websocket, data)
         else:
-            await self.send_error(websocket, f"未知消息类型: {message_type}")
+            await self.send_error(websocket, f"未知消息类型: {message_type}", data.get("id"))
 
     async def handle_ping(self, websocket, data: Dict[str, Any]):
         """处理ping消息"""
         response = {
             "type": "pong",
+            "id": data.get("id"),  # 回传请求id，供多路复用客户端匹配响应
             "timestamp": data.get("timestamp"),
             "server_time": asyncio.get_event_loop().time(),
             "server_version": "2.0_enhanced"
         }
-        await websocket.send(json.dumps(response))
-
-    async def send_error(self, websocket, error_message: str):
-        """发送错误消息"""
+        await self.send_message(websocket, response)
+
+    async def handle_negotiate(self, websocket, data: Dict[str, Any]):
+        """
+        协商消息编码与压缩
+
+        客户端按偏好顺序给出 codecs，服务器选择双方都支持的第一个。
+        应答仍按协商前的编码发送，之后双方切换到新编码。
+        """
+        codec = negotiate_codec(data.get("codecs", []), available_codecs())
+        compression = data.get("compression")
+        if compression not in available_compressions():
+            compression = None
+        threshold = data.get("threshold")
+
+        new_codec = MessageCodec(codec, compression, threshold) if threshold else MessageCodec(codec, compression)
+        await self.send_message(websocket, {
+            "type": "negotiated",
+            "id": data.get("id"),
+            **new_codec.describe()
+        })
+        self._codecs[websocket] = new_codec
+        self.logger.info(f"连接消息编码: {codec}, 压缩: {compression or '无'}")
+
+    async def send_error(self, websocket, error_message: str, request_id: Any = None):
+        """发送错误消息，带上请求id时客户端可将其匹配到对应请求"""
         error_response = {
             "type": "error",
             "message": error_message,
             "timestamp": asyncio.get_event_loop().time()
         }
+        if request_id is not None:
+            error_response["id"] = request_id
         try:
-            await websocket.send(json.dumps(error_response))
+            await self.send_message(websocket, error_response)
         except Exception as e:
             self.logger.error(f"发送错误消息失败: {e}")
 
-    async def start_server(self):
-        """启动服务器"""
+    def get_stats(self) -> Dict[str, Any]:
+        """本服务进程的运行统计"""
+        return {
+            "pid": os.getpid(),
+            "uptime": time.time() - self.started_at,
+            "clients": len(self.clients),
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "cancelled_requests": self.cancelled_requests,
+            "expired_requests": self.expired_requests,
+            "rejected_requests": self.admission.rejected,
+            "rejected_connections": self.rejected_connections,
+            "admission": self.admission.get_stats(),
+            "blobs": self.blob_store.get_stats(),
+            "cpu_pool": self.cpu_pool.get_stats(),
+            "tools": self.registry.get_stats()
+        }
+
+    async def close(self):
+        """释放服务器资源（CPU工具进程池、模型API连接）"""
+        self.cpu_pool.shutdown()
+        await self.model_client.close()
+
+    async def start_server(self, sock=None, reuse_port: bool = False):
+        """
+        启动服务器
+
+        Args:
+            sock: 已绑定的监听套接字（多进程模式下由主进程创建并共享），为None时按 host/port 绑定
+            reuse_port: 以 SO_REUSEPORT 绑定，多个服务进程监听同一端口，由内核分配连接
+        """
         try:
             self.logger.info(f"🚀 改进版MCP服务器初始化完成: {self.host}:{self.port}")
 
-            server = await websockets.serve(
-                self.handle_client,
-                self.host,
-                self.port
-            )
+            if sock is not None:
+                server = await websockets.serve(self.handle_client, sock=sock)
+            else:
+                server = await websockets.serve(
+                    self.handle_client,
+                    self.host,
+                    self.port,
+                    reuse_port=reuse_port or None
+                )
 
             self.logger.info(f"✅ 改进版MCP服务器启动成功: ws://{self.host}:{self.port}")
             self.logger.info("🧠 支持智能年级分析和详细数学反馈")
@@ -609,6 +1229,8 @@ class MathGradingMCPServer:
             self.logger.info("收到中断信号，正在关闭服务器...")
         except Exception as e:
             self.logger.error(f"服务器运行错误: {e}", exc_info=True)
+        finally:
+            await self.close()
 
 def find_available_port(start_port: int = 8765, max_attempts: int = 10) -> int:
     """查找可用端口"""
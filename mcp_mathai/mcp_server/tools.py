@@ -21,7 +21,7 @@ class AnalyzeHomeworkRequest(BaseModel):
     image_data: str = Field(description="Base64编码的图像数据")
     grade_level: str = Field(description="年级水平", example="高一")
     subject: str = Field(default="数学", description="学科")
-    analysis_type: str = Field(default="full", description="分析类型: full, quick, detailed")
+    analysis_type: str = Field(default="full", description="分析类型: full, quick, detailed, comprehensive")
 
 class AnalyzeHomeworkResponse(BaseModel):
     """分析作业响应"""
@@ -78,10 +78,18 @@ class MathGradingTools:
                             "type": "string",
                             "description": "Base64编码的作业图像数据"
                         },
+                        "image_ref": {
+                            "type": "string",
+                            "description": "已通过 blobs/commit 上传的图像内容哈希，可代替image_data"
+                        },
                         "grade_level": {
                             "type": "string",
-                            "description": "学生年级水平",
-                            "enum": ["初一", "初二", "初三", "高一", "高二", "高三"]
+                            "description": "学生年级水平，如 初一、初二、初三、高一、高二、高三"
+                        },
+                        "student_name": {
+                            "type": "string",
+                            "description": "学生姓名",
+                            "default": "学生"
                         },
                         "subject": {
                             "type": "string",
@@ -91,11 +99,11 @@ class MathGradingTools:
                         "analysis_type": {
                             "type": "string",
                             "description": "分析详细程度",
-                            "enum": ["quick", "full", "detailed"],
+                            "enum": ["quick", "full", "detailed", "comprehensive"],
                             "default": "full"
                         }
                     },
-                    "required": ["image_data", "grade_level"]
+                    "required": ["grade_level"]
                 }
             ),
 
@@ -138,14 +146,17 @@ class MathGradingTools:
                             "type": "string",
                             "description": "Base64编码的图像数据"
                         },
+                        "image_ref": {
+                            "type": "string",
+                            "description": "已通过 blobs/commit 上传的图像内容哈希，可代替image_data"
+                        },
                         "extraction_type": {
                             "type": "string",
                             "description": "提取类型",
                             "enum": ["math", "text", "mixed"],
                             "default": "math"
                         }
-                    },
-                    "required": ["image_data"]
+                    }
                 }
             ),
 
@@ -198,6 +209,70 @@ class MathGradingTools:
                     },
                     "required": ["original_question"]
                 }
+            ),
+
+            MCPTool(
+                name="nvidia_chat",
+                description="调用文本模型（OpenAI兼容的 /chat/completions，地址为 models.api_base），返回模型输出文本",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "model": {
+                            "type": "string",
+                            "description": "模型名称，如 microsoft/phi-3.5-vision-instruct"
+                        },
+                        "messages": {
+                            "type": "array",
+                            "description": "OpenAI格式的对话消息"
+                        },
+                        "max_tokens": {
+                            "type": "integer",
+                            "description": "最大输出token数",
+                            "minimum": 1,
+                            "default": 1000
+                        },
+                        "temperature": {
+                            "type": "number",
+                            "description": "采样温度",
+                            "minimum": 0,
+                            "maximum": 2,
+                            "default": 0.3
+                        }
+                    },
+                    "required": ["model", "messages"]
+                }
+            ),
+
+            MCPTool(
+                name="nvidia_vision",
+                description="调用视觉模型（OpenAI兼容的 /chat/completions，地址为 models.api_base），返回模型输出文本",
+                parameters={
+                    "type": "object",
+                    "properties": {
+                        "model": {
+                            "type": "string",
+                            "description": "模型名称，如 microsoft/phi-3.5-vision-instruct"
+                        },
+                        "messages": {
+                            "type": "array",
+                            "description": "OpenAI格式的对话消息，图像以 image_url 传入（data URL 或 blob:<哈希>）"
+                        },
+                        "max_tokens": {
+                            "type": "integer",
+                            "description": "最大输出token数",
+                            "minimum": 1,
+                            "default": 1000
+                        },
+                        "temperature": {
+                            "type": "number",
+                            "description": "采样温度",
+                            "minimum": 0,
+                            "maximum": 2,
+                            "default": 0.3
+                        }
+                    },
+                    "required": ["model", "messages"]
+                }
             )
         ]
 
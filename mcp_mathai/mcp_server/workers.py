@@ -0,0 +1,247 @@
+# ===============================
+# mcp_server/workers.py - 多进程MCP服务器
+# ===============================
+import asyncio
+import atexit
+import contextlib
+import logging
+import multiprocessing
+import queue
+import signal
+import socket
+import threading
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def reuse_port_supported() -> bool:
+    """当前平台是否支持 SO_REUSEPORT（Linux/macOS 支持，Windows 不支持）"""
+    if not hasattr(socket, "SO_REUSEPORT"):
+        return False
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        return True
+    except OSError:
+        return False
+
+
+def create_shared_socket(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    """创建由各服务进程共同accept的监听套接字（不支持 SO_REUSEPORT 时使用）"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+def run_worker(index: int, host: str, port: int, sock: Optional[socket.socket],
+               stats_queue, stats_interval: float, max_in_flight: Optional[int], cpu_workers: Optional[int]):
+    """服务进程入口：启动MCP服务器并定期上报统计，收到SIGTERM时关闭CPU工具进程池后退出"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker{index} - %(name)s - %(levelname)s - %(message)s'
+    )
+    from mcp_server.server import MathGradingMCPServer
+
+    async def serve():
+        server = MathGradingMCPServer(host=host, port=port, max_in_flight=max_in_flight, cpu_workers=cpu_workers)
+        stop = asyncio.Event()
+        with contextlib.suppress(NotImplementedError):
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+
+        await server.start_server(sock=sock, reuse_port=sock is None)
+        try:
+            while not stop.is_set():
+                with contextlib.suppress(Exception):
+                    stats_queue.put_nowait((index, server.get_stats()))
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(stop.wait(), timeout=stats_interval)
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+class _WorkerSlot:
+    """一个服务进程槽位"""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[multiprocessing.Process] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.next_start = 0.0           # 崩溃后的下次重启时间
+        self.stats: Optional[Dict[str, Any]] = None
+
+
+class ServerSupervisor:
+    """
+    多进程MCP服务器
+
+    启动 workers 个服务进程监听同一端口：支持 SO_REUSEPORT 的平台上各进程各自绑定，由内核分配连接；
+    否则由主进程创建监听套接字交给各进程共同accept。监控线程重启异常退出的进程
+    （短时间内反复崩溃时退避），并汇总各进程定期上报的统计。
+
+    每个连接固定由一个进程处理，进程间不共享数据块存储；连接到其他进程后缺少数据块时，
+    客户端会按 ERROR_BLOB_NOT_FOUND 自动补传。
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 8765, workers: Optional[int] = None,
+                 max_in_flight: Optional[int] = None, cpu_workers: Optional[int] = None, stats_interval: float = 2.0,
+                 restart_delay: float = 1.0, max_restart_delay: float = 30.0):
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers or multiprocessing.cpu_count())
+        self.max_in_flight = max_in_flight
+        self.cpu_workers = cpu_workers
+        self.stats_interval = stats_interval
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+
+        # spawn 在各平台行为一致，也避免fork复制主进程中已运行的事件循环和线程
+        self._context = multiprocessing.get_context("spawn")
+        self._stats_queue = self._context.Queue()
+        self._slots = [_WorkerSlot(i) for i in range(self.workers)]
+        self._sock: Optional[socket.socket] = None
+        self._stop = threading.Event()
+        self._monitor: Optional[threading.Thread] = None
+        self.reuse_port = reuse_port_supported()
+
+    def start(self):
+        """启动全部服务进程和监控线程"""
+        if not self.reuse_port:
+            self._sock = create_shared_socket(self.host, self.port)
+            logger.info("平台不支持 SO_REUSEPORT，各服务进程共享主进程的监听套接字")
+
+        self._stop.clear()
+        for slot in self._slots:
+            self._start_worker(slot)
+
+        self._monitor = threading.Thread(target=self._monitor_loop, name="mcp-supervisor", daemon=True)
+        self._monitor.start()
+        # 服务进程会创建CPU工具子进程，不能是守护进程，主进程退出时需显式停止
+        atexit.register(self.stop)
+        logger.info(f"✅ 已启动 {self.workers} 个MCP服务进程: ws://{self.host}:{self.port}")
+
+    def _start_worker(self, slot: _WorkerSlot):
+        slot.process = self._context.Process(
+            target=run_worker,
+            args=(slot.index, self.host, self.port, self._sock, self._stats_queue,
+                  self.stats_interval, self.max_in_flight, self.cpu_workers),
+            name=f"mcp-worker-{slot.index}"
+        )
+        slot.process.start()
+        slot.started_at = time.time()
+        slot.stats = None
+
+    def _monitor_loop(self):
+        """收集统计，重启退出的服务进程"""
+        while not self._stop.is_set():
+            self._drain_stats(timeout=0.5)
+            now = time.time()
+            for slot in self._slots:
+                if self._stop.is_set() or slot.process is None or slot.process.is_alive():
+                    continue
+
+                if slot.next_start == 0.0:
+                    # 运行超过一分钟后才崩溃的进程立即重启，否则按崩溃次数指数退避
+                    uptime = now - slot.started_at
+                    attempt = 0 if uptime > 60 else slot.restarts
+                    delay = min(self.restart_delay * (2 ** attempt), self.max_restart_delay)
+                    slot.next_start = now + delay
+                    logger.warning(f"⚠️ MCP服务进程 {slot.index} 退出 (exitcode={slot.process.exitcode})，"
+                                   f"{delay:.1f}秒后重启")
+                elif now >= slot.next_start:
+                    slot.next_start = 0.0
+                    slot.restarts += 1
+                    self._start_worker(slot)
+                    logger.info(f"🔄 MCP服务进程 {slot.index} 已重启 (第{slot.restarts}次)")
+
+    def _drain_stats(self, timeout: float):
+        try:
+            index, stats = self._stats_queue.get(timeout=timeout)
+            self._slots[index].stats = stats
+            while True:
+                index, stats = self._stats_queue.get_nowait()
+                self._slots[index].stats = stats
+        except queue.Empty:
+            pass
+
+    def wait_ready(self, timeout: float = 15.0) -> bool:
+        """等待全部服务进程完成启动（首次上报统计）"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if all(slot.stats is not None for slot in self._slots):
+                return True
+            time.sleep(0.1)
+        return False
+
+    def is_running(self) -> bool:
+        return any(slot.process is not None and slot.process.is_alive() for slot in self._slots)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """汇总各服务进程最近一次上报的统计"""
+        reported = [slot.stats for slot in self._slots if slot.stats is not None]
+        totals = {
+            key: sum(stats[key] for stats in reported)
+            for key in ("clients", "requests", "in_flight", "cancelled_requests", "expired_requests",
+                        "rejected_requests")
+        }
+        return {
+            "workers": self.workers,
+            "alive": sum(1 for slot in self._slots if slot.process is not None and slot.process.is_alive()),
+            "reuse_port": self.reuse_port,
+            "restarts": sum(slot.restarts for slot in self._slots),
+            **totals,
+            "peak_in_flight": max((stats["peak_in_flight"] for stats in reported), default=0),
+            "per_worker": [
+                {
+                    "index": slot.index,
+                    "pid": slot.process.pid if slot.process is not None else None,
+                    "alive": slot.process is not None and slot.process.is_alive(),
+                    "restarts": slot.restarts,
+                    "stats": slot.stats
+                }
+                for slot in self._slots
+            ]
+        }
+
+    def stop(self, timeout: float = 5.0):
+        """停止监控线程和全部服务进程"""
+        atexit.unregister(self.stop)
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join(timeout=timeout)
+            self._monitor = None
+
+        for slot in self._slots:
+            if slot.process is not None and slot.process.is_alive():
+                slot.process.terminate()
+        for slot in self._slots:
+            if slot.process is not None:
+                slot.process.join(timeout=timeout)
+                if slot.process.is_alive():
+                    slot.process.kill()
+
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        logger.info("MCP服务进程已全部停止")
+
+    def run_forever(self):
+        """启动并阻塞运行，Ctrl+C 时停止全部服务进程"""
+        self.start()
+        try:
+            while not self._stop.is_set():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            logger.info("收到中断信号，正在停止MCP服务进程...")
+        finally:
+            self.stop()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+全链路压测 - benchmark_full_stack.py
+启动NVIDIA API替身服务器（test/nvidia_stand_in.py）和MCP服务器，批改引擎经MCP连接池调用
+nvidia_vision/nvidia_chat 工具，由服务器经真实的HTTP客户端请求替身服务器。作业按目标速率提交
+（开环到达，不等待前一份完成），统计吞吐、延迟分位数、失败数以及MCP服务器的排队与拒绝情况。
+不访问网络、不产生API费用，同样的种子和参数得到同样的上游行为:
+
+    python test/benchmark_full_stack.py --rate 1000 --duration 60 --workers 4 --mode fused
+    python test/benchmark_full_stack.py --rate 300 --duration 30 --error-rate 0.02 --latency lognormal:1.0,0.5
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+# 批改引擎每次调用都输出INFO日志，压测只保留警告
+logging.basicConfig(level=logging.WARNING)
+
+import nvidia_stand_in
+
+
+def run_stand_in(host: str, port: int, args):
+    """替身服务器进程入口"""
+    from aiohttp import web
+    stand_in = nvidia_stand_in.NVIDIAStandIn(nvidia_stand_in.config_from_args(args))
+    web.run_app(stand_in.make_app(), host=host, port=port, access_log=None, print=None)
+
+
+def make_images(directory: Path, count: int) -> list:
+    """生成内容各不相同的作业图像，避免命中批改结果缓存"""
+    from PIL import Image, ImageDraw
+
+    paths = []
+    for i in range(count):
+        image = Image.new("RGB", (800, 1000), "white")
+        draw = ImageDraw.Draw(image)
+        for line in range(10):
+            draw.text((40, 40 + line * 90), f"{i}-{line}: {i % 50 + line} + {line + 2} x {i % 7 + 1} =", fill="black")
+        path = directory / f"homework_{i}.jpg"
+        image.save(path, "JPEG", quality=85)
+        paths.append(str(path))
+    return paths
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p * (len(values) - 1))))]
+
+
+async def fetch_json(url: str) -> dict:
+    import aiohttp
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            return await response.json()
+
+
+async def wait_for_http(url: str, timeout: float = 10.0):
+    """等待替身服务器开始监听"""
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return await fetch_json(url)
+        except Exception:
+            if time.time() > deadline:
+                raise RuntimeError(f"替身服务器启动超时: {url}")
+            await asyncio.sleep(0.1)
+
+
+async def run_load(args, mcp_port: int, image_paths: list, work_dir: Path) -> dict:
+    """按目标速率提交作业并等待全部完成"""
+    from core.grading_engine import GradingEngine
+    from core.question_memo import QuestionMemo
+    from core.result_cache import GradingResultCache
+    from mcp_client.pool import MCPClientPool
+    logging.getLogger("grading_engine").setLevel(logging.WARNING)
+
+    pool = MCPClientPool(endpoints=[f"localhost:{mcp_port}"], size=args.pool_size)
+    await pool.connect()
+    # 结果缓存与记忆表放在临时目录，不影响 data/ 中的真实数据
+    engine = GradingEngine(
+        pool, None, mode=args.mode,
+        result_cache=GradingResultCache(cache_dir=str(work_dir / "result_cache")),
+        analysis_memo=QuestionMemo("analysis", db_path=str(work_dir / "memo.db")),
+        grading_memo=QuestionMemo("grading", db_path=str(work_dir / "memo.db"))
+    )
+
+    latencies, outcomes = [], {"ai_powered": 0, "basic": 0, "failed": 0}
+
+    async def grade_one(homework_id: int, image_path: str):
+        start = time.perf_counter()
+        try:
+            result = await engine.grade_homework(homework_id, image_path, "初一")
+            mode = (result or {}).get("mode", "failed")
+            outcomes[mode if mode in outcomes else "failed"] += 1
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"作业 {homework_id} 批改失败: {e}")
+            outcomes["failed"] += 1
+        latencies.append(time.perf_counter() - start)
+
+    interval = 60.0 / args.rate
+    tasks = []
+    start = time.perf_counter()
+    try:
+        for homework_id, image_path in enumerate(image_paths):
+            # 开环到达：按计划时间提交，不等待前面的作业完成
+            delay = start + homework_id * interval - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(grade_one(homework_id, image_path)))
+        submit_time = time.perf_counter() - start
+        await asyncio.gather(*tasks)
+        wall_time = time.perf_counter() - start
+    finally:
+        await pool.disconnect()
+
+    return {
+        "submitted": len(image_paths),
+        "submit_time": submit_time,
+        "wall_time": wall_time,
+        "outcomes": outcomes,
+        "latencies": latencies,
+        "mcp_pool": pool.get_stats()
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="全链路压测（NVIDIA API替身服务器）")
+    parser.add_argument("--rate", type=float, default=1000, help="目标提交速率(份/分钟)")
+    parser.add_argument("--duration", type=float, default=60, help="提交时长(秒)")
+    parser.add_argument("--mode", choices=["pipeline", "fused"], default="fused", help="批改模式")
+    parser.add_argument("--workers", type=int, default=1, help="MCP服务进程数")
+    parser.add_argument("--pool-size", type=int, default=32, help="MCP连接池连接数")
+    parser.add_argument("--grading-concurrency", type=int, default=512, help="批改引擎同时在途的模型调用上限")
+    parser.add_argument("--server-in-flight", type=int, default=512, help="每个MCP服务进程同时执行的请求上限")
+    parser.add_argument("--upstream-connections", type=int, default=512, help="每个MCP服务进程到模型API的连接数上限")
+    parser.add_argument("--stand-in-port", type=int, default=8900, help="替身服务器端口")
+    parser.add_argument("--mcp-port", type=int, default=8790, help="MCP服务器端口")
+    nvidia_stand_in.add_arguments(parser)
+    args = parser.parse_args()
+
+    # 在导入配置之前设置：MCP服务进程（spawn启动）继承这些环境变量
+    api_base = f"http://localhost:{args.stand_in_port}/v1"
+    os.environ["NVIDIA_API_BASE"] = api_base
+    os.environ.setdefault("NVIDIA_API_KEY", "nvapi-stand-in")
+    os.environ["GRADING_MAX_CONCURRENCY"] = str(args.grading_concurrency)
+    os.environ["MCP_MAX_IN_FLIGHT"] = str(args.server_in_flight)
+    os.environ["NVIDIA_MAX_CONNECTIONS"] = str(args.upstream_connections)
+
+    from mcp_server.workers import ServerSupervisor
+
+    total = max(1, int(args.rate * args.duration / 60))
+    print("=== 全链路压测 ===")
+    print(f"📝 目标速率: {args.rate:.0f} 份/分钟, 作业数: {total}, 模式: {args.mode}, MCP服务进程: {args.workers}")
+    print(f"🧪 替身服务器: {api_base} (seed={args.seed}, 文本延迟 {args.latency}, 视觉延迟 {args.vision_latency}, "
+          f"错误率 {args.error_rate}, 限流率 {args.throttle_rate})")
+
+    context = multiprocessing.get_context("spawn")
+    stand_in = context.Process(target=run_stand_in, args=("localhost", args.stand_in_port, args), daemon=True)
+    stand_in.start()
+    supervisor = ServerSupervisor(host="localhost", port=args.mcp_port, workers=args.workers)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        work_dir = Path(work_dir)
+        try:
+            await wait_for_http(f"http://localhost:{args.stand_in_port}/stats")
+            supervisor.start()
+            if not supervisor.wait_ready():
+                raise RuntimeError("MCP服务进程启动超时")
+
+            print(f"🖼️ 生成 {total} 张作业图像...")
+            image_paths = make_images(work_dir, total)
+
+            result = await run_load(args, args.mcp_port, image_paths, work_dir)
+            await asyncio.sleep(supervisor.stats_interval + 0.5)  # 等待各服务进程上报最新统计
+            upstream = await fetch_json(f"http://localhost:{args.stand_in_port}/stats")
+            server_stats = supervisor.get_stats()
+        finally:
+            supervisor.stop()
+            stand_in.terminate()
+            stand_in.join(timeout=5)
+
+    latencies = result["latencies"]
+    completed = result["outcomes"]["ai_powered"]
+    print(f"\n📊 提交用时 {result['submit_time']:.1f}s（实际提交速率 "
+          f"{result['submitted'] / result['submit_time'] * 60 if result['submit_time'] else 0:.0f} 份/分钟），"
+          f"全部完成用时 {result['wall_time']:.1f}s")
+    print(f"✅ AI批改完成: {completed}, 降级基础批改: {result['outcomes']['basic']}, 失败: {result['outcomes']['failed']}")
+    print(f"🚀 吞吐: {completed / result['wall_time'] * 60:.0f} 份/分钟")
+    print(f"⏱️ 作业延迟: p50 {percentile(latencies, 0.5):.2f}s, p95 {percentile(latencies, 0.95):.2f}s, "
+          f"p99 {percentile(latencies, 0.99):.2f}s, 最大 {max(latencies, default=0):.2f}s")
+    print(f"🌐 上游请求: {upstream['requests']}, 状态码 {upstream['responses']}, 并发峰值 {upstream['peak_in_flight']}, "
+          f"平均延迟 {upstream['avg_delay']:.2f}s, tokens {upstream['prompt_tokens']}/{upstream['completion_tokens']}")
+    print(f"🛡️ MCP服务器: 请求 {server_stats['requests']}, 繁忙拒绝 {server_stats['rejected_requests']}, "
+          f"截止时间过期 {server_stats['expired_requests']}, 进程重启 {server_stats['restarts']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
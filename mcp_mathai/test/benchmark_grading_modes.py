@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批改模式基准测试 - benchmark_grading_modes.py
+对比 pipeline（逐题调用）与 fused（融合单次调用）两种模式的延迟、调用次数和token用量。
+使用模拟的MCP客户端，不产生真实API费用:
+
+    python test/benchmark_grading_modes.py --questions 20 --runs 3
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.grading_engine import GradingEngine, GRADING_MODE_PIPELINE, GRADING_MODE_FUSED
+from core.question_memo import QuestionMemo
+from core.result_cache import GradingResultCache
+
+IMAGE_TOKENS = 1000  # 单张图像折算的prompt token数
+
+
+class SimulatedMCPClient:
+    """模拟MCP客户端：按token数模拟上游延迟并统计用量"""
+
+    def __init__(self, question_count: int, base_latency: float, per_token_latency: float):
+        self.question_count = question_count
+        self.base_latency = base_latency
+        self.per_token_latency = per_token_latency
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def _questions(self, graded: bool):
+        questions = []
+        for i in range(1, self.question_count + 1):
+            q = {
+                "number": i,
+                "question_text": f"计算：{i} + {i} × 2",
+                "student_answer": str(i * 3 if i % 4 else i * 2),
+                "confidence": 0.95
+            }
+            if graded:
+                is_correct = bool(i % 4)
+                q.update({
+                    "question_number": i,
+                    "correct_answer": str(i * 3),
+                    "score": 10 if is_correct else 0,
+                    "max_score": 10,
+                    "is_correct": is_correct,
+                    "feedback": "计算正确" if is_correct else "注意先乘除后加减",
+                    "topic": "有理数运算",
+                    "difficulty": "easy"
+                })
+            questions.append(q)
+        return questions
+
+    def _respond(self, tool_name: str, prompt: str) -> dict:
+        if tool_name == "nvidia_vision":
+            graded = "判断答案的正确性" in prompt
+            questions = self._questions(graded)
+            return {"questions": questions, "total_questions": len(questions)}
+        if "分析这道" in prompt:
+            return {"question_type": "计算题", "topic": "有理数运算", "difficulty": "基础",
+                    "correct_answer": "见解析", "solution_steps": ["先算乘法", "再算加法"]}
+        if "批改这道" in prompt:
+            return {"is_correct": True, "score": 10, "max_score": 10, "feedback": "计算正确", "errors": []}
+        if "综合学习反馈" in prompt:
+            summary = {"overall_assessment": "整体良好", "strengths": ["运算熟练"],
+                       "weaknesses": ["运算顺序"], "suggestions": ["加强混合运算练习"]}
+            if "练习题" in prompt:
+                summary["practice_problems"] = [{"topic": "有理数运算", "problems": [
+                    {"question": "计算：3 + 4 × 2", "answer": "11", "hint": "先乘后加"}]}]
+            return summary
+        return {"topic": "有理数运算", "problems": [
+            {"question": "计算：3 + 4 × 2", "answer": "11", "hint": "先乘后加"}]}
+
+    async def call_tool(self, tool_name: str, arguments: dict):
+        content = arguments["messages"][0]["content"]
+        if isinstance(content, list):
+            prompt = "".join(part.get("text", "") for part in content if part.get("type") == "text")
+            prompt_tokens = len(prompt) + IMAGE_TOKENS
+        else:
+            prompt = content
+            prompt_tokens = len(prompt)
+
+        response = json.dumps(self._respond(tool_name, prompt), ensure_ascii=False)
+        completion_tokens = len(response)
+
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+        await asyncio.sleep(self.base_latency + completion_tokens * self.per_token_latency)
+        return response
+
+
+async def run_mode(mode: str, image_path: str, work_dir: Path, args) -> dict:
+    """运行指定模式并返回统计"""
+    latencies = []
+    client = SimulatedMCPClient(args.questions, args.base_latency, args.per_token_latency)
+
+    for run in range(args.runs):
+        # 每次运行使用独立临时目录中的记忆表与结果缓存：不写入 data/ 中的真实数据，
+        # 也避免前一次运行的命中让调用次数和token用量偏低
+        run_dir = work_dir / f"{mode}_{run}"
+        engine = GradingEngine(
+            client, None, mode=mode,
+            result_cache=GradingResultCache(cache_dir=str(run_dir / "result_cache")),
+            analysis_memo=QuestionMemo("analysis", db_path=str(run_dir / "memo.db")),
+            grading_memo=QuestionMemo("grading", db_path=str(run_dir / "memo.db"))
+        )
+
+        start = time.perf_counter()
+        result = await engine._ai_grade_homework(run, image_path, "初一")
+        latencies.append(time.perf_counter() - start)
+        assert result["mode"] == "ai_powered", f"{mode} 模式批改失败"
+
+    return {
+        "mode": mode,
+        "avg_latency": sum(latencies) / len(latencies),
+        "calls": client.calls / args.runs,
+        "prompt_tokens": client.prompt_tokens / args.runs,
+        "completion_tokens": client.completion_tokens / args.runs
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="批改模式基准测试")
+    parser.add_argument("--questions", type=int, default=20, help="每份作业题目数")
+    parser.add_argument("--runs", type=int, default=3, help="每种模式运行次数")
+    parser.add_argument("--base-latency", type=float, default=0.4, help="单次调用基础延迟(秒)")
+    parser.add_argument("--per-token-latency", type=float, default=0.0005, help="每个输出token的延迟(秒)")
+    args = parser.parse_args()
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as f:
+        f.write(b"\xff\xd8" + b"\x00" * 200 * 1024)
+        image_path = f.name
+
+    print("=== 批改模式基准测试 ===")
+    print(f"📝 题目数: {args.questions}, 运行次数: {args.runs}")
+
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            stats = [await run_mode(mode, image_path, Path(work_dir), args)
+                     for mode in (GRADING_MODE_PIPELINE, GRADING_MODE_FUSED)]
+    finally:
+        Path(image_path).unlink(missing_ok=True)
+
+    print(f"\n{'模式':<10}{'平均延迟(s)':>12}{'上游调用':>10}{'prompt tokens':>16}{'completion tokens':>20}")
+    for s in stats:
+        print(f"{s['mode']:<10}{s['avg_latency']:>12.2f}{s['calls']:>10.0f}"
+              f"{s['prompt_tokens']:>16.0f}{s['completion_tokens']:>20.0f}")
+
+    pipeline, fused = stats
+    print(f"\n⚡ 延迟降低: {(1 - fused['avg_latency'] / pipeline['avg_latency']) * 100:.1f}%")
+    total_pipeline = pipeline['prompt_tokens'] + pipeline['completion_tokens']
+    total_fused = fused['prompt_tokens'] + fused['completion_tokens']
+    print(f"💰 token节省: {(1 - total_fused / total_pipeline) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP消息编码基准测试 - benchmark_mcp_codecs.py
+对比各消息编码（json/orjson/msgpack）及是否压缩时，一条典型 analyze_homework
+响应的编码、解码耗时和传输字节数。未安装的编码库会被跳过:
+
+    python test/benchmark_mcp_codecs.py --questions 20 --iterations 2000
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from utils.mcp_protocol import MessageCodec, available_codecs, available_compressions
+
+
+def build_response(question_count: int) -> dict:
+    """构造与服务器 analyze_homework 结果结构相同的JSON-RPC响应"""
+    questions = []
+    for i in range(1, question_count + 1):
+        is_correct = bool(i % 4)
+        questions.append({
+            "question_number": i,
+            "question_text": f"解方程：{i}x + {i * 2} = {i * 5}",
+            "student_answer": f"x = {3 if is_correct else 2}",
+            "correct_answer": "x = 3",
+            "is_correct": is_correct,
+            "score": 10 if is_correct else 0,
+            "max_score": 10,
+            "feedback": "解题步骤完整，结果正确" if is_correct else "移项时注意变号，再检查一遍计算",
+            "topic": "一元一次方程",
+            "difficulty": "medium",
+            "solution_steps": ["移项", "合并同类项", "系数化为1"]
+        })
+
+    analysis = {
+        "success": True,
+        "student_name": "学生",
+        "grade_level": "初一",
+        "total_questions": question_count,
+        "correct_count": sum(1 for q in questions if q["is_correct"]),
+        "accuracy_rate": 0.75,
+        "total_score": sum(q["score"] for q in questions),
+        "questions": questions,
+        "overall_feedback": "整体掌握较好，需注意移项变号和计算细节。",
+        "suggestions": ["多做移项练习", "解完后代入检验", "注意书写规范"],
+        "knowledge_points": ["一元一次方程", "等式的性质", "合并同类项"]
+    }
+    return {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "result": {"content": [{"type": "text", "text": json.dumps(analysis)}], "isError": False}
+    }
+
+
+def run_codec(codec: MessageCodec, message: dict, iterations: int) -> dict:
+    """测量一种编码的平均编码/解码耗时和帧大小"""
+    frame = codec.encode(message)
+    assert codec.decode(frame) == message, f"{codec.codec} 编解码结果不一致"
+    wire_bytes = len(frame.encode("utf-8")) if isinstance(frame, str) else len(frame)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(message)
+    encode_time = (time.perf_counter() - start) / iterations
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(frame)
+    decode_time = (time.perf_counter() - start) / iterations
+
+    return {
+        "name": f"{codec.codec}+{codec.compression}" if codec.compression else codec.codec,
+        "encode_us": encode_time * 1e6,
+        "decode_us": decode_time * 1e6,
+        "bytes": wire_bytes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP消息编码基准测试")
+    parser.add_argument("--questions", type=int, default=20, help="响应中的题目数")
+    parser.add_argument("--iterations", type=int, default=2000, help="每种编码的重复次数")
+    parser.add_argument("--threshold", type=int, default=4096, help="压缩阈值(字节)")
+    args = parser.parse_args()
+
+    message = build_response(args.questions)
+
+    print("=== MCP消息编码基准测试 ===")
+    print(f"📝 题目数: {args.questions}, 重复次数: {args.iterations}")
+    print(f"🔌 可用编码: {', '.join(available_codecs())}")
+
+    stats = []
+    for codec in available_codecs():
+        for compression in [None] + available_compressions():
+            stats.append(run_codec(MessageCodec(codec, compression, args.threshold), message, args.iterations))
+
+    print(f"\n{'编码':<16}{'编码(us)':>12}{'解码(us)':>12}{'传输字节':>12}")
+    for s in stats:
+        print(f"{s['name']:<16}{s['encode_us']:>12.1f}{s['decode_us']:>12.1f}{s['bytes']:>12}")
+
+    baseline = stats[[s["name"] for s in stats].index("json")]
+    best = min(stats, key=lambda s: s["bytes"])
+    fastest = min(stats, key=lambda s: s["encode_us"] + s["decode_us"])
+    print(f"\n📦 最小传输: {best['name']} ({(1 - best['bytes'] / baseline['bytes']) * 100:.1f}% 小于json)")
+    print(f"⚡ 最快编解码: {fastest['name']} "
+          f"({baseline['encode_us'] + baseline['decode_us']:.1f}us → "
+          f"{fastest['encode_us'] + fastest['decode_us']:.1f}us)")
+
+
+if __name__ == "__main__":
+    main()
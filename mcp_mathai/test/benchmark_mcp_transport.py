@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP传输基准测试 - benchmark_mcp_transport.py
+对比同进程内 websocket 客户端（MCPClient）与进程内传输（InProcessMCPClient）调用
+analyze_homework 的单次延迟和并发吞吐。服务器与 main.py 一样运行在后台线程的事件循环中:
+
+    python test/benchmark_mcp_transport.py --calls 200 --concurrency 16 --payload-kb 200
+"""
+
+import sys
+import time
+import base64
+import asyncio
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# 服务器每次调用都输出INFO日志，基准测试只保留警告
+logging.basicConfig(level=logging.WARNING)
+
+from mcp_server.server import MathGradingMCPServer, find_available_port
+from mcp_client.client import MCPClient
+from mcp_client.in_process import InProcessMCPClient
+
+
+def start_server_thread(port: int):
+    """在后台线程启动MCP服务器，返回 (服务器实例, 服务器事件循环)"""
+    loop = asyncio.new_event_loop()
+    server = MathGradingMCPServer(host="localhost", port=port)
+    ready = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(server.start_server())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait(timeout=10)
+    return server, loop
+
+
+async def run_transport(name: str, client, arguments: dict, args) -> dict:
+    """测量一种传输的单次延迟与并发吞吐"""
+    await client.connect()
+    try:
+        for _ in range(10):  # 预热
+            await client.call_tool("analyze_homework", arguments)
+
+        latencies = []
+        for _ in range(args.calls):
+            start = time.perf_counter()
+            await client.call_tool("analyze_homework", arguments)
+            latencies.append(time.perf_counter() - start)
+
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def limited_call():
+            async with semaphore:
+                await client.call_tool("analyze_homework", arguments)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(limited_call() for _ in range(args.calls)))
+        wall_time = time.perf_counter() - start
+    finally:
+        await client.disconnect()
+
+    latencies.sort()
+    return {
+        "name": name,
+        "avg_ms": sum(latencies) / len(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "throughput": args.calls / wall_time
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="MCP传输基准测试")
+    parser.add_argument("--calls", type=int, default=200, help="每种传输的调用次数")
+    parser.add_argument("--concurrency", type=int, default=16, help="吞吐测试的并发数")
+    parser.add_argument("--payload-kb", type=int, default=0, help="随请求内联的base64图像大小(KB)，0表示不带图像")
+    args = parser.parse_args()
+
+    port = find_available_port(8790)
+    server, server_loop = start_server_thread(port)
+
+    arguments = {"grade_level": "初一", "student_name": "基准测试"}
+    if args.payload_kb:
+        arguments["image_data"] = base64.b64encode(b"\xff\xd8" + b"\x00" * args.payload_kb * 1024).decode()
+
+    print("=== MCP传输基准测试 ===")
+    print(f"📝 调用次数: {args.calls}, 并发数: {args.concurrency}, 内联图像: {args.payload_kb}KB")
+
+    stats = [
+        await run_transport("websocket", MCPClient(host="localhost", port=port), arguments, args),
+        await run_transport("in_process", InProcessMCPClient(server, server_loop), arguments, args)
+    ]
+    server_loop.call_soon_threadsafe(server_loop.stop)
+
+    print(f"\n{'传输':<12}{'平均(ms)':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'吞吐(次/秒)':>14}")
+    for s in stats:
+        print(f"{s['name']:<12}{s['avg_ms']:>10.2f}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['throughput']:>14.0f}")
+
+    websocket, in_process = stats
+    print(f"\n⚡ 单次延迟降低: {(1 - in_process['avg_ms'] / websocket['avg_ms']) * 100:.1f}%")
+    print(f"🚀 吞吐提升: {in_process['throughput'] / websocket['throughput']:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP多进程服务器基准测试 - benchmark_mcp_workers.py
+分别以 1 个和 --workers 个服务进程监听同一端口，由 --clients 个客户端进程（各带一个连接池）
+并发调用 analyze_homework，对比总吞吐。请求内联 base64 图像以模拟大消息的JSON处理开销。
+客户端进程也占用CPU，在16核机器上可用 --workers 8 --clients 8:
+
+    python test/benchmark_mcp_workers.py --workers 8 --clients 8 --calls 400 --payload-kb 200
+"""
+
+import sys
+import time
+import base64
+import asyncio
+import logging
+import argparse
+import multiprocessing
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# 服务器每次调用都输出INFO日志，基准测试只保留警告
+logging.basicConfig(level=logging.WARNING)
+
+from mcp_server.server import find_available_port
+from mcp_server.workers import ServerSupervisor
+
+
+def client_process(port: int, calls: int, concurrency: int, payload_kb: int, start_event, results):
+    """客户端进程：等待统一开始信号后并发调用，报告耗时"""
+    logging.basicConfig(level=logging.WARNING)
+    from mcp_client.pool import MCPClientPool
+
+    arguments = {"grade_level": "初一", "student_name": "基准测试"}
+    if payload_kb:
+        arguments["image_data"] = base64.b64encode(b"\xff\xd8" + b"\x00" * payload_kb * 1024).decode()
+
+    async def run():
+        pool = MCPClientPool(endpoints=[f"localhost:{port}"], size=concurrency)
+        await pool.connect()
+        try:
+            await pool.call_tool("analyze_homework", arguments)  # 预热
+            start_event.wait()
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def limited_call():
+                async with semaphore:
+                    await pool.call_tool("analyze_homework", arguments)
+
+            start = time.perf_counter()
+            await asyncio.gather(*(limited_call() for _ in range(calls)))
+            return time.perf_counter() - start
+        finally:
+            await pool.disconnect()
+
+    results.put(asyncio.run(run()))
+
+
+def run_round(workers: int, args) -> dict:
+    """以指定服务进程数运行一轮，返回吞吐"""
+    port = find_available_port(8800)
+    supervisor = ServerSupervisor(host="localhost", port=port, workers=workers, stats_interval=0.5)
+    supervisor.start()
+    try:
+        if not supervisor.wait_ready():
+            raise RuntimeError("MCP服务进程启动超时")
+
+        context = multiprocessing.get_context("spawn")
+        start_event = context.Event()
+        results = context.Queue()
+        clients = [
+            context.Process(target=client_process,
+                            args=(port, args.calls, args.concurrency, args.payload_kb, start_event, results))
+            for _ in range(args.clients)
+        ]
+        for process in clients:
+            process.start()
+        time.sleep(2)  # 等待各客户端连接并预热
+
+        start = time.perf_counter()
+        start_event.set()
+        durations = [results.get(timeout=600) for _ in clients]
+        wall_time = time.perf_counter() - start
+        for process in clients:
+            process.join()
+
+        time.sleep(1)  # 等待各服务进程上报最新统计
+        stats = supervisor.get_stats()
+    finally:
+        supervisor.stop()
+
+    total_calls = args.calls * args.clients
+    return {
+        "workers": workers,
+        "throughput": total_calls / wall_time,
+        "slowest_client": max(durations),
+        "busy_workers": sum(1 for w in stats["per_worker"] if w["stats"] and w["stats"]["requests"] > 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MCP多进程服务器基准测试")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count() // 2 or 1, help="服务进程数")
+    parser.add_argument("--clients", type=int, default=4, help="客户端进程数")
+    parser.add_argument("--calls", type=int, default=200, help="每个客户端的调用次数")
+    parser.add_argument("--concurrency", type=int, default=8, help="每个客户端的并发数（连接池大小）")
+    parser.add_argument("--payload-kb", type=int, default=200, help="随请求内联的base64图像大小(KB)，0表示不带图像")
+    args = parser.parse_args()
+
+    print("=== MCP多进程服务器基准测试 ===")
+    print(f"📝 CPU核数: {multiprocessing.cpu_count()}, 客户端进程: {args.clients}, "
+          f"每客户端调用: {args.calls}, 并发: {args.concurrency}, 内联图像: {args.payload_kb}KB")
+
+    stats = [run_round(1, args)]
+    if args.workers > 1:
+        stats.append(run_round(args.workers, args))
+
+    print(f"\n{'服务进程':<10}{'吞吐(次/秒)':>14}{'最慢客户端(s)':>16}{'参与进程':>10}")
+    for s in stats:
+        print(f"{s['workers']:<10}{s['throughput']:>14.0f}{s['slowest_client']:>16.2f}{s['busy_workers']:>10}")
+
+    if len(stats) > 1:
+        speedup = stats[1]["throughput"] / stats[0]["throughput"]
+        print(f"\n🚀 吞吐提升: {speedup:.1f}x（{args.workers} 个服务进程，线性为 {args.workers}x）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NVIDIA API本地替身服务器 - nvidia_stand_in.py
+实现OpenAI兼容的 /v1/chat/completions，按批改引擎的提示词返回结构正确的JSON，
+延迟、错误率和token数可配置，并由随机种子决定，用于无网络、无费用地压测整个批改链路:
+
+    python test/nvidia_stand_in.py --port 8900 --seed 42 --latency lognormal:0.8,0.4 --error-rate 0.01
+    NVIDIA_API_BASE=http://localhost:8900/v1 NVIDIA_API_KEY=nvapi-stand-in python main.py --mode server
+
+每个请求的随机数由 种子 + 请求体哈希 + 该请求体出现的次数 决定：同样的请求序列得到同样的延迟、
+错误和内容，与并发到达的先后顺序无关。
+
+延迟分布（秒）: fixed:0.5  uniform:0.2,1.0  normal:0.8,0.2  lognormal:0.8,0.4（中位数,sigma）  exponential:0.5
+"""
+
+import re
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Dict, Any, List, Optional, Tuple
+
+from aiohttp import web
+
+
+class LatencyDistribution:
+    """延迟分布，按规格字符串解析，如 "lognormal:0.8,0.4" """
+
+    KINDS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(":")
+        self.kind = kind.strip()
+        self.params = [float(p) for p in params.split(",") if p.strip()]
+        if self.kind not in self.KINDS:
+            raise ValueError(f"未知的延迟分布: {spec}（可选 {', '.join(self.KINDS)}）")
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exponential": 1}[self.kind]
+        if len(self.params) != expected:
+            raise ValueError(f"延迟分布 {self.kind} 需要 {expected} 个参数: {spec}")
+        self.spec = spec
+
+    def sample(self, rng: random.Random) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(math.log(p[0]), p[1]) if p[0] > 0 else 0.0
+        else:
+            value = rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        return max(0.0, value)
+
+
+class StandInConfig:
+    """替身服务器的行为配置"""
+
+    def __init__(self, seed: int = 42, latency: str = "lognormal:0.6,0.3", vision_latency: str = "lognormal:1.5,0.3",
+                 per_token_latency: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 max_concurrency: int = 0, questions: Tuple[int, int] = (5, 10), correct_rate: float = 0.8,
+                 image_tokens: int = 1000, completion_tokens: Optional[str] = None):
+        self.seed = seed
+        self.latency = LatencyDistribution(latency)                 # 文本请求的基础延迟
+        self.vision_latency = LatencyDistribution(vision_latency)   # 带图像请求的基础延迟
+        self.per_token_latency = per_token_latency                  # 每个输出token追加的延迟(秒)
+        self.error_rate = error_rate                                # 返回500的比例
+        self.throttle_rate = throttle_rate                          # 返回429的比例
+        self.max_concurrency = max_concurrency                      # 同时处理的请求上限，超出返回429，0为不限
+        self.questions = questions                                  # 每份作业识别出的题目数范围
+        self.correct_rate = correct_rate                            # 学生答对的比例
+        self.image_tokens = image_tokens                            # 单张图像折算的prompt token数
+        # 上报的输出token数分布（以token为单位，复用延迟分布的规格），为None时按输出字符数计
+        self.completion_tokens = LatencyDistribution(completion_tokens) if completion_tokens else None
+
+
+class NVIDIAStandIn:
+    """OpenAI/NVIDIA兼容的 /chat/completions 替身服务"""
+
+    def __init__(self, config: Optional[StandInConfig] = None):
+        self.config = config or StandInConfig()
+        self._occurrences: Dict[str, int] = {}
+
+        # 统计
+        self.requests = 0
+        self.responses: Dict[int, int] = {}
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.total_delay = 0.0
+        self.started_at = time.time()
+        self._runner: Optional[web.AppRunner] = None
+
+    def _rng(self, body: bytes) -> random.Random:
+        """按 种子 + 请求体哈希 + 出现次数 生成该请求的随机数发生器"""
+        digest = hashlib.sha256(body).hexdigest()
+        occurrence = self._occurrences.get(digest, 0)
+        self._occurrences[digest] = occurrence + 1
+        return random.Random(f"{self.config.seed}:{digest}:{occurrence}")
+
+    @staticmethod
+    def _prompt_parts(messages: List[Dict[str, Any]]) -> Tuple[str, int]:
+        """拼接消息中的文本，统计图像数"""
+        texts, images = [], 0
+        for message in messages:
+            content = message.get("content", "")
+            if isinstance(content, list):
+                for part in content:
+                    if part.get("type") == "text":
+                        texts.append(part.get("text", ""))
+                    else:
+                        images += 1
+            else:
+                texts.append(str(content))
+        return "\n".join(texts), images
+
+    def _question(self, rng: random.Random, number: int, graded: bool) -> Dict[str, Any]:
+        a, b, c = rng.randint(1, 50), rng.randint(1, 12), rng.randint(1, 12)
+        answer = a + b * c
+        is_correct = rng.random() < self.config.correct_rate
+        student_answer = answer if is_correct else answer + rng.choice([-10, -1, 1, 2, 10])
+        question = {
+            "number": number,
+            "question_text": f"计算：{a} + {b} × {c}",
+            "student_answer": str(student_answer),
+            "confidence": round(rng.uniform(0.85, 0.99), 2)
+        }
+        if graded:
+            question.update({
+                "question_number": number,
+                "correct_answer": str(answer),
+                "score": 10 if is_correct else 0,
+                "max_score": 10,
+                "is_correct": is_correct,
+                "feedback": "计算正确" if is_correct else "注意先乘除后加减",
+                "topic": "有理数运算",
+                "difficulty": "easy"
+            })
+        return question
+
+    @staticmethod
+    def _practice(rng: random.Random, topic: str, count: int = 2) -> Dict[str, Any]:
+        problems = []
+        for _ in range(count):
+            a, b, c = rng.randint(1, 20), rng.randint(1, 9), rng.randint(1, 9)
+            problems.append({"question": f"计算：{a} + {b} × {c}", "answer": str(a + b * c), "hint": "先乘后加"})
+        return {"topic": topic, "problems": problems}
+
+    def _respond(self, rng: random.Random, prompt: str, images: int) -> str:
+        """按批改引擎的提示词生成模型输出（JSON文本）"""
+        if images:
+            graded = "判断答案的正确性" in prompt
+            count = rng.randint(*self.config.questions)
+            questions = [self._question(rng, i, graded) for i in range(1, count + 1)]
+            result = {"questions": questions, "total_questions": count}
+        elif "分析这道" in prompt:
+            match = re.search(r"(\d+) \+ (\d+) × (\d+)", prompt)
+            answer = str(int(match[1]) + int(match[2]) * int(match[3])) if match else "见解析"
+            result = {"question_type": "计算题", "topic": "有理数运算", "difficulty": "基础",
+                      "correct_answer": answer, "solution_steps": ["先算乘法", "再算加法"]}
+        elif "批改这道" in prompt:
+            correct = re.search(r"正确答案：(\S*)", prompt)
+            student = re.search(r"学生答案：(\S*)", prompt)
+            is_correct = bool(correct and student and correct[1] == student[1])
+            result = {"is_correct": is_correct, "score": 10 if is_correct else 0, "max_score": 10,
+                      "feedback": "计算正确" if is_correct else "注意先乘除后加减",
+                      "errors": [] if is_correct else ["运算顺序错误"]}
+        elif "综合学习反馈" in prompt:
+            result = {"overall_assessment": "整体良好", "strengths": ["运算熟练"],
+                      "weaknesses": ["运算顺序"], "suggestions": ["加强混合运算练习"]}
+            if "练习题" in prompt:
+                result["practice_problems"] = [self._practice(rng, "有理数运算")]
+        elif "练习题" in prompt:
+            topic = re.search(r"关于\"(.+?)\"", prompt)
+            result = self._practice(rng, topic[1] if topic else "有理数运算", count=3)
+        else:
+            return "OK"
+        return json.dumps(result, ensure_ascii=False)
+
+    @staticmethod
+    def _error(status: int, message: str, headers: Optional[Dict[str, str]] = None) -> web.Response:
+        return web.json_response({"error": {"message": message, "code": status}}, status=status, headers=headers)
+
+    async def handle_chat(self, request: web.Request) -> web.Response:
+        """POST /v1/chat/completions"""
+        body = await request.read()
+        try:
+            payload = json.loads(body)
+            messages = payload["messages"]
+        except (ValueError, KeyError, TypeError):
+            return self._count(self._error(400, "请求体必须是包含 messages 的JSON"))
+
+        rng = self._rng(body)
+        prompt, images = self._prompt_parts(messages)
+        self.requests += 1
+
+        if self.config.max_concurrency and self.in_flight >= self.config.max_concurrency:
+            return self._count(self._error(429, "并发请求过多", {"Retry-After": "1"}))
+
+        # 错误判定在延迟之前抽样，同一请求的结果不受延迟分布参数影响
+        roll = rng.random()
+        content = self._respond(rng, prompt, images)
+        completion_tokens = len(content)
+        if self.config.completion_tokens is not None:
+            completion_tokens = max(1, int(self.config.completion_tokens.sample(rng)))
+        prompt_tokens = len(prompt) + images * self.config.image_tokens
+
+        distribution = self.config.vision_latency if images else self.config.latency
+        delay = distribution.sample(rng) + completion_tokens * self.config.per_token_latency
+
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+        self.total_delay += delay
+
+        if roll < self.config.throttle_rate:
+            return self._count(self._error(429, "Rate limit exceeded", {"Retry-After": "1"}))
+        if roll < self.config.throttle_rate + self.config.error_rate:
+            return self._count(self._error(500, "Internal server error (injected)"))
+
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        return self._count(web.json_response({
+            "id": f"chatcmpl-{rng.getrandbits(64):016x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stand-in"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        }))
+
+    def _count(self, response: web.Response) -> web.Response:
+        self.responses[response.status] = self.responses.get(response.status, 0) + 1
+        return response
+
+    async def handle_models(self, request: web.Request) -> web.Response:
+        """GET /v1/models"""
+        return web.json_response({"object": "list", "data": [{"id": "stand-in", "object": "model"}]})
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        """GET /stats：请求数、各状态码计数、并发峰值与token用量"""
+        return web.json_response(self.get_stats())
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "responses": {str(status): count for status, count in sorted(self.responses.items())},
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "avg_delay": self.total_delay / self.requests if self.requests else 0.0,
+            "uptime": time.time() - self.started_at
+        }
+
+    def make_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        for prefix in ("/v1", ""):
+            app.router.add_post(f"{prefix}/chat/completions", self.handle_chat)
+            app.router.add_get(f"{prefix}/models", self.handle_models)
+        app.router.add_get("/stats", self.handle_stats)
+        return app
+
+    async def start(self, host: str = "localhost", port: int = 8900) -> str:
+        """在当前事件循环中启动，返回可用作 models.api_base 的地址"""
+        self._runner = web.AppRunner(self.make_app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}/v1"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """替身服务器的命令行参数（压测脚本复用）"""
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    parser.add_argument("--latency", default="lognormal:0.6,0.3", help="文本请求的延迟分布(秒)")
+    parser.add_argument("--vision-latency", default="lognormal:1.5,0.3", help="带图像请求的延迟分布(秒)")
+    parser.add_argument("--per-token-latency", type=float, default=0.0, help="每个输出token追加的延迟(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的比例")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="返回429的比例")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="同时处理的请求上限，超出返回429，0为不限")
+    parser.add_argument("--questions", default="5,10", help="每份作业识别出的题目数范围，如 5,10")
+    parser.add_argument("--correct-rate", type=float, default=0.8, help="学生答对的比例")
+    parser.add_argument("--image-tokens", type=int, default=1000, help="单张图像折算的prompt token数")
+    parser.add_argument("--completion-tokens", default=None, help="上报的输出token数分布，如 normal:400,80；默认按输出字符数")
+
+
+def config_from_args(args) -> StandInConfig:
+    low, _, high = args.questions.partition(",")
+    return StandInConfig(
+        seed=args.seed, latency=args.latency, vision_latency=args.vision_latency,
+        per_token_latency=args.per_token_latency, error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+        max_concurrency=args.max_concurrency, questions=(int(low), int(high or low)),
+        correct_rate=args.correct_rate, image_tokens=args.image_tokens, completion_tokens=args.completion_tokens
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NVIDIA API本地替身服务器")
+    parser.add_argument("--host", default="localhost", help="监听地址")
+    parser.add_argument("--port", type=int, default=8900, help="监听端口")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        stand_in = NVIDIAStandIn(config_from_args(args))
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    print(f"🧪 NVIDIA API替身服务器: http://{args.host}:{args.port}/v1 (seed={args.seed})")
+    print(f"   设置 NVIDIA_API_BASE=http://{args.host}:{args.port}/v1 使模型调用指向替身服务器")
+    web.run_app(stand_in.make_app(), host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == "__main__":
+    main()
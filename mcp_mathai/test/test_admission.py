@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+准入控制测试 - test_admission.py
+队列满时拒绝并给出重试等待时间，服务器以 ERROR_SERVER_BUSY 应答:
+
+    python -m pytest test/test_admission.py -q
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.admission import AdmissionController, ServerBusyError
+from mcp_server.registry import ToolSpec
+from mcp_server.server import MathGradingMCPServer
+from utils.mcp_protocol import ERROR_SERVER_BUSY
+
+
+def test_rejects_when_global_queue_is_full():
+    controller = AdmissionController(max_in_flight=2, max_queue=2, max_queue_per_client=10)
+    controller.admit(0)
+    controller.admit(0)
+    with pytest.raises(ServerBusyError) as excinfo:
+        controller.admit(0)
+    assert excinfo.value.retry_after_ms >= controller.min_retry_ms
+    assert controller.get_stats()["rejected"] == 1
+
+    # 有请求开始执行后队列腾出空位
+    controller.dequeue()
+    controller.admit(0)
+    assert controller.waiting == 2
+
+
+def test_rejects_client_with_too_many_queued_requests():
+    controller = AdmissionController(max_in_flight=2, max_queue=100, max_queue_per_client=3)
+    controller.admit(2)
+    with pytest.raises(ServerBusyError):
+        controller.admit(3)
+
+
+def test_retry_after_follows_run_time_and_is_clamped():
+    controller = AdmissionController(max_in_flight=1, max_queue=100, max_queue_per_client=100)
+    controller.min_retry_ms, controller.max_retry_ms = 100, 10000
+
+    for _ in range(50):
+        controller.record(0.001)
+    assert controller.retry_after_ms() == 100
+
+    for _ in range(50):
+        controller.record(2.0)
+    for _ in range(3):
+        controller.admit(0)
+    # 3个排队请求加本请求，每个约2秒
+    assert 7000 <= controller.retry_after_ms() <= 8000
+
+    for _ in range(50):
+        controller.record(60.0)
+    assert controller.retry_after_ms() == 10000
+
+
+def test_server_answers_overflow_with_server_busy():
+    async def run():
+        server = MathGradingMCPServer(cpu_workers=0)
+        server.admission = AdmissionController(max_in_flight=1, max_queue=1, max_queue_per_client=10)
+        release = asyncio.Event()
+
+        async def slow(arguments):
+            await release.wait()
+            return {"content": [{"type": "text", "text": "done"}]}
+
+        server.registry.register(ToolSpec("slow", "slow", {"type": "object"}, slow))
+        connection = server.local_connection()
+
+        def request(request_id):
+            return server.execute_local_request(connection, {
+                "jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+                "params": {"name": "slow", "arguments": {}}
+            })
+
+        try:
+            # 第1个在执行，第2个排队，第3个被拒绝
+            running = asyncio.create_task(request(1))
+            await asyncio.sleep(0.05)
+            queued = asyncio.create_task(request(2))
+            await asyncio.sleep(0.05)
+            rejected = await request(3)
+
+            release.set()
+            return rejected, await running, await queued, server.get_stats()
+        finally:
+            await server.close()
+
+    rejected, first, second, stats = asyncio.run(run())
+    assert rejected["id"] == 3
+    assert rejected["error"]["code"] == ERROR_SERVER_BUSY
+    assert rejected["error"]["data"]["retry_after_ms"] > 0
+    assert "result" in first and "result" in second
+    assert stats["rejected_requests"] == 1
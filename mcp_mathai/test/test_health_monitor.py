@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+熔断器测试 - test_health_monitor.py
+连续失败熔断、半开状态的单个探测及其释放，以及哪些调用失败计入熔断:
+
+    python -m pytest test/test_health_monitor.py -q
+"""
+
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.grading_engine import GradingEngine
+from core.health_monitor import AIHealthMonitor, CircuitState
+from utils.exceptions import MCPDeadlineExceededError, MCPServerBusyError
+
+
+def open_monitor() -> AIHealthMonitor:
+    """已熔断且冷却结束的监控器"""
+    monitor = AIHealthMonitor(failure_threshold=2, reset_timeout=0)
+    monitor.record_failure("error")
+    monitor.record_failure("error")
+    assert monitor.circuit == CircuitState.OPEN
+    return monitor
+
+
+def test_opens_after_consecutive_failures():
+    monitor = AIHealthMonitor(failure_threshold=2, reset_timeout=60)
+    monitor.record_failure("error")
+    assert monitor.allow_request()
+    monitor.record_failure("error")
+    assert monitor.circuit == CircuitState.OPEN
+    assert not monitor.allow_request()
+
+
+def test_half_open_allows_a_single_probe():
+    monitor = open_monitor()
+    assert monitor.allow_request()
+    assert monitor.circuit == CircuitState.HALF_OPEN
+    assert not monitor.allow_request()
+
+    monitor.record_success()
+    assert monitor.circuit == CircuitState.CLOSED
+    assert monitor.allow_request()
+
+
+def test_release_probe_lets_the_next_probe_through():
+    monitor = open_monitor()
+    assert monitor.allow_request()
+    monitor.release_probe()
+    assert monitor.circuit == CircuitState.HALF_OPEN
+    assert monitor.allow_request()
+
+
+class ScriptedMCPClient:
+    """按顺序抛出给定异常或挂起的模拟MCP客户端"""
+
+    def __init__(self, error=None, hang=False):
+        self.error = error
+        self.hang = hang
+
+    async def call_tool(self, tool_name: str, arguments: dict):
+        if self.hang:
+            await asyncio.sleep(3600)
+        if self.error is not None:
+            raise self.error
+        return "ok"
+
+
+def make_engine(client, monitor):
+    engine = GradingEngine(client, None, health_monitor=monitor)
+    engine.nvidia_api_key = "nvapi-test"
+    return engine
+
+
+@pytest.mark.parametrize("error, counted", [
+    (MCPServerBusyError("服务器繁忙", 0.1), False),
+    (MCPDeadlineExceededError("工具调用超时: nvidia_chat"), True),
+    (asyncio.TimeoutError(), True),
+    (Exception("API调用失败: 500"), True),
+])
+def test_failures_except_server_busy_are_counted(error, counted):
+    monitor = AIHealthMonitor(failure_threshold=1)
+    engine = make_engine(ScriptedMCPClient(error=error), monitor)
+
+    with pytest.raises(type(error)):
+        asyncio.run(engine._call_model("nvidia_chat", {"model": "m", "messages": []}))
+    assert (monitor.circuit == CircuitState.OPEN) is counted
+
+
+def test_probe_rejected_by_busy_server_is_released():
+    monitor = open_monitor()
+    engine = make_engine(ScriptedMCPClient(error=MCPServerBusyError("服务器繁忙", 0.1)), monitor)
+
+    assert asyncio.run(engine._should_use_ai_grading()) is False
+    assert monitor.circuit == CircuitState.HALF_OPEN
+    assert monitor.allow_request()
+
+
+def test_cancelled_probe_is_released():
+    monitor = open_monitor()
+    engine = make_engine(ScriptedMCPClient(hang=True), monitor)
+
+    async def cancel_probe():
+        task = asyncio.create_task(engine._should_use_ai_grading())
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+    assert monitor.circuit == CircuitState.HALF_OPEN
+    assert monitor.allow_request()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+图像上传测试 - test_image_upload.py
+发送原图时保留原图的MIME类型，数据块引用按实际格式解析为 data URL:
+
+    python -m pytest test/test_image_upload.py -q
+"""
+
+import io
+import os
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.grading_engine import GradingEngine
+from mcp_server.blob_store import BlobStore
+from mcp_server.server import MathGradingMCPServer
+from utils.mcp_protocol import BLOB_URL_PREFIX, sniff_image_mime
+
+SCREENSHOT = Path(__file__).parent.parent / "test_datas" / "高一" / "Q1.png"
+
+
+def encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("fmt, mime_type", [
+    ("PNG", "image/png"),
+    ("JPEG", "image/jpeg"),
+    ("GIF", "image/gif"),
+    ("BMP", "image/bmp"),
+    ("WEBP", "image/webp"),
+])
+def test_sniff_image_mime(fmt, mime_type):
+    assert sniff_image_mime(encode(Image.new("RGB", (8, 8), "white"), fmt)) == mime_type
+
+
+def test_sniff_image_mime_falls_back_to_default():
+    assert sniff_image_mime(b"not an image") == "image/jpeg"
+    assert sniff_image_mime(b"", default="application/octet-stream") == "application/octet-stream"
+
+
+def prepare(image_path: Path):
+    engine = GradingEngine(object(), None)
+
+    async def run():
+        processed = await engine._process_image(str(image_path))
+        return processed, await engine._image_url(processed)
+
+    return asyncio.run(run())
+
+
+def test_smaller_original_keeps_its_own_type():
+    """线条简单的PNG截图重新编码为JPEG反而更大，发送原图时标注为PNG"""
+    processed, url = prepare(SCREENSHOT)
+    assert processed["data"] == SCREENSHOT.read_bytes()
+    assert processed["mime_type"] == "image/png"
+    assert url.startswith("data:image/png;base64,")
+
+
+def test_recompressed_image_is_labelled_jpeg(tmp_path):
+    photo = tmp_path / "photo.png"
+    Image.frombytes("RGB", (400, 400), os.urandom(400 * 400 * 3)).save(photo)
+
+    processed, url = prepare(photo)
+    assert processed["mime_type"] == "image/jpeg"
+    assert url.startswith("data:image/jpeg;base64,")
+
+
+def test_blob_store_records_mime_type_until_eviction():
+    png = SCREENSHOT.read_bytes()
+    store = BlobStore(max_bytes=len(png))
+    digest = store.put(png)
+    assert store.mime_type(digest) == "image/png"
+
+    store.put(encode(Image.new("RGB", (64, 64), "white"), "JPEG"))
+    assert store.get(digest) is None and store.mime_type(digest) is None
+
+
+def test_server_resolves_blob_url_with_its_mime_type():
+    server = MathGradingMCPServer(cpu_workers=0)
+    try:
+        digest = server.blob_store.put(SCREENSHOT.read_bytes())
+        resolved = server._resolve_blob_refs({"image_url": {"url": f"{BLOB_URL_PREFIX}{digest}"}})
+        assert resolved["image_url"]["url"].startswith("data:image/png;base64,")
+    finally:
+        asyncio.run(server.close())
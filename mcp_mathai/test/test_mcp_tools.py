@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP工具测试 - test_mcp_tools.py
+安全表达式计算的限制、工具参数校验，以及无效参数返回 -32602:
+
+    python -m pytest test/test_mcp_tools.py -q
+"""
+
+import sys
+import asyncio
+from fractions import Fraction
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from mcp_server.expression import ExpressionError, evaluate, validate_expression
+from mcp_server.registry import ToolInputError, ToolSpec, compile_validator
+from mcp_server.server import MathGradingMCPServer
+
+
+@pytest.mark.parametrize("text, value", [
+    ("1 + 2 × 3", Fraction(7)),
+    ("(1 + 2) ÷ 3", Fraction(1)),
+    ("0.1 + 0.2", Fraction(3, 10)),
+    ("1 / 3 + 1 / 6", Fraction(1, 2)),
+    ("2 ** 10", Fraction(1024)),
+    ("2 ** -2", Fraction(1, 4)),
+    ("-(3 - 5)", Fraction(2)),
+])
+def test_evaluate_is_exact(text, value):
+    assert evaluate(text) == value
+
+
+@pytest.mark.parametrize("text, message", [
+    ("1 / 0", "除数不能为零"),
+    ("5 % 0", "除数不能为零"),
+    ("0 ** -1", "除数不能为零"),
+    ("2 ** 101", "整数指数"),
+    ("2 ** 0.5", "整数指数"),
+    ("((10 ** 100) ** 100) ** 100", "过大"),
+    ("1e400", "过大"),
+    ("-1e400 + 1", "过大"),
+    ("1 +" * 300 + "1", "过长"),
+    ("x + 1", "未知数"),
+    ("__import__('os')", "不支持"),
+    ("", "为空"),
+    ("1 +", "无法解析"),
+])
+def test_evaluate_rejects(text, message):
+    with pytest.raises(ExpressionError, match=message):
+        evaluate(text)
+
+
+def test_validate_expression_checks_equations_and_expected_result():
+    assert validate_expression("1/2 + 1/3 = 5/6")["is_correct"] is True
+    assert validate_expression("3 + 4 × 2", "14")["is_correct"] is False
+    result = validate_expression("7 ÷ 2", "3.5")
+    assert result["value"] == "7/2" and result["is_correct"] is True
+    with pytest.raises(ExpressionError):
+        validate_expression("1 = 1 = 1")
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "name": {"type": "string", "maxLength": 4},
+        "count": {"type": "integer", "minimum": 1, "maximum": 10, "default": 3},
+        "level": {"type": "string", "enum": ["easy", "hard"]}
+    },
+    "required": ["name"]
+}
+
+
+def test_validator_fills_defaults_and_keeps_extra_arguments():
+    assert compile_validator(SCHEMA)({"name": "ab", "extra": 1}) == {"name": "ab", "count": 3, "extra": 1}
+
+
+@pytest.mark.parametrize("arguments", [
+    {},
+    {"name": None},
+    {"name": 1},
+    {"name": "toolong"},
+    {"name": "ab", "count": 0},
+    {"name": "ab", "count": True},
+    {"name": "ab", "count": 2.5},
+    {"name": "ab", "level": "medium"},
+    [],
+])
+def test_validator_rejects(arguments):
+    with pytest.raises(ToolInputError):
+        compile_validator(SCHEMA)(arguments)
+
+
+def test_invalid_arguments_are_not_passed_to_handler():
+    calls = []
+
+    async def handler(arguments):
+        calls.append(arguments)
+        return {"content": [{"type": "text", "text": "ok"}]}
+
+    spec = ToolSpec("demo", "demo", SCHEMA, handler)
+    with pytest.raises(ToolInputError):
+        asyncio.run(spec.call({"count": 2}))
+    assert calls == [] and spec.invalid_calls == 1
+
+
+def test_server_answers_invalid_arguments_with_32602():
+    async def call(arguments):
+        server = MathGradingMCPServer(cpu_workers=0)
+        try:
+            return await server.execute_local_request(server.local_connection(), {
+                "jsonrpc": "2.0", "id": 1, "method": "tools/call",
+                "params": {"name": "validate_math_expression", "arguments": arguments}
+            })
+        finally:
+            await server.close()
+
+    response = asyncio.run(call({"expected_result": "2"}))
+    assert response["error"]["code"] == -32602
+    assert "expression" in response["error"]["message"]
+
+    for expression in ("1 / 0", "1e400"):
+        response = asyncio.run(call({"expression": expression}))
+        assert response["result"]["isError"] is True
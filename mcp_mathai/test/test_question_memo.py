@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+逐题记忆表测试 - test_question_memo.py
+键的规范化、TTL与持久化，以及批改记忆的键与跳过条件:
+
+    python -m pytest test/test_question_memo.py -q
+"""
+
+import sys
+import json
+import time
+import asyncio
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.grading_engine import GradingEngine
+from core.health_monitor import AIHealthMonitor
+from core.question_memo import QuestionMemo, make_memo_key, normalize_answer, normalize_text
+
+
+def test_normalization_ignores_whitespace_width_and_trailing_punctuation():
+    assert normalize_text("计算： 3 + 4 ×２") == normalize_text("计算:3+4×2")
+    assert normalize_answer(" 11。") == normalize_answer("11")
+    assert make_memo_key("v1", normalize_answer("11。")) == make_memo_key("v1", normalize_answer("11"))
+    assert make_memo_key("v1", "11") != make_memo_key("v1", "12")
+
+
+def test_memo_persists_and_expires(tmp_path):
+    db_path = str(tmp_path / "memo.db")
+    QuestionMemo("grading", db_path=db_path).put("k", {"score": 10})
+    assert QuestionMemo("grading", db_path=db_path).get("k") == {"score": 10}
+    # 不同命名空间互不可见
+    assert QuestionMemo("analysis", db_path=db_path).get("k") is None
+
+    memo = QuestionMemo("grading", ttl=0.05, db_path=str(tmp_path / "ttl.db"))
+    memo.put("k", {"score": 10})
+    time.sleep(0.1)
+    assert memo.get("k") is None
+
+
+class CountingMCPClient:
+    """记录批改请求次数的模拟MCP客户端"""
+
+    def __init__(self):
+        self.grading_calls = 0
+        self.prompts = []
+
+    async def call_tool(self, tool_name: str, arguments: dict):
+        self.grading_calls += 1
+        self.prompts.append(arguments["messages"][0]["content"])
+        return json.dumps({"is_correct": True, "score": 10, "max_score": 10, "feedback": "正确"})
+
+
+@pytest.fixture
+def engine_and_client(tmp_path):
+    client = CountingMCPClient()
+    engine = GradingEngine(
+        client, None, health_monitor=AIHealthMonitor(),
+        analysis_memo=QuestionMemo("analysis", db_path=str(tmp_path / "memo.db")),
+        grading_memo=QuestionMemo("grading", db_path=str(tmp_path / "memo.db"))
+    )
+    return engine, client
+
+
+def grade(engine, question: dict) -> dict:
+    return asyncio.run(engine._grade_single_question(question, "初一"))
+
+
+QUESTION = {"number": 1, "question_text": "3 + 4 × 2", "student_answer": "11", "correct_answer": "11"}
+
+
+def test_grading_is_reused_for_same_question_and_answers(engine_and_client):
+    engine, client = engine_and_client
+    grade(engine, QUESTION)
+    grade(engine, {**QUESTION, "number": 2, "student_answer": " 11。"})
+    assert client.grading_calls == 1
+
+
+def test_analysis_is_shared_between_students(engine_and_client):
+    """分析提示词不含学生答案，不同学生的同一道题只分析一次"""
+    engine, client = engine_and_client
+    question = {"number": 1, "question_text": "3 + 4 × 2", "student_answer": "14"}
+
+    async def analyze_both():
+        return await asyncio.gather(
+            engine._analyze_single_question(question, "初一"),
+            engine._analyze_single_question({**question, "student_answer": "11"}, "初一")
+        )
+
+    first, second = asyncio.run(analyze_both())
+    assert client.grading_calls == 1
+    assert "14" not in client.prompts[0] and "学生答案" not in client.prompts[0]
+    # 合并分析结果时保留各自的学生答案
+    assert (first["student_answer"], second["student_answer"]) == ("14", "11")
+
+
+def test_correct_answer_is_part_of_the_key(engine_and_client):
+    engine, client = engine_and_client
+    grade(engine, QUESTION)
+    grade(engine, {**QUESTION, "correct_answer": "14"})
+    assert client.grading_calls == 2
+
+
+@pytest.mark.parametrize("question", [
+    {**QUESTION, "correct_answer": ""},
+    {**QUESTION, "correct_answer": "11", "analysis_error": "解析失败"},
+])
+def test_grading_without_reference_answer_is_not_memoized(engine_and_client, question):
+    engine, client = engine_and_client
+    grade(engine, question)
+    grade(engine, question)
+    assert client.grading_calls == 2
+    assert engine.grading_memo.get_stats()["memory_entries"] == 0
+
+
+class HangingMCPClient:
+    """一直不返回的模拟MCP客户端，记录调用是否被取消"""
+
+    def __init__(self):
+        self.started = 0
+        self.cancelled = 0
+
+    async def call_tool(self, tool_name: str, arguments: dict):
+        self.started += 1
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def test_shared_call_is_cancelled_with_its_last_waiter(tmp_path):
+    client = HangingMCPClient()
+    engine = GradingEngine(
+        client, None, health_monitor=AIHealthMonitor(),
+        analysis_memo=QuestionMemo("analysis", db_path=str(tmp_path / "memo.db"))
+    )
+
+    async def run():
+        waiters = [asyncio.create_task(engine._analyze_single_question(QUESTION, "初一")) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert client.started == 1
+
+        # 还有题目在等待时共享的调用继续进行
+        waiters[0].cancel()
+        await asyncio.sleep(0.05)
+        assert client.cancelled == 0
+
+        waiters[1].cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.05)
+        assert client.cancelled == 1
+        assert engine._memo_inflight == {} and engine._memo_waiters == {}
+
+    asyncio.run(run())
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批改结果缓存测试 - test_result_cache.py
+磁盘占用统计与淘汰、只缓存完整AI批改结果的规则:
+
+    python -m pytest test/test_result_cache.py -q
+"""
+
+import sys
+import json
+import asyncio
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.grading_engine import GRADING_MODE_FUSED, GradingEngine
+from core.health_monitor import AIHealthMonitor
+from core.question_memo import QuestionMemo
+from core.result_cache import GradingResultCache
+
+
+def disk_usage(cache_dir: Path) -> int:
+    return sum(p.stat().st_size for p in cache_dir.glob("*/*.json"))
+
+
+def make_result(**overrides) -> dict:
+    """一份完整的AI批改结果"""
+    result = {
+        "success": True,
+        "mode": "ai_powered",
+        "degraded": False,
+        "results": [{"question_text": "1 + 1", "score": 10, "is_correct": True}],
+        "statistics": {"total_questions": 1, "degraded_questions": 0, "degraded_steps": []}
+    }
+    result.update(overrides)
+    return result
+
+
+def test_put_counts_new_entry_once(tmp_path):
+    """首次写入时扫描已有条目，新条目只计一次"""
+    GradingResultCache(cache_dir=str(tmp_path)).put("a" * 64, make_result())
+
+    cache = GradingResultCache(cache_dir=str(tmp_path))
+    cache.put("b" * 64, make_result())
+    assert cache.get_stats()["disk_bytes"] == disk_usage(tmp_path)
+
+    # 覆盖写入同一键不重复计入
+    cache.put("b" * 64, make_result(grade_level="初一"))
+    assert cache.get_stats()["disk_bytes"] == disk_usage(tmp_path)
+
+
+def test_no_eviction_while_within_limit(tmp_path):
+    entry_size = len(json.dumps(make_result(), ensure_ascii=False).encode("utf-8"))
+    cache = GradingResultCache(cache_dir=str(tmp_path), max_disk_bytes=entry_size * 2)
+    cache.put("a" * 64, make_result())
+    cache.put("b" * 64, make_result())
+    assert cache.evictions == 0
+
+    cache.put("c" * 64, make_result())
+    assert cache.evictions == 1
+    assert disk_usage(tmp_path) <= entry_size * 2
+
+
+@pytest.mark.parametrize("result, cacheable", [
+    (make_result(), True),
+    (None, False),
+    (make_result(mode="basic"), False),
+    (make_result(results=[]), False),
+    (make_result(degraded=True), False),
+    (make_result(statistics={"degraded_questions": 1, "degraded_steps": []}), False),
+    (make_result(statistics={"degraded_questions": 0, "degraded_steps": ["feedback"]}), False),
+    (make_result(statistics={"degraded_questions": 0, "degraded_steps": ["recognition"]}), False),
+])
+def test_is_cacheable(result, cacheable):
+    assert GradingEngine._is_cacheable(result) is cacheable
+
+
+class ScriptedMCPClient:
+    """按提示词返回固定内容的模拟MCP客户端，fail 中的关键字命中时返回无法解析的文本"""
+
+    def __init__(self, fail: tuple = ()):
+        self.fail = fail
+
+    async def call_tool(self, tool_name: str, arguments: dict):
+        content = arguments["messages"][0]["content"]
+        prompt = content if isinstance(content, str) else "".join(p.get("text", "") for p in content)
+        if any(keyword in prompt for keyword in self.fail):
+            return "不是JSON"
+        if tool_name == "nvidia_vision":
+            response = {"questions": [{"number": 1, "question_text": "1 + 1", "student_answer": "2",
+                                       "correct_answer": "2", "is_correct": True, "score": 10, "max_score": 10}]}
+        elif "综合学习反馈" in prompt:
+            response = {"overall_assessment": "很好", "suggestions": ["保持"]}
+        else:
+            response = {"ok": True}
+        return json.dumps(response, ensure_ascii=False)
+
+
+def grade_twice(tmp_path: Path, client: ScriptedMCPClient) -> GradingResultCache:
+    image_path = tmp_path / "homework.jpg"
+    Image.new("RGB", (64, 64), "white").save(image_path)
+
+    cache = GradingResultCache(cache_dir=str(tmp_path / "result_cache"))
+    engine = GradingEngine(
+        client, None, mode=GRADING_MODE_FUSED,
+        health_monitor=AIHealthMonitor(),
+        result_cache=cache,
+        analysis_memo=QuestionMemo("analysis", db_path=str(tmp_path / "memo.db")),
+        grading_memo=QuestionMemo("grading", db_path=str(tmp_path / "memo.db"))
+    )
+    engine.nvidia_api_key = "nvapi-test"
+
+    async def run():
+        for homework_id in (1, 2):
+            await engine.grade_homework(homework_id, str(image_path), "初一")
+
+    asyncio.run(run())
+    return cache
+
+
+def test_complete_result_is_cached(tmp_path):
+    cache = grade_twice(tmp_path, ScriptedMCPClient())
+    assert cache.memory_hits == 1
+
+
+def test_fallback_feedback_is_not_cached(tmp_path):
+    """反馈解析失败、使用默认反馈的结果不写入缓存"""
+    cache = grade_twice(tmp_path, ScriptedMCPClient(fail=("综合学习反馈",)))
+    assert cache.memory_hits == 0
+    assert cache.get_stats()["memory_entries"] == 0
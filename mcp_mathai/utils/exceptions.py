@@ -17,6 +17,25 @@ class APIConnectionError(MathGradingException):
     """API连接错误"""
     pass
 
+class MCPConnectionError(APIConnectionError):
+    """MCP连接错误（未连接或连接已断开）"""
+    pass
+
+class MCPCallInterruptedError(MCPConnectionError):
+    """MCP调用已发出，但连接在收到响应前断开，调用结果未知"""
+    pass
+
+class MCPServerBusyError(APIConnectionError):
+    """MCP服务器繁忙，请求未被执行；retry_after 为服务器建议的重试等待时间(秒)"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class MCPDeadlineExceededError(APIConnectionError):
+    """MCP调用未在截止时间前完成（客户端等待超时，或服务器因请求过期已放弃处理）"""
+    pass
+
 class DatabaseError(MathGradingException):
     """数据库错误"""
     pass
\ No newline at end of file
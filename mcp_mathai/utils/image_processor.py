@@ -3,7 +3,7 @@
 # ===============================
 import cv2
 import numpy as np
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image, ImageEnhance, ImageFilter, ImageOps
 import base64
 import io
 from typing import Tuple, Optional, Dict, Any
@@ -54,6 +54,78 @@ class ImageProcessor:
             logger.error(f"图像预处理失败: {e}")
             raise ImageProcessingError(f"图像预处理失败: {e}")
 
+    @staticmethod
+    def prepare_for_upload(image_data: bytes, max_side: Optional[int] = None,
+                           target_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """
+        为发送给视觉模型准备图像：缩放到 image.resize_threshold 以内并重新编码为JPEG，
+        超过目标大小时逐步降低质量，仍超出则继续缩小尺寸
+
+        Args:
+            image_data: 原始图像数据
+            max_side: 最长边上限，默认 image.resize_threshold
+            target_bytes: 编码后字节数目标，默认 image.target_payload_bytes
+
+        Returns:
+            {"data": JPEG字节, "width", "height", "original_width", "original_height", "quality"}
+        """
+        max_side = max_side or settings.get("image.resize_threshold", 1920)
+        target_bytes = target_bytes or settings.get("image.target_payload_bytes", 800 * 1024)
+        quality = settings.get("image.jpeg_quality", 85)
+        min_quality = settings.get("image.min_jpeg_quality", 50)
+        min_side = settings.get("image.min_side", 800)
+
+        try:
+            image = Image.open(io.BytesIO(image_data))
+            original_width, original_height = image.size
+
+            # 按EXIF方向摆正（手机照片常见），并统一为RGB
+            image = ImageOps.exif_transpose(image)
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+
+            if max(image.size) > max_side:
+                ratio = max_side / max(image.size)
+                image = image.resize(
+                    (max(1, int(image.width * ratio)), max(1, int(image.height * ratio))),
+                    Image.Resampling.LANCZOS
+                )
+
+            while True:
+                data = ImageProcessor._encode_jpeg(image, quality)
+                if len(data) <= target_bytes:
+                    break
+                if quality > min_quality:
+                    quality = max(min_quality, quality - 10)
+                    continue
+                if max(image.size) <= min_side:
+                    break
+                # 质量已降到下限，继续缩小尺寸
+                image = image.resize(
+                    (max(1, int(image.width * 0.8)), max(1, int(image.height * 0.8))),
+                    Image.Resampling.LANCZOS
+                )
+
+            return {
+                "data": data,
+                "width": image.width,
+                "height": image.height,
+                "original_width": original_width,
+                "original_height": original_height,
+                "quality": quality
+            }
+
+        except Exception as e:
+            logger.error(f"图像压缩失败: {e}")
+            raise ImageProcessingError(f"图像压缩失败: {e}")
+
+    @staticmethod
+    def _encode_jpeg(image: Image.Image, quality: int) -> bytes:
+        """编码为JPEG字节"""
+        buffered = io.BytesIO()
+        image.save(buffered, format="JPEG", quality=quality, optimize=True)
+        return buffered.getvalue()
+
     @staticmethod
     def _enhance_image(image: Image.Image) -> Image.Image:
         """图像增强处理"""
@@ -0,0 +1,212 @@
+# ===============================
+# utils/mcp_protocol.py - MCP客户端与服务器共用的协议定义
+# ===============================
+import hashlib
+import json
+import struct
+import zlib
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# 可选的高性能编码库，未安装时退回标准库json
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 二进制帧类型（帧首字节）
+FRAME_BLOB_CHUNK = 0x01             # 数据块上传
+FRAME_MESSAGE = 0x02                # 按协商编码的消息
+FRAME_MESSAGE_COMPRESSED = 0x03     # 按协商编码并压缩的消息
+
+# 二进制块帧头: 类型(1字节) + SHA-256摘要(32字节) + 块序号(4字节, 大端)
+_BLOB_CHUNK_HEADER = struct.Struct(">B32sI")
+
+# 单个块的数据大小，远小于websockets默认的1MB帧上限
+BLOB_CHUNK_SIZE = 256 * 1024
+
+# 在参数中引用已上传数据块的URL前缀，如 {"url": "blob:<sha256>"}
+BLOB_URL_PREFIX = "blob:"
+
+# JSON-RPC错误码：引用的数据块在服务器上不存在（未上传到该连接的服务进程或已被淘汰），
+# error.data.hash 为缺失的内容哈希，客户端可重新上传后重试
+ERROR_BLOB_NOT_FOUND = -32004
+
+# JSON-RPC错误码：请求在截止时间前未能完成（排队时已过期或执行超时），服务器已放弃处理
+ERROR_DEADLINE_EXCEEDED = -32001
+
+# JSON-RPC错误码：服务器繁忙，请求未被接受（未执行，任何请求都可安全重试），
+# error.data.retry_after_ms 为建议的重试等待时间(毫秒)
+ERROR_SERVER_BUSY = -32003
+
+# 客户端取消请求的通知，params: {"requestId": <id>, "reason": <原因>}；被取消的请求不再应答
+NOTIFICATION_CANCELLED = "notifications/cancelled"
+
+# 服务器工具列表或参数定义变化的通知，params: {"version": <新的工具版本>}；客户端据此清空工具结果缓存
+NOTIFICATION_TOOLS_CHANGED = "notifications/tools/list_changed"
+
+# 请求 params._meta 中的剩余时间(毫秒)，服务器从收到请求时开始计算截止时间
+META_TIMEOUT_MS = "timeoutMs"
+
+
+def blob_hash(data: bytes) -> str:
+    """数据块的内容哈希（SHA-256十六进制）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+# 常见图像格式的文件头，用于给图像数据块生成正确的 data URL
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+)
+
+
+def sniff_image_mime(data: bytes, default: str = "image/jpeg") -> str:
+    """按文件头判断图像的MIME类型，无法识别时返回 default"""
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    return default
+
+
+def encode_blob_chunk(digest: str, index: int, chunk: bytes) -> bytes:
+    """编码一个数据块帧"""
+    return _BLOB_CHUNK_HEADER.pack(FRAME_BLOB_CHUNK, bytes.fromhex(digest), index) + chunk
+
+
+def decode_blob_chunk(frame: bytes) -> Tuple[str, int, bytes]:
+    """
+    解码数据块帧
+
+    Returns:
+        (内容哈希, 块序号, 块数据)
+
+    Raises:
+        ValueError: 帧类型或长度不正确
+    """
+    if len(frame) < _BLOB_CHUNK_HEADER.size:
+        raise ValueError(f"二进制帧过短: {len(frame)} bytes")
+
+    frame_type, digest, index = _BLOB_CHUNK_HEADER.unpack_from(frame)
+    if frame_type != FRAME_BLOB_CHUNK:
+        raise ValueError(f"未知二进制帧类型: {frame_type:#04x}")
+
+    return digest.hex(), index, bytes(frame[_BLOB_CHUNK_HEADER.size:])
+
+
+def iter_blob_chunks(data: bytes, chunk_size: int = BLOB_CHUNK_SIZE):
+    """把数据切分为块，产出 (块序号, 块数据)"""
+    for index, offset in enumerate(range(0, max(len(data), 1), chunk_size)):
+        yield index, data[offset:offset + chunk_size]
+
+
+# ============ 消息编码协商 ============
+
+CODEC_MSGPACK = "msgpack"
+CODEC_ORJSON = "orjson"
+CODEC_JSON = "json"
+
+COMPRESSION_ZLIB = "zlib"
+
+# 未协商时的默认值：标准库json文本帧，不压缩（兼容旧客户端）
+DEFAULT_COMPRESSION_THRESHOLD = 4096
+
+
+def available_codecs() -> List[str]:
+    """本进程可用的编码，按性能优先排列"""
+    codecs = []
+    if msgpack is not None:
+        codecs.append(CODEC_MSGPACK)
+    if orjson is not None:
+        codecs.append(CODEC_ORJSON)
+    codecs.append(CODEC_JSON)
+    return codecs
+
+
+def available_compressions() -> List[str]:
+    return [COMPRESSION_ZLIB]
+
+
+def negotiate_codec(preferred: List[str], supported: List[str]) -> str:
+    """按客户端偏好顺序选择双方都支持的编码，没有交集时使用json"""
+    for codec in preferred:
+        if codec in supported:
+            return codec
+    return CODEC_JSON
+
+
+def _encode_payload(codec: str, message: Dict[str, Any]) -> bytes:
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(message, use_bin_type=True)
+    if codec == CODEC_ORJSON:
+        return orjson.dumps(message)
+    return json.dumps(message, ensure_ascii=False).encode("utf-8")
+
+
+def _decode_payload(codec: str, payload: bytes) -> Dict[str, Any]:
+    if codec == CODEC_MSGPACK:
+        return msgpack.unpackb(payload, raw=False)
+    if codec == CODEC_ORJSON:
+        return orjson.loads(payload)
+    return json.loads(payload)
+
+
+class MessageCodec:
+    """
+    一条连接上的消息编解码器
+
+    json编码且不需要压缩时发送文本帧（与未协商时完全相同）；其他情况发送带类型字节的二进制帧，
+    编码后超过 threshold 字节的消息用zlib压缩。解码时文本帧总是按json处理，
+    因此协商前后、以及对端尚未切换时的消息都能正确解析。
+    """
+
+    def __init__(self, codec: str = CODEC_JSON, compression: Optional[str] = None,
+                 threshold: int = DEFAULT_COMPRESSION_THRESHOLD):
+        if codec not in available_codecs():
+            raise ValueError(f"不支持的编码: {codec}")
+        if compression not in (None, COMPRESSION_ZLIB):
+            raise ValueError(f"不支持的压缩算法: {compression}")
+        self.codec = codec
+        self.compression = compression
+        self.threshold = threshold
+
+    def encode(self, message: Dict[str, Any]) -> Union[str, bytes]:
+        """编码一条消息为websocket帧"""
+        if self.codec == CODEC_JSON and not self.compression:
+            return json.dumps(message)
+
+        payload = _encode_payload(self.codec, message)
+        if self.compression and len(payload) > self.threshold:
+            return bytes([FRAME_MESSAGE_COMPRESSED]) + zlib.compress(payload)
+        if self.codec == CODEC_JSON:
+            return payload.decode("utf-8")
+        return bytes([FRAME_MESSAGE]) + payload
+
+    def decode(self, frame: Union[str, bytes]) -> Dict[str, Any]:
+        """
+        解码一个消息帧
+
+        Raises:
+            ValueError: 帧格式不正确（包括数据块帧，应由调用方单独处理）
+        """
+        if isinstance(frame, str):
+            return json.loads(frame)
+
+        frame_type = frame[0] if frame else None
+        if frame_type == FRAME_MESSAGE:
+            return _decode_payload(self.codec, frame[1:])
+        if frame_type == FRAME_MESSAGE_COMPRESSED:
+            return _decode_payload(self.codec, zlib.decompress(frame[1:]))
+        raise ValueError(f"不是消息帧: {frame_type}")
+
+    def describe(self) -> Dict[str, Any]:
+        return {"codec": self.codec, "compression": self.compression, "threshold": self.threshold}